@@ -0,0 +1,9 @@
+"""
+Benchmark suite for the postgrez load and export paths.
+
+Run it against a .postgrez setup, or against a throwaway cluster created with
+initdb, and save the results as JSON so runs can be compared:
+
+    python -m benchmarks --rows 200000 --output before.json
+    python -m benchmarks --rows 200000 --compare before.json
+"""
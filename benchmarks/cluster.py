@@ -0,0 +1,86 @@
+"""
+Throwaway PostgreSQL cluster for the benchmarks, created with initdb in a
+temporary directory and listening on a unix socket only.
+"""
+
+import subprocess
+import tempfile
+import shutil
+import getpass
+import time
+import os
+
+
+def find_bindir(pg_bin=None):
+    """Locate the directory containing initdb and pg_ctl.
+
+    Args:
+        pg_bin (str, optional): Directory supplied by the user.
+
+    Returns:
+        bindir (str): Directory containing the PostgreSQL server binaries.
+
+    Raises:
+        RuntimeError: If initdb can't be found.
+    """
+    candidates = [pg_bin] if pg_bin else []
+    initdb = shutil.which('initdb')
+    if initdb:
+        candidates.append(os.path.dirname(initdb))
+    try:
+        candidates.append(subprocess.check_output(
+            ['pg_config', '--bindir']).decode().strip())
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    for bindir in candidates:
+        if os.path.exists(os.path.join(bindir, 'initdb')):
+            return bindir
+    raise RuntimeError('Unable to find initdb, pass --pg-bin')
+
+
+class TempCluster(object):
+    """Context manager which initializes, starts and finally removes a
+    PostgreSQL cluster. Durability settings are relaxed, since the data is
+    thrown away.
+
+    Attributes:
+        params (dict): Connection parameters for postgrez.Cmd.
+    """
+    def __init__(self, pg_bin=None, port=54329):
+        self.bindir = find_bindir(pg_bin)
+        self.port = port
+        self.datadir = None
+        self.params = None
+
+    def _run(self, *args):
+        subprocess.check_call([os.path.join(self.bindir, args[0])] +
+                              list(args[1:]), stdout=subprocess.DEVNULL)
+
+    def __enter__(self):
+        self.datadir = tempfile.mkdtemp(prefix='postgrez-bench-')
+        user = getpass.getuser()
+        options = ('-c listen_addresses= -c unix_socket_directories=%s '
+                   '-c fsync=off -c synchronous_commit=off '
+                   '-c full_page_writes=off -p %s' % (self.datadir, self.port))
+        try:
+            self._run('initdb', '-D', self.datadir, '-U', user, '-A',
+                      'trust', '-E', 'UTF8')
+            self._run('pg_ctl', '-D', self.datadir, '-o', options, '-w',
+                      '-l', os.path.join(self.datadir, 'server.log'), 'start')
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(self.datadir, ignore_errors=True)
+            ## initdb refuses to run as root
+            raise RuntimeError('Unable to start a throwaway cluster, use '
+                               '--setup instead. Error: %s' % e)
+        self.params = {'host': self.datadir, 'port': self.port,
+                       'database': 'postgres', 'user': user}
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        try:
+            self._run('pg_ctl', '-D', self.datadir, '-m', 'immediate', '-w',
+                      'stop')
+        finally:
+            ## give the postmaster a moment to release the directory
+            time.sleep(0.1)
+            shutil.rmtree(self.datadir, ignore_errors=True)
@@ -0,0 +1,80 @@
+"""
+Synthetic table definitions and row generators for the benchmarks.
+"""
+
+import datetime
+import decimal
+import random
+
+from postgrez import types
+
+START = datetime.datetime(2017, 5, 1)
+
+## sql type, type OID and value generator per column type
+COLUMN_TYPES = {
+    'int': ('integer', types.INT4, lambda i: random.randint(0, 1000000)),
+    'bigint': ('bigint', types.INT8, lambda i: i),
+    'float': ('double precision', types.FLOAT8,
+              lambda i: random.random() * 100),
+    'numeric': ('numeric(12,2)', types.NUMERIC,
+                lambda i: decimal.Decimal(random.randint(0, 10 ** 8)) / 100),
+    'timestamp': ('timestamp', types.TIMESTAMP,
+                  lambda i: START + datetime.timedelta(seconds=i)),
+    'date': ('date', types.DATE,
+             lambda i: START.date() + datetime.timedelta(days=i % 3650)),
+    'text': ('text', types.TEXT, lambda i: 'label-%s' % i),
+    'bool': ('boolean', types.BOOL, lambda i: i % 2 == 0),
+}
+
+## column types per profile, repeated to fill the requested width
+PROFILES = {
+    'numeric': ['bigint', 'int', 'float', 'float'],
+    'mixed': ['bigint', 'int', 'float', 'numeric', 'timestamp', 'text'],
+    'text': ['bigint', 'text', 'text', 'text'],
+    'wide': ['bigint', 'int', 'float', 'numeric', 'timestamp', 'date',
+             'text', 'bool'],
+}
+
+
+def make_columns(profile='mixed', width=None):
+    """Build the column definitions of a synthetic table.
+
+    Args:
+        profile (str, optional): Key of PROFILES. Defaults to 'mixed'.
+        width (int, optional): Number of columns. Defaults to None, the width
+            of the profile.
+
+    Returns:
+        columns (list): List of (name, sql type, type OID, generator) tuples.
+    """
+    kinds = PROFILES[profile]
+    width = width or len(kinds)
+    columns = []
+    for i in range(width):
+        kind = kinds[i % len(kinds)]
+        sql_type, oid, generate = COLUMN_TYPES[kind]
+        columns.append(('c%s_%s' % (i, kind), sql_type, oid, generate))
+    return columns
+
+
+def generate_rows(columns, n, seed=0):
+    """Generate rows for a synthetic table.
+
+    Args:
+        columns (list): Column definitions from make_columns().
+        n (int): Number of rows.
+        seed (int, optional): Random seed, so runs are comparable.
+
+    Returns:
+        rows (list): List of tuples.
+    """
+    random.seed(seed)
+    generators = [column[3] for column in columns]
+    return [tuple(generate(i) for generate in generators) for i in range(n)]
+
+
+def create_table_sql(table, columns, unlogged=True):
+    """Build the CREATE TABLE statement of a synthetic table.
+    """
+    return 'CREATE %sTABLE %s (%s)' % ('UNLOGGED ' if unlogged else '', table,
+        ', '.join('%s %s' % (column[0], column[1]) for column in columns))
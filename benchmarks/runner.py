@@ -0,0 +1,379 @@
+"""
+Benchmark runner. Every case runs in a forked child process, so its peak RSS
+can be measured separately from the other cases, and reports rows/sec, MB/sec
+and the peak RSS growth over the rows held by the parent process.
+"""
+
+import multiprocessing
+import contextlib
+import subprocess
+import datetime
+import resource
+import argparse
+import platform
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+import psycopg2
+
+from postgrez import Cmd
+from postgrez.utils import IteratorFile, build_copy_query
+from postgrez.binary import build_encoders, iter_copy_binary
+
+from .data import PROFILES, make_columns, generate_rows, create_table_sql
+from .cluster import TempCluster
+
+TABLE = 'postgrez_bench'
+LOAD_TABLE = 'postgrez_bench_load'
+
+## a change in rows/sec larger than this fraction is reported as a regression
+DEFAULT_THRESHOLD = 0.1
+
+
+class Context(object):
+    """State shared by the cases: connection parameters, the synthetic rows
+    and a CSV export of the benchmark table.
+    """
+    def __init__(self, conn_kwargs, columns, rows, tmpdir, workers):
+        self.conn_kwargs = conn_kwargs
+        self.columns = columns
+        self.rows = rows
+        self.tmpdir = tmpdir
+        self.workers = workers
+        self.csv_file = os.path.join(tmpdir, 'bench.csv')
+
+    def cmd(self):
+        return Cmd(**self.conn_kwargs)
+
+    def truncate_load_table(self):
+        with self.cmd() as c:
+            c.execute('TRUNCATE %s' % LOAD_TABLE)
+
+
+def _drain(f):
+    nbytes = 0
+    while True:
+        data = f.read(262144)
+        if not data:
+            return nbytes
+        nbytes += len(data)
+
+
+def case_serialize_text(ctx):
+    template_string = '|'.join(['{}'] * len(ctx.columns))
+    f = IteratorFile(template_string.format(*x) for x in ctx.rows)
+    return {'rows': len(ctx.rows), 'bytes': _drain(f)}
+
+
+def case_serialize_binary(ctx):
+    encoders = build_encoders([column[2] for column in ctx.columns])
+    nbytes = sum(len(chunk) for chunk in iter_copy_binary(ctx.rows, encoders))
+    return {'rows': len(ctx.rows), 'bytes': nbytes}
+
+
+def case_build_copy_query(ctx):
+    columns = [column[0] for column in ctx.columns]
+    for i in range(len(ctx.rows)):
+        build_copy_query('load' if i % 2 else 'export', TABLE,
+                         columns=columns, delimiter='|', null='NULL')
+    return {'rows': len(ctx.rows), 'bytes': 0}
+
+
+def _load_object(ctx, format):
+    with ctx.cmd() as c:
+        return c.load_from_object(LOAD_TABLE, ctx.rows, format=format)
+
+
+def case_load_object_text(ctx):
+    return _load_object(ctx, 'text')
+
+
+def case_load_object_binary(ctx):
+    return _load_object(ctx, 'binary')
+
+
+def case_load_file(ctx):
+    with ctx.cmd() as c:
+        c.load_from_file(LOAD_TABLE, ctx.csv_file)
+        rows = c.cursor.rowcount
+    return {'rows': rows, 'bytes': os.path.getsize(ctx.csv_file)}
+
+
+def case_parallel_load_file(ctx):
+    with ctx.cmd() as c:
+        return c.parallel_load_file(LOAD_TABLE, ctx.csv_file,
+                                    workers=ctx.workers)
+
+
+def case_export_file(ctx):
+    filename = os.path.join(ctx.tmpdir, 'export.csv')
+    with ctx.cmd() as c:
+        c.export_to_file(TABLE, filename)
+        rows = c.cursor.rowcount
+    return {'rows': rows, 'bytes': os.path.getsize(filename)}
+
+
+def case_parallel_export(ctx):
+    with ctx.cmd() as c:
+        return c.parallel_export(TABLE, os.path.join(ctx.tmpdir,
+                                 'parallel.csv'), workers=ctx.workers)
+
+
+def _export_object(ctx, **kwargs):
+    with ctx.cmd() as c:
+        data = c.export_to_object(TABLE, **kwargs)
+    rows = len(next(iter(data.values()))) if isinstance(data, dict) \
+        else len(data)
+    return {'rows': rows, 'bytes': os.path.getsize(ctx.csv_file)}
+
+
+def case_export_object_csv(ctx):
+    return _export_object(ctx)
+
+
+def case_export_object_binary(ctx):
+    return _export_object(ctx, format='binary')
+
+
+def case_export_object_columnar(ctx):
+    return _export_object(ctx, columnar=True)
+
+
+def case_iter_export(ctx):
+    rows = 0
+    with ctx.cmd() as c:
+        for _ in c.iter_export(TABLE):
+            rows += 1
+    return {'rows': rows, 'bytes': os.path.getsize(ctx.csv_file)}
+
+
+## case name, function and whether the load table is truncated first
+CASES = [
+    ('serialize_text', case_serialize_text, False),
+    ('serialize_binary', case_serialize_binary, False),
+    ('build_copy_query', case_build_copy_query, False),
+    ('load_object_text', case_load_object_text, True),
+    ('load_object_binary', case_load_object_binary, True),
+    ('load_file', case_load_file, True),
+    ('parallel_load_file', case_parallel_load_file, True),
+    ('export_file', case_export_file, False),
+    ('parallel_export', case_parallel_export, False),
+    ('export_object_csv', case_export_object_csv, False),
+    ('export_object_binary', case_export_object_binary, False),
+    ('export_object_columnar', case_export_object_columnar, False),
+    ('iter_export', case_iter_export, False),
+]
+
+
+def _rss_bytes():
+    """Current resident set size of this process."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def _child(func, truncate, ctx, conn):
+    try:
+        if truncate:
+            ctx.truncate_load_table()
+        start_rss = _rss_bytes()
+        start = time.time()
+        result = func(ctx)
+        elapsed = time.time() - start
+        ## ru_maxrss is in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        conn.send({'rows': result['rows'], 'bytes': result['bytes'],
+                   'elapsed': elapsed, 'peak_rss': peak,
+                   'rss_growth': max(peak - start_rss, 0)})
+    except Exception as e:
+        conn.send({'error': '%s: %s' % (type(e).__name__, e)})
+    finally:
+        conn.close()
+
+
+def run_case(name, func, truncate, ctx):
+    """Run a case in a forked child process.
+
+    Returns:
+        result (dict): The measurements, or {'error': str}.
+    """
+    mp = multiprocessing.get_context('fork')
+    parent_conn, child_conn = mp.Pipe(duplex=False)
+    process = mp.Process(target=_child, args=(func, truncate, ctx,
+                                              child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {'error': 'benchmark process exited with code %s' %
+                  process.exitcode}
+    process.join()
+    return result
+
+
+def summarize(name, runs):
+    """Keep the fastest of the repeated runs of a case.
+    """
+    errors = [run['error'] for run in runs if 'error' in run]
+    if errors:
+        return {'case': name, 'error': errors[0]}
+    best = min(runs, key=lambda run: run['elapsed'])
+    elapsed = best['elapsed']
+    return {'case': name, 'rows': best['rows'], 'bytes': best['bytes'],
+            'elapsed': elapsed, 'runs': [run['elapsed'] for run in runs],
+            'rows_per_sec': best['rows'] / elapsed if elapsed else None,
+            'mb_per_sec': best['bytes'] / 1048576.0 / elapsed
+                          if elapsed else None,
+            'peak_rss_mb': max(run['peak_rss'] for run in runs) / 1048576.0,
+            'rss_growth_mb': max(run['rss_growth'] for run in runs) /
+                             1048576.0}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_tables(ctx):
+    """Create the benchmark tables, fill the source table and export it to
+    the CSV file used by the file load cases.
+    """
+    with ctx.cmd() as c:
+        for table in (TABLE, LOAD_TABLE):
+            c.execute('DROP TABLE IF EXISTS %s' % table)
+            c.execute(create_table_sql(table, ctx.columns))
+        c.load_from_object(TABLE, ctx.rows, format='binary')
+        c.execute('ANALYZE %s' % TABLE)
+        c.export_to_file(TABLE, ctx.csv_file)
+        c.execute('SHOW server_version')
+        return c.cursor.fetchone()[0]
+
+
+def drop_tables(ctx):
+    with ctx.cmd() as c:
+        for table in (TABLE, LOAD_TABLE):
+            c.execute('DROP TABLE IF EXISTS %s' % table)
+
+
+def compare(results, baseline_file, threshold=DEFAULT_THRESHOLD):
+    """Print the change in rows/sec of every case against a previous run.
+
+    Returns:
+        regressions (list): Names of the cases slower than the baseline by
+        more than threshold.
+    """
+    with open(baseline_file) as f:
+        baseline = dict((result['case'], result) for result in
+                        json.load(f)['results'])
+    regressions = []
+    print('\n%-24s %14s %14s %9s' % ('case', 'baseline', 'current',
+                                     'change'))
+    for result in results:
+        before = baseline.get(result['case'], {}).get('rows_per_sec')
+        after = result.get('rows_per_sec')
+        if not before or not after:
+            continue
+        change = after / before - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(result['case'])
+        print('%-24s %14.0f %14.0f %+8.1f%%%s' % (result['case'], before,
+                                                  after, change * 100, flag))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='rows in the synthetic table')
+    parser.add_argument('--profile', choices=sorted(PROFILES),
+                        default='mixed', help='column types to generate')
+    parser.add_argument('--width', type=int, default=None,
+                        help='number of columns, cycling through the profile')
+    parser.add_argument('--cases', default=None,
+                        help='comma separated cases to run, default all: %s'
+                        % ', '.join(case[0] for case in CASES))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per case, the fastest is kept')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='connections used by the parallel cases')
+    parser.add_argument('--setup', default=None,
+                        help='.postgrez setup to run against, default is a '
+                        'throwaway cluster created with initdb')
+    parser.add_argument('--setup-path', default='~')
+    parser.add_argument('--pg-bin', default=None,
+                        help='directory containing initdb and pg_ctl')
+    parser.add_argument('--output', default=None,
+                        help='file to write the JSON results to')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of a previous run to compare to')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown reported as a regression, default 0.1')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = CASES
+    if args.cases:
+        names = args.cases.split(',')
+        unknown = set(names) - set(case[0] for case in CASES)
+        if unknown:
+            sys.exit('Unknown cases: %s' % ', '.join(sorted(unknown)))
+        cases = [case for case in CASES if case[0] in names]
+
+    columns = make_columns(args.profile, args.width)
+    rows = generate_rows(columns, args.rows)
+    tmpdir = tempfile.mkdtemp(prefix='postgrez-bench-files-')
+
+    with contextlib.ExitStack() as stack:
+        if args.setup is not None:
+            conn_kwargs = {'setup': args.setup, 'setup_path': args.setup_path}
+        else:
+            conn_kwargs = stack.enter_context(TempCluster(args.pg_bin)).params
+        stack.callback(shutil.rmtree, tmpdir, True)
+
+        ctx = Context(conn_kwargs, columns, rows, tmpdir, args.workers)
+        server_version = prepare_tables(ctx)
+        stack.callback(drop_tables, ctx)
+
+        results = []
+        print('%-24s %12s %10s %12s %10s' % ('case', 'rows/sec', 'MB/sec',
+                                             'peak RSS MB', 'growth MB'))
+        for name, func, truncate in cases:
+            result = summarize(name, [run_case(name, func, truncate, ctx)
+                                      for _ in range(args.repeat)])
+            results.append(result)
+            if 'error' in result:
+                print('%-24s %s' % (name, result['error']))
+                continue
+            print('%-24s %12.0f %10.1f %12.1f %10.1f' % (name,
+                  result['rows_per_sec'], result['mb_per_sec'],
+                  result['peak_rss_mb'], result['rss_growth_mb']))
+
+    report = {
+        'meta': {'timestamp': datetime.datetime.utcnow().isoformat(),
+                 'commit': _git_commit(),
+                 'python': platform.python_version(),
+                 'psycopg2': psycopg2.__version__,
+                 'server_version': server_version,
+                 'rows': args.rows, 'profile': args.profile,
+                 'columns': [column[1] for column in columns],
+                 'repeat': args.repeat, 'workers': args.workers},
+        'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('\nResults written to %s' % args.output)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
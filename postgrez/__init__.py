@@ -1,2 +1,4 @@
-from .postgrez import Connection, Cmd
+from .postgrez import Connection, Cmd, warm_config
+from .pool import ConnectionPool, get_pool, close_pools
+from .aio import AsyncCmd, AsyncConnectionPool
 from .wrapper import *
@@ -0,0 +1,537 @@
+"""
+Aio module, contains asyncio versions of the Cmd class, the wrapper functions
+and the connection pool.
+
+Queries run on psycopg2 asynchronous connections, which are polled from the
+event loop. psycopg2 does not support COPY on asynchronous connections, so
+loads and exports run the blocking Cmd methods in a bounded thread pool.
+"""
+
+import warnings
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    import psycopg2
+    import psycopg2.extensions
+from .postgrez import Connection, Cmd, QUERY_LENGTH, \
+    DEFAULT_PORT, DEFAULT_SETUP, DEFAULT_SETUP_PATH
+from .exceptions import PostgrezExecuteError, PostgrezPoolError
+from concurrent import futures
+import collections
+import threading
+import functools
+import asyncio
+import logging
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+## number of COPYs run concurrently by the shared executor
+DEFAULT_COPY_WORKERS = 4
+
+## async pool defaults
+DEFAULT_MAXCONN = 10
+DEFAULT_CHECKOUT_TIMEOUT = 30
+
+## shared executor for COPY commands, created on first use
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor():
+    """Return the shared executor used to run COPY commands.
+
+    Returns:
+        executor (ThreadPoolExecutor): Executor with DEFAULT_COPY_WORKERS
+        threads.
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = futures.ThreadPoolExecutor(
+                max_workers=DEFAULT_COPY_WORKERS,
+                thread_name_prefix='postgrez-copy')
+    return _EXECUTOR
+
+
+async def wait(conn):
+    """Poll an asynchronous connection until its pending operation completes,
+    yielding to the event loop while the socket is not ready.
+
+    Args:
+        conn (psycopg2 connection): Connection opened with async_=True.
+
+    Raises:
+        psycopg2.Error: If the operation fails.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        if state == psycopg2.extensions.POLL_READ:
+            add, remove = loop.add_reader, loop.remove_reader
+        elif state == psycopg2.extensions.POLL_WRITE:
+            add, remove = loop.add_writer, loop.remove_writer
+        else:
+            raise psycopg2.OperationalError('Bad poll state: %s' % state)
+
+        ready = loop.create_future()
+        fd = conn.fileno()
+        add(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            remove(fd)
+
+
+async def connect(**conn_params):
+    """Open an asynchronous connection.
+
+    Args:
+        **conn_params: host, port, database, user and password passed to
+            psycopg2.connect().
+
+    Returns:
+        conn (psycopg2 connection): An open asynchronous connection.
+    """
+    conn = psycopg2.connect(async_=True, **conn_params)
+    try:
+        await wait(conn)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+class AsyncConnectionPool(object):
+    """Pool of asynchronous psycopg2 connections for use from a single event
+    loop. Connections are opened on demand, up to `maxconn`.
+
+    Attributes:
+        maxconn (int): Maximum number of connections open at any time.
+        conn_params (dict): Keyword arguments passed to psycopg2.connect().
+    """
+    def __init__(self, maxconn=DEFAULT_MAXCONN, **conn_params):
+        """Initialize the pool. No connections are opened until they are
+        first acquired.
+
+        Args:
+            maxconn (int, optional): Maximum number of connections open at
+                any time. Defaults to 10.
+            **conn_params: host, port, database, user and password passed to
+                psycopg2.connect().
+
+        Raises:
+            PostgrezPoolError: If maxconn is invalid.
+        """
+        if maxconn < 1:
+            raise PostgrezPoolError('Invalid pool size: maxconn=%s' % maxconn)
+        self.maxconn = maxconn
+        self.conn_params = conn_params
+        self.closed = False
+        self._idle = collections.deque()
+        self._size = 0
+        self._cond = None
+
+    def _condition(self):
+        """Return the condition used to wait for connections, created on first
+        use so the pool can be built outside of the event loop.
+        """
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self, timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        """Check a connection out of the pool, opening a new one if none are
+        idle and the pool is not full.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a connection when
+                the pool is exhausted. Defaults to 30. None waits forever.
+
+        Returns:
+            conn (psycopg2 connection): An open asynchronous connection.
+
+        Raises:
+            PostgrezPoolError: If the pool is closed or no connection became
+                available within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        cond = self._condition()
+        async with cond:
+            while True:
+                if self.closed:
+                    raise PostgrezPoolError('Connection pool is closed')
+                while self._idle:
+                    conn = self._idle.pop()
+                    if not conn.closed:
+                        return conn
+                    self._size -= 1
+                if self._size < self.maxconn:
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise PostgrezPoolError('Timed out waiting for a '
+                        'connection, all %s connections are in use' %
+                        self.maxconn)
+                try:
+                    await asyncio.wait_for(cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            ## reserve the slot, connecting happens outside of the lock
+            self._size += 1
+
+        try:
+            LOGGER.info('Opening async pooled connection to %s database' %
+                        self.conn_params.get('database'))
+            return await connect(**self.conn_params)
+        except BaseException:
+            async with cond:
+                self._size -= 1
+                cond.notify()
+            raise
+
+    async def release(self, conn, close=False):
+        """Return a connection to the pool.
+
+        Args:
+            conn (psycopg2 connection): Connection checked out with acquire().
+            close (bool, optional): Close the connection instead of keeping it
+                idle, e.g. after a cancelled query. Defaults to False.
+        """
+        cond = self._condition()
+        async with cond:
+            if close or conn.closed or self.closed:
+                if not conn.closed:
+                    conn.close()
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            cond.notify()
+
+    async def close(self):
+        """Close all idle connections and refuse further checkouts. Checked
+        out connections are closed when they are released.
+        """
+        cond = self._condition()
+        async with cond:
+            self.closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._size -= 1
+            cond.notify_all()
+
+    def stats(self):
+        """Return the number of idle and checked out connections.
+
+        Returns:
+            stats (dict): Dict in the format {'idle': int, 'used': int}.
+        """
+        return {'idle': len(self._idle), 'used': self._size - len(self._idle)}
+
+
+class AsyncCmd(Connection):
+    """Asyncio version of Cmd. Use it as an async context manager:
+
+        async with AsyncCmd(setup='local') as c:
+            await c.execute('select 1')
+            results = c.cursor.fetchall()
+
+    Asynchronous connections are always in autocommit mode, so every
+    statement passed to execute() is committed when it completes. Loads and
+    exports run the corresponding Cmd method on a blocking connection in a
+    bounded thread pool, each in its own transaction.
+
+    Attributes:
+        async_pool (AsyncConnectionPool): Pool the connection is borrowed
+            from, None if the connection is opened directly.
+        executor (concurrent.futures.Executor): Executor COPY commands run in.
+    """
+    def __init__(self, host=None, database=None, user=None, password=None,
+                    port=DEFAULT_PORT, setup=DEFAULT_SETUP,
+                    setup_path=DEFAULT_SETUP_PATH, pool=None, copy_pool=True,
+                    executor=None):
+        """Resolve the connection parameters. The connection is opened when
+        the async with block is entered.
+
+        Args:
+            host (str, optional): Database host url. Defaults to None.
+            database (str, optional): Database name. Defaults to None.
+            user (str, optional): Username. Defaults to None.
+            password (str, optional): Password. Defaults to None.
+            setup (str, optional): Name of the db setup to use in ~/.postgrez.
+            setup_path (str, optional): Path to the .postgrez configuration
+                file. Defaults to '~', i.e. your home directory on Mac/Linux.
+            pool (AsyncConnectionPool, optional): Borrow the connection from
+                an async pool instead of connecting. Defaults to None.
+            copy_pool (bool or ConnectionPool, optional): Pool the blocking
+                connections used for COPY commands are borrowed from, see
+                Connection. Defaults to True, the process-wide pool.
+            executor (concurrent.futures.Executor, optional): Executor COPY
+                commands run in. Defaults to None, a shared thread pool with
+                DEFAULT_COPY_WORKERS threads.
+        """
+        self.async_pool = pool
+        self.copy_pool = copy_pool
+        self.executor = executor
+        self._broken = False
+        super(AsyncCmd, self).__init__(host=host, database=database,
+                                       user=user, password=password,
+                                       port=port, setup=setup,
+                                       setup_path=setup_path)
+
+    def _connect(self):
+        """Connections are opened asynchronously in __aenter__().
+        """
+        pass
+
+    async def _aconnect(self):
+        """Open the asynchronous connection, or borrow one from the pool.
+        """
+        if self.async_pool is not None:
+            LOGGER.info('Borrowing async pooled connection to %s database' %
+                        self.database)
+            self.conn = await self.async_pool.acquire()
+        else:
+            LOGGER.info('Establishing async connection to %s database' %
+                        self.database)
+            self.conn = await connect(**self._params())
+        self.cursor = self.conn.cursor()
+
+    async def _adisconnect(self):
+        """Close the connection, or return it to the pool.
+        """
+        LOGGER.debug('Attempting to disconnect from database %s' % self.database)
+        self.cursor.close()
+        if self.async_pool is not None:
+            await self.async_pool.release(self.conn, close=self._broken)
+            self.conn = None
+        else:
+            self.conn.close()
+
+    async def __aenter__(self):
+        await self._aconnect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, exc_tb):
+        if self._connected():
+            await self._adisconnect()
+
+    async def execute(self, query, query_vars=None, commit=True):
+        """Execute the supplied query without blocking the event loop. The
+        results can be fetched from self.cursor once it completes.
+
+        Args:
+            query (str): Query to be executed. Query can contain placeholders,
+                as long as query_vars are supplied.
+            query_vars (tuple, list or dict): Variables to be executed with
+                query. See http://initd.org/psycopg/docs/usage.html#query-parameters.
+            commit (bool): Ignored, asynchronous connections commit every
+                statement. Kept for compatibility with Cmd.execute().
+
+        Raises:
+            PostgrezExecuteError: If the query fails.
+        """
+        LOGGER.info('Attempting to execute query %s...' %
+                    query[0:QUERY_LENGTH])
+        try:
+            self.cursor.execute(query, vars=query_vars)
+            await wait(self.conn)
+        except psycopg2.Error as e:
+            raise PostgrezExecuteError('Unable to execute query %s. Error: %s'
+                                       % (query[0:QUERY_LENGTH].strip(), e))
+        except asyncio.CancelledError:
+            ## the server is still running the query, so the connection can't
+            ## be reused. cancel() blocks until the server acknowledges it
+            self._broken = True
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.conn.cancel)
+            raise
+
+    async def _run_copy(self, method, *args, **kwargs):
+        """Run a Cmd method on a blocking connection in the executor.
+
+        Args:
+            method (str): Name of the Cmd method to run.
+            *args: Positional arguments passed to the method.
+            **kwargs: Keyword arguments passed to the method.
+
+        Returns:
+            result: Value returned by the method.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.executor or _get_executor()
+        call = functools.partial(_run_cmd, self._params(), self.copy_pool,
+                                 method, args, kwargs)
+        return await loop.run_in_executor(executor, call)
+
+    async def load_from_object(self, table_name, data, **kwargs):
+        """Coroutine version of Cmd.load_from_object(). data is consumed in
+        the executor thread.
+
+        Args:
+            table_name (str): name of table to load data into.
+            data (iterable): list of tuples, where each row is a tuple
+            **kwargs: Keyword arguments of Cmd.load_from_object().
+
+        Returns:
+            summary (dict): See Cmd.load_from_object().
+        """
+        return await self._run_copy('load_from_object', table_name, data,
+                                    **kwargs)
+
+    async def load_from_file(self, table_name, filename, **kwargs):
+        """Coroutine version of Cmd.load_from_file().
+
+        Args:
+            table_name (str): name of table to load data into.
+            filename (str): name of the file
+            **kwargs: Keyword arguments of Cmd.load_from_file().
+        """
+        return await self._run_copy('load_from_file', table_name, filename,
+                                    **kwargs)
+
+    async def export_to_object(self, query, **kwargs):
+        """Coroutine version of Cmd.export_to_object().
+
+        Args:
+            query (str): A select query or a table
+            **kwargs: Keyword arguments of Cmd.export_to_object().
+
+        Returns:
+            data (list): See Cmd.export_to_object().
+        """
+        return await self._run_copy('export_to_object', query, **kwargs)
+
+    async def export_to_file(self, query, filename, **kwargs):
+        """Coroutine version of Cmd.export_to_file().
+
+        Args:
+            query (str): A select query or a table
+            filename (str): Filename to copy to.
+            **kwargs: Keyword arguments of Cmd.export_to_file().
+        """
+        return await self._run_copy('export_to_file', query, filename,
+                                    **kwargs)
+
+
+def _run_cmd(params, pool, method, args, kwargs):
+    """Run a Cmd method on a new or pooled blocking connection.
+
+    Args:
+        params (dict): Connection parameters, see Connection._params().
+        pool (bool or ConnectionPool): Pool to borrow the connection from.
+        method (str): Name of the Cmd method to run.
+        args (tuple): Positional arguments passed to the method.
+        kwargs (dict): Keyword arguments passed to the method.
+
+    Returns:
+        result: Value returned by the method.
+    """
+    with Cmd(pool=pool, **params) as c:
+        return getattr(c, method)(*args, **kwargs)
+
+
+async def execute(query, query_vars=None, columns=True, host=None,
+                    database=None, user=None, password=None, port=DEFAULT_PORT,
+                    setup=DEFAULT_SETUP, setup_path=DEFAULT_SETUP_PATH,
+                    pool=None):
+    """Coroutine version of wrapper.execute().
+
+    Args:
+        query (str): Query to be executed. Query can contain placeholders,
+            as long as query_vars are supplied.
+        query_vars (tuple, list or dict): Variables to be executed with query.
+        columns (bool): Return column names in results. Defaults to True.
+        host (str, optional): Database host url. Defaults to None.
+        database (str, optional): Database name. Defaults to None.
+        user (str, optional): Username. Defaults to None.
+        password (str, optional): Password. Defaults to None.
+        setup (str, optional): Name of the db setup to use in ~/.postgrez.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (AsyncConnectionPool, optional): Borrow the connection from an
+            async pool. Defaults to None.
+
+    Returns:
+        results (list): Results from query, or None if no resultset was
+        generated. If columns is True, each record is a dict keyed by column
+        name.
+
+    Raises:
+        PostgrezExecuteError: If any error occurs reading of resultset.
+    """
+    async with AsyncCmd(host=host, database=database, user=user,
+                        password=password, port=port, setup=setup,
+                        setup_path=setup_path, pool=pool) as c:
+        await c.execute(query, query_vars)
+        if c.cursor.description is None:
+            return None
+        try:
+            results = c.cursor.fetchall()
+        except psycopg2.ProgrammingError as e:
+            raise PostgrezExecuteError('Unable to fetch results. Error: %s' % e)
+        if columns:
+            cols = [desc[0] for desc in c.cursor.description]
+            results = [dict(zip(cols, row)) for row in results]
+    return results
+
+
+async def load(table_name, filename=None, data=None, host=None, database=None,
+                user=None, password=None, port=DEFAULT_PORT,
+                setup=DEFAULT_SETUP, setup_path=DEFAULT_SETUP_PATH, **kwargs):
+    """Coroutine version of wrapper.load(). Loads a file if filename is
+    provided, otherwise loads data.
+
+    Args:
+        table_name (str): name of table to load data into.
+        filename (str, optional): name of the file. Defaults to None.
+        data (iterable, optional): rows to load. Defaults to None.
+        host (str, optional): Database host url. Defaults to None.
+        database (str, optional): Database name. Defaults to None.
+        user (str, optional): Username. Defaults to None.
+        password (str, optional): Password. Defaults to None.
+        setup (str, optional): Name of the db setup to use in ~/.postgrez.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        **kwargs: Keyword arguments of Cmd.load_from_file() or
+            Cmd.load_from_object().
+
+    Returns:
+        summary (dict): Summary returned by Cmd.load_from_object(), None for
+        files.
+    """
+    c = AsyncCmd(host=host, database=database, user=user, password=password,
+                 port=port, setup=setup, setup_path=setup_path)
+    if filename is not None:
+        return await c.load_from_file(table_name, filename, **kwargs)
+    return await c.load_from_object(table_name, data, **kwargs)
+
+
+async def export(query, filename=None, host=None, database=None, user=None,
+                    password=None, port=DEFAULT_PORT, setup=DEFAULT_SETUP,
+                    setup_path=DEFAULT_SETUP_PATH, **kwargs):
+    """Coroutine version of wrapper.export(). Exports to a file if filename
+    is provided, otherwise returns the rows.
+
+    Args:
+        query (str): A select query or a table
+        filename (str, optional): Filename to copy to. Defaults to None.
+        host (str, optional): Database host url. Defaults to None.
+        database (str, optional): Database name. Defaults to None.
+        user (str, optional): Username. Defaults to None.
+        password (str, optional): Password. Defaults to None.
+        setup (str, optional): Name of the db setup to use in ~/.postgrez.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        **kwargs: Keyword arguments of Cmd.export_to_file() or
+            Cmd.export_to_object().
+
+    Returns:
+        data (list): Rows returned by Cmd.export_to_object(), None for files.
+    """
+    c = AsyncCmd(host=host, database=database, user=user, password=password,
+                 port=port, setup=setup, setup_path=setup_path)
+    if filename is not None:
+        return await c.export_to_file(query, filename, **kwargs)
+    return await c.export_to_object(query, **kwargs)
@@ -0,0 +1,128 @@
+"""
+Arrow module, contains the mapping of PostgreSQL types to Apache Arrow types
+used to export query results as Arrow record batches and Parquet files.
+Requires the optional pyarrow package.
+"""
+
+from . import types
+import json
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+## rows per record batch, and per parquet row group
+DEFAULT_ARROW_BATCH_SIZE = 65536
+
+## largest precision of the arrow decimal types
+DECIMAL128_PRECISION = 38
+DECIMAL256_PRECISION = 76
+
+
+def _str_or_none(values):
+    return [None if value is None else str(value) for value in values]
+
+
+def _float_or_none(values):
+    return [None if value is None else float(value) for value in values]
+
+
+def _json_or_none(values):
+    return [None if value is None else json.dumps(value) for value in values]
+
+
+def arrow_type(oid, precision=None, scale=None):
+    """Map a PostgreSQL type to an Arrow type, and the conversion applied to
+    the values decoded from binary COPY output (see binary.build_decoders())
+    before they are handed to pyarrow.
+
+    numeric columns declared with a precision become decimals, unconstrained
+    numerics become doubles. Intervals become durations, counting a month as
+    30 days. json and uuid values become strings. Types without a native
+    mapping are exported as their raw binary representation, cast them to
+    text in the query to export them as strings.
+
+    Args:
+        oid (int): Type OID, see the types module.
+        precision (int, optional): Declared precision of numeric columns.
+        scale (int, optional): Declared scale of numeric columns.
+
+    Returns:
+        arrow_type (pyarrow.DataType): The Arrow type.
+        convert (callable): Function converting a list of decoded values, or
+            None if they can be used as is.
+    """
+    if oid == types.NUMERIC:
+        if precision and precision <= DECIMAL128_PRECISION:
+            return pyarrow.decimal128(precision, scale or 0), None
+        if precision and precision <= DECIMAL256_PRECISION:
+            return pyarrow.decimal256(precision, scale or 0), None
+        return pyarrow.float64(), _float_or_none
+    if oid in types.TEXT_TYPES:
+        return pyarrow.string(), None
+    if oid in (types.JSON, types.JSONB):
+        return pyarrow.string(), _json_or_none
+    if oid == types.UUID:
+        return pyarrow.string(), _str_or_none
+    mapping = {
+        types.BOOL: pyarrow.bool_(),
+        types.INT2: pyarrow.int16(),
+        types.INT4: pyarrow.int32(),
+        types.INT8: pyarrow.int64(),
+        types.OID: pyarrow.uint32(),
+        types.FLOAT4: pyarrow.float32(),
+        types.FLOAT8: pyarrow.float64(),
+        types.DATE: pyarrow.date32(),
+        types.TIME: pyarrow.time64('us'),
+        types.TIMESTAMP: pyarrow.timestamp('us'),
+        types.TIMESTAMPTZ: pyarrow.timestamp('us', tz='UTC'),
+        types.INTERVAL: pyarrow.duration('us'),
+    }
+    return mapping.get(oid, pyarrow.binary()), None
+
+
+def build_schema(description):
+    """Build the Arrow schema of a query result.
+
+    Args:
+        description (list): cursor.description of the query, or a list of
+            (name, type OID[, display size, internal size, precision,
+            scale]) tuples.
+
+    Returns:
+        schema (pyarrow.Schema): One field per column.
+        converters (list): Conversion of each column, see arrow_type().
+    """
+    fields = []
+    converters = []
+    for column in description:
+        precision = column[4] if len(column) > 4 else None
+        scale = column[5] if len(column) > 5 else None
+        data_type, convert = arrow_type(column[1], precision, scale)
+        fields.append(pyarrow.field(column[0], data_type))
+        converters.append(convert)
+    return pyarrow.schema(fields), converters
+
+
+def build_record_batch(rows, schema, converters):
+    """Transpose decoded rows into a typed Arrow record batch.
+
+    Args:
+        rows (list): List of rows, each a sequence of one value per field.
+        schema (pyarrow.Schema): Schema returned by build_schema().
+        converters (list): Converters returned by build_schema().
+
+    Returns:
+        batch (pyarrow.RecordBatch): The record batch.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for values, field, convert in zip(columns, schema, converters):
+        values = list(values)
+        if convert is not None:
+            values = convert(values)
+        arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
@@ -0,0 +1,599 @@
+"""
+Binary module, contains encoders and decoders for PostgreSQL's binary COPY
+format. Refer
+to https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4 for
+a description of the format.
+"""
+
+from . import types
+import datetime
+import decimal
+import struct
+import json
+import uuid
+import re
+
+## binary copy framing
+SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+HEADER = SIGNATURE + struct.pack('!ii', 0, 0)
+TRAILER = struct.pack('!h', -1)
+NULL = struct.pack('!i', -1)
+
+## size in bytes of the chunks handed to copy_expert()
+DEFAULT_BUFFER_SIZE = 1048576
+
+## postgres epochs
+PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+PG_EPOCH = datetime.datetime(2000, 1, 1)
+PG_EPOCH_TZ = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+PG_EPOCH_ORDINAL = PG_EPOCH_DATE.toordinal()
+PG_EPOCH_JULIAN = 2451545
+
+## binary representations of -infinity and infinity
+DATE_NOBEGIN, DATE_NOEND = -2 ** 31, 2 ** 31 - 1
+TIMESTAMP_NOBEGIN, TIMESTAMP_NOEND = -2 ** 63, 2 ** 63 - 1
+
+## numeric sign flags
+NUMERIC_POS = 0x0000
+NUMERIC_NEG = 0x4000
+NUMERIC_NAN = 0xC000
+NUMERIC_PINF = 0xD000
+NUMERIC_NINF = 0xF000
+
+_INT2 = struct.Struct('!h')
+_INT4 = struct.Struct('!i')
+_INT8 = struct.Struct('!q')
+_UINT4 = struct.Struct('!I')
+_FLOAT4 = struct.Struct('!f')
+_FLOAT8 = struct.Struct('!d')
+_LEN_BOOL = struct.Struct('!i?')
+_LEN_INT2 = struct.Struct('!ih')
+_LEN_INT4 = struct.Struct('!ii')
+_LEN_INT8 = struct.Struct('!iq')
+_LEN_OID = struct.Struct('!iI')
+_LEN_FLOAT4 = struct.Struct('!if')
+_LEN_FLOAT8 = struct.Struct('!id')
+_NUMERIC_HEADER = struct.Struct('!ihhHh')
+_INTERVAL = struct.Struct('!iqii')
+
+
+def _fixed(packer, cast):
+    """Build an encoder for a fixed width type. Strings are converted with
+    `cast` before packing, other values of the wrong python type only if the
+    conversion is lossless, as COPY rejects e.g. 1.5 for an integer column.
+    """
+    size = packer.size - 4
+    pack = packer.pack
+
+    def encode(value):
+        try:
+            return pack(size, value)
+        except struct.error:
+            converted = cast(value)
+            if not isinstance(value, str) and converted != value:
+                raise ValueError('Invalid value %r for a column of type %s'
+                                 % (value, cast.__name__))
+            return pack(size, converted)
+    return encode
+
+
+def _encode_bool(value):
+    if isinstance(value, str):
+        value = value.strip().lower() in ('t', 'true', 'y', 'yes', 'on', '1')
+    return _LEN_BOOL.pack(1, value)
+
+
+## ISO 8601 dates, times and timestamps accepted in place of python values
+_DATETIME = re.compile(r'(\d{4})-(\d\d)-(\d\d)(?:[T ](\d\d):(\d\d)'
+                       r'(?::(\d\d)(?:\.(\d{1,6})\d*)?)?)?'
+                       r' ?(Z|[+-]\d\d(?::?\d\d)?)?$')
+_TIME = re.compile(r'(\d\d):(\d\d)(?::(\d\d)(?:\.(\d{1,6})\d*)?)?$')
+
+
+def _parse_datetime(value):
+    match = _DATETIME.match(str(value).strip())
+    if match is None:
+        raise ValueError('Invalid date or timestamp %r' % value)
+    (year, month, day, hour, minute, second, fraction,
+     offset) = match.groups()
+    tzinfo = None
+    if offset == 'Z':
+        tzinfo = datetime.timezone.utc
+    elif offset is not None:
+        delta = datetime.timedelta(hours=int(offset[1:3]),
+                                   minutes=int(offset[-2:]
+                                               if len(offset) > 3 else 0))
+        tzinfo = datetime.timezone(-delta if offset[0] == '-' else delta)
+    return datetime.datetime(int(year), int(month), int(day), int(hour or 0),
+                             int(minute or 0), int(second or 0),
+                             int((fraction or '').ljust(6, '0')),
+                             tzinfo=tzinfo)
+
+
+def _to_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return _parse_datetime(str(value)[:10]).date()
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return _parse_datetime(value)
+
+
+def _to_time(value):
+    if isinstance(value, datetime.time):
+        return value
+    match = _TIME.match(str(value).strip())
+    if match is None:
+        raise ValueError('Invalid time %r' % value)
+    hour, minute, second, fraction = match.groups()
+    return datetime.time(int(hour), int(minute), int(second or 0),
+                         int((fraction or '').ljust(6, '0')))
+
+
+def _text_encoder(encoding):
+    def encode(value):
+        data = (value if isinstance(value, str) else str(value)).encode(encoding)
+        return _INT4.pack(len(data)) + data
+    return encode
+
+
+def _json_encoder(encoding, prefix=b''):
+    def encode(value):
+        if not isinstance(value, str):
+            value = json.dumps(value)
+        data = prefix + value.encode(encoding)
+        return _INT4.pack(len(data)) + data
+    return encode
+
+
+def _encode_bytea(value):
+    data = bytes(value)
+    return _INT4.pack(len(data)) + data
+
+
+def _encode_uuid(value):
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(str(value))
+    return _INT4.pack(16) + value.bytes
+
+
+def _encode_date(value):
+    return _LEN_INT4.pack(4, _to_date(value).toordinal() - PG_EPOCH_ORDINAL)
+
+
+def _microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _encode_timestamp(value):
+    """Encode a timestamp without time zone. Aware datetimes are encoded
+    with their wall clock time.
+    """
+    if value.__class__ is not datetime.datetime or value.tzinfo is not None:
+        value = _to_datetime(value).replace(tzinfo=None)
+    return _LEN_INT8.pack(8, _microseconds(value - PG_EPOCH))
+
+
+def _encode_timestamptz(value):
+    """Encode a timestamp with time zone. Naive datetimes are assumed to be
+    in UTC.
+    """
+    value = _to_datetime(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return _LEN_INT8.pack(8, _microseconds(value - PG_EPOCH_TZ))
+
+
+def _encode_time(value):
+    value = _to_time(value)
+    micros = (((value.hour * 60 + value.minute) * 60 + value.second) * 1000000
+              + value.microsecond)
+    return _LEN_INT8.pack(8, micros)
+
+
+def _encode_interval(value):
+    """Encode a datetime.timedelta as an interval of days and microseconds.
+    """
+    micros = value.seconds * 1000000 + value.microseconds
+    return _INTERVAL.pack(16, micros, value.days, 0)
+
+
+def _encode_numeric(value):
+    """Encode a number as a base 10000 numeric.
+    """
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(str(value))
+    if value.is_nan():
+        return _NUMERIC_HEADER.pack(8, 0, 0, NUMERIC_NAN, 0)
+    if value.is_infinite():
+        sign = NUMERIC_NINF if value.is_signed() else NUMERIC_PINF
+        return _NUMERIC_HEADER.pack(8, 0, 0, sign, 0)
+
+    text = format(value, 'f')
+    negative = text.startswith('-')
+    int_part, _, frac = text.lstrip('-').partition('.')
+    dscale = len(frac)
+
+    ## scale to an integer whose base 10000 digits align with the point
+    pad = -dscale % 4
+    number = int(int_part + frac) * 10 ** pad
+    groups = []
+    while number:
+        number, group = divmod(number, 10000)
+        groups.append(group)
+    weight = len(groups) - (dscale + pad) // 4 - 1
+
+    ## groups are least significant first, drop trailing zero groups
+    start = 0
+    while start < len(groups) and groups[start] == 0:
+        start += 1
+    groups = groups[start:][::-1]
+    if not groups:
+        weight = 0
+
+    header = _NUMERIC_HEADER.pack(8 + 2 * len(groups), len(groups), weight,
+                                  NUMERIC_NEG if negative else NUMERIC_POS,
+                                  dscale)
+    return header + struct.pack('!%dh' % len(groups), *groups)
+
+
+def build_encoders(type_oids, encoding='utf-8'):
+    """Build one binary encoder per column. Each encoder converts a non-null
+    python value into the length-prefixed binary representation of a field.
+
+    Args:
+        type_oids (list): Type OID of each column.
+        encoding (str, optional): Python codec used for text columns.
+            Defaults to 'utf-8'.
+
+    Returns:
+        encoders (list): One callable per column.
+
+    Raises:
+        ValueError: If a column's type has no binary encoder.
+    """
+    encoders = {
+        types.BOOL: _encode_bool,
+        types.INT2: _fixed(_LEN_INT2, int),
+        types.INT4: _fixed(_LEN_INT4, int),
+        types.INT8: _fixed(_LEN_INT8, int),
+        types.OID: _fixed(_LEN_OID, int),
+        types.FLOAT4: _fixed(_LEN_FLOAT4, float),
+        types.FLOAT8: _fixed(_LEN_FLOAT8, float),
+        types.NUMERIC: _encode_numeric,
+        types.BYTEA: _encode_bytea,
+        types.UUID: _encode_uuid,
+        types.DATE: _encode_date,
+        types.TIME: _encode_time,
+        types.TIMESTAMP: _encode_timestamp,
+        types.TIMESTAMPTZ: _encode_timestamptz,
+        types.INTERVAL: _encode_interval,
+        types.JSON: _json_encoder(encoding),
+        types.JSONB: _json_encoder(encoding, prefix=b'\x01'),
+    }
+    text = _text_encoder(encoding)
+    for oid in types.TEXT_TYPES:
+        encoders[oid] = text
+
+    try:
+        return [encoders[oid] for oid in type_oids]
+    except KeyError as e:
+        raise ValueError('No binary encoder for type OID %s' % e.args[0])
+
+
+def build_row_encoder(encoders):
+    """Build a function encoding a whole row into a binary COPY tuple.
+
+    Args:
+        encoders (list): Encoders returned by build_encoders().
+
+    Returns:
+        encode_row (callable): Function converting a tuple with one value per
+        encoder into bytes. None is encoded as a null. Raises a ValueError if
+        a row does not have one value per encoder.
+    """
+    width = len(encoders)
+    tuple_header = _INT2.pack(width)
+    join = b''.join
+
+    def encode_row(row):
+        if len(row) != width:
+            raise ValueError('Expected %s values per row, got %s: %r' %
+                             (width, len(row), row))
+        return tuple_header + join([NULL if value is None else encode(value)
+                                    for encode, value in zip(encoders, row)])
+    return encode_row
+
+
+def iter_copy_chunks(encoded_rows, buffer_size=DEFAULT_BUFFER_SIZE):
+    """Frame encoded rows with the binary COPY header and trailer and join
+    them into large chunks.
+
+    Args:
+        encoded_rows (iterable): Iterable of rows encoded by a row encoder.
+        buffer_size (int, optional): Size in bytes of the yielded chunks.
+            Defaults to 1048576.
+
+    Yields:
+        chunk (bytes): Chunk of roughly buffer_size bytes, starting with the
+        COPY header and ending with the COPY trailer.
+    """
+    join = b''.join
+    parts = [HEADER]
+    size = len(HEADER)
+    for data in encoded_rows:
+        parts.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield join(parts)
+            parts = []
+            size = 0
+    parts.append(TRAILER)
+    yield join(parts)
+
+
+def iter_copy_binary(rows, encoders, buffer_size=DEFAULT_BUFFER_SIZE):
+    """Encode rows into PostgreSQL's binary COPY format.
+
+    Args:
+        rows (iterable): Iterable of tuples, one value per encoder. None is
+            encoded as a null.
+        encoders (list): Encoders returned by build_encoders().
+        buffer_size (int, optional): Size in bytes of the yielded chunks.
+            Defaults to 1048576.
+
+    Returns:
+        chunks (generator): Generator of chunks of roughly buffer_size bytes,
+        see iter_copy_chunks(). Raises a ValueError if a row does not have
+        one value per encoder.
+    """
+    return iter_copy_chunks(map(build_row_encoder(encoders), rows),
+                            buffer_size=buffer_size)
+
+
+def _decode_numeric(data):
+    ndigits, weight, sign, dscale = _NUMERIC_HEADER.unpack_from(
+        b'\x00\x00\x00\x00' + data[:8])[1:]
+    if sign == NUMERIC_NAN:
+        return decimal.Decimal('NaN')
+    if sign == NUMERIC_PINF:
+        return decimal.Decimal('Infinity')
+    if sign == NUMERIC_NINF:
+        return decimal.Decimal('-Infinity')
+    groups = struct.unpack_from('!%dh' % ndigits, data, 8)
+    coefficient = int(''.join(['%04d' % group for group in groups]) or '0')
+
+    ## rescale the coefficient so the value has exactly dscale decimals, any
+    ## digits dropped are padding of the last base 10000 group
+    shift = 4 * (weight + 1 - ndigits) + dscale
+    if shift >= 0:
+        coefficient *= 10 ** shift
+    else:
+        coefficient //= 10 ** -shift
+    return decimal.Decimal('%s%dE-%d' % ('-' if sign == NUMERIC_NEG else '',
+                                         coefficient, dscale))
+
+
+def _date_text(days, micros=None, offset=''):
+    """Format a date, or a timestamp if micros is given, outside the range of
+    python dates as PostgreSQL's ISO text output, i.e. '0044-03-15 BC'. The
+    calendar conversion is PostgreSQL's j2date().
+    """
+    julian = days + PG_EPOCH_JULIAN + 32044
+    quad = julian // 146097
+    extra = (julian - quad * 146097) * 4 + 3
+    julian += 60 + quad * 3 + extra // 146097
+    quad = julian // 1461
+    julian -= quad * 1461
+    year = julian * 4 // 1461
+    julian = ((julian + 305) % 365 if year else (julian + 306) % 366) + 123
+    year += quad * 4 - 4800
+    quad = julian * 2141 // 65536
+    day = julian - 7834 * quad // 256
+    month = (quad + 10) % 12 + 1
+
+    text = '%04d-%02d-%02d' % (year if year > 0 else 1 - year, month, day)
+    if micros is not None:
+        seconds, fraction = divmod(micros, 1000000)
+        text += ' %02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+                                     seconds % 60)
+        if fraction:
+            text += ('.%06d' % fraction).rstrip('0')
+        text += offset
+    return text if year > 0 else text + ' BC'
+
+
+def _decode_date(data):
+    days = _INT4.unpack(data)[0]
+    if days == DATE_NOEND:
+        return datetime.date.max
+    if days == DATE_NOBEGIN:
+        return datetime.date.min
+    try:
+        return datetime.date.fromordinal(days + PG_EPOCH_ORDINAL)
+    except (ValueError, OverflowError):
+        ## BC or after year 9999, keep the text form
+        return _date_text(days)
+
+
+def _decode_timestamp(epoch):
+    maximum = epoch.replace(year=9999, month=12, day=31, hour=23, minute=59,
+                            second=59, microsecond=999999)
+    minimum = epoch.replace(year=1, month=1, day=1)
+    offset = '' if epoch.tzinfo is None else '+00'
+
+    def decode(data):
+        micros = _INT8.unpack(data)[0]
+        if micros == TIMESTAMP_NOEND:
+            return maximum
+        if micros == TIMESTAMP_NOBEGIN:
+            return minimum
+        try:
+            return epoch + datetime.timedelta(microseconds=micros)
+        except OverflowError:
+            ## BC or after year 9999, keep the text form
+            days, micros = divmod(micros, 86400000000)
+            return _date_text(days, micros, offset)
+    return decode
+
+
+def _decode_time(data):
+    seconds, micros = divmod(_INT8.unpack(data)[0], 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return datetime.time(hours, minutes, seconds, micros)
+
+
+def _decode_interval(data):
+    """Decode an interval into a datetime.timedelta, counting a month as 30
+    days.
+    """
+    micros, days, months = _INTERVAL.unpack(b'\x00\x00\x00\x10' + data)[1:]
+    return datetime.timedelta(days=days + 30 * months, microseconds=micros)
+
+
+def _text_decoder(encoding):
+    def decode(data):
+        return data.decode(encoding)
+    return decode
+
+
+def _json_decoder(encoding, skip=0):
+    def decode(data):
+        return json.loads(data[skip:].decode(encoding))
+    return decode
+
+
+def _unpacker(packer):
+    unpack = packer.unpack
+
+    def decode(data):
+        return unpack(data)[0]
+    return decode
+
+
+def build_decoders(type_oids, encoding='utf-8'):
+    """Build one binary decoder per column. Each decoder converts the binary
+    representation of a non-null field into a native python value. Columns
+    whose type has no decoder are returned as raw bytes. Dates and timestamps
+    outside the range of python dates are returned in their ISO text form,
+    UTC for timestamptz, and +/-infinity as the python limits.
+
+    Args:
+        type_oids (list): Type OID of each column.
+        encoding (str, optional): Python codec used for text columns.
+            Defaults to 'utf-8'.
+
+    Returns:
+        decoders (list): One callable per column.
+    """
+    decoders = {
+        types.BOOL: lambda data: data == b'\x01',
+        types.INT2: _unpacker(_INT2),
+        types.INT4: _unpacker(_INT4),
+        types.INT8: _unpacker(_INT8),
+        types.OID: _unpacker(_UINT4),
+        types.FLOAT4: _unpacker(_FLOAT4),
+        types.FLOAT8: _unpacker(_FLOAT8),
+        types.NUMERIC: _decode_numeric,
+        types.BYTEA: bytes,
+        types.UUID: lambda data: uuid.UUID(bytes=data),
+        types.DATE: _decode_date,
+        types.TIME: _decode_time,
+        types.TIMESTAMP: _decode_timestamp(PG_EPOCH),
+        types.TIMESTAMPTZ: _decode_timestamp(PG_EPOCH_TZ),
+        types.INTERVAL: _decode_interval,
+        types.JSON: _json_decoder(encoding),
+        types.JSONB: _json_decoder(encoding, skip=1),
+    }
+    text = _text_decoder(encoding)
+    for oid in types.TEXT_TYPES:
+        decoders[oid] = text
+    return [decoders.get(oid, bytes) for oid in type_oids]
+
+
+def iter_binary_rows(chunks, decoders):
+    """Incrementally parse PostgreSQL's binary COPY format. Rows may span
+    chunk boundaries: parsing stops at the first incomplete field, and
+    resumes once enough chunks have been buffered to complete it.
+
+    Args:
+        chunks (iterable): Iterable of bytes, e.g. the output of a
+            COPY ... TO STDOUT (FORMAT binary) query.
+        decoders (list): Decoders returned by build_decoders(), one per
+            column.
+
+    Yields:
+        row (list): Decoded values of a row, None for nulls.
+
+    Raises:
+        ValueError: If the data is not valid binary COPY data or does not
+            have one field per decoder.
+    """
+    chunks = iter(chunks)
+    unpack_int2 = _INT2.unpack_from
+    unpack_int4 = _INT4.unpack_from
+    width = len(decoders)
+
+    buf = bytearray()
+    while len(buf) < len(HEADER):
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError('Truncated binary COPY header')
+        buf += chunk
+    if not buf.startswith(SIGNATURE):
+        raise ValueError('Invalid binary COPY signature')
+    pos = len(HEADER) + unpack_int4(buf, len(SIGNATURE) + 4)[0]
+
+    ## values decoded so far of the current row, and the buffer length
+    ## needed to parse its next field
+    row = None
+    need = pos
+    while True:
+        if len(buf) < need:
+            ## drop the parsed bytes, then buffer the rest of the field
+            del buf[:pos]
+            need -= pos
+            pos = 0
+            while len(buf) < need:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    raise ValueError('Truncated binary COPY data')
+                buf += chunk
+        end = len(buf)
+
+        if row is None:
+            if pos + 2 > end:
+                need = pos + 2
+                continue
+            count = unpack_int2(buf, pos)[0]
+            if count == -1:
+                return
+            if count != width:
+                raise ValueError('Expected %s fields per row, got %s' %
+                                 (width, count))
+            pos += 2
+            row = []
+
+        while len(row) < width:
+            if pos + 4 > end:
+                need = pos + 4
+                break
+            size = unpack_int4(buf, pos)[0]
+            if size == -1:
+                row.append(None)
+                pos += 4
+                continue
+            if pos + 4 + size > end:
+                need = pos + 4 + size
+                break
+            row.append(decoders[len(row)](bytes(buf[pos + 4:pos + 4 + size])))
+            pos += 4 + size
+        else:
+            yield row
+            row = None
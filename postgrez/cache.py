@@ -0,0 +1,249 @@
+"""
+Cache module, contains an in-memory result cache for read-only queries with
+TTL and LRU eviction, and invalidation by table.
+"""
+
+from .utils import is_query
+import collections
+import threading
+import logging
+import pickle
+import time
+import re
+
+LOGGER = logging.getLogger(__name__)
+
+## cache defaults
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1000
+
+## tables referenced in FROM and JOIN clauses
+TABLE_REFERENCE = re.compile(r'\b(?:from|join)\s+((?:"[^"]+"|\w+)'
+                             r'(?:\s*\.\s*(?:"[^"]+"|\w+))*)', re.IGNORECASE)
+
+## selects with side effects: row locks and sequence or advisory lock calls
+SIDE_EFFECT = re.compile(r'\bfor\s+(?:no\s+key\s+)?update\b|'
+                         r'\bfor\s+(?:key\s+)?share\b|'
+                         r'\b(?:nextval|setval|pg_advisory\w*)\s*\(',
+                         re.IGNORECASE)
+
+## returned by ResultCache.get() on a cache miss
+MISSING = object()
+
+## process-wide cache used by wrapper.execute(cache=True)
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def extract_tables(query):
+    """Extract the names of the tables referenced in the FROM and JOIN clauses
+    of a query. Schema prefixes and quotes are removed and unquoted names are
+    lowercased, so 'FROM public.Users' is tagged 'users'.
+
+    Args:
+        query (str): A select query or a table name.
+
+    Returns:
+        tables (set): Names of the referenced tables.
+    """
+    if not is_query(query):
+        return set([_table_tag(query)])
+    return set(_table_tag(match) for match in TABLE_REFERENCE.findall(query))
+
+
+def is_cacheable(query):
+    """Check whether the results of a query can be served from the cache, i.e.
+    it is a select query without locking clauses or calls to sequence and
+    advisory lock functions. Other volatile functions, such as random() or
+    now(), are not detected.
+
+    Args:
+        query (str): A select query or a table name.
+
+    Returns:
+        is_cacheable (bool): True if the results can be cached.
+    """
+    return is_query(query) and SIDE_EFFECT.search(query) is None
+
+
+def _table_tag(name):
+    """Normalize a possibly schema-qualified table name into a tag.
+    """
+    name = name.strip().rsplit('.', 1)[-1].strip()
+    if name.startswith('"') and name.endswith('"'):
+        return name[1:-1]
+    return name.lower()
+
+
+def freeze(value):
+    """Convert query variables into a hashable cache key component.
+
+    Args:
+        value: Query variables, i.e. a tuple, list or dict.
+
+    Returns:
+        frozen (tuple or object): Hashable equivalent of value.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+
+class ResultCache(object):
+    """Thread-safe cache of query results. Entries expire `ttl` seconds after
+    they are stored and the least recently used entries are evicted once
+    `max_entries` or `max_bytes` is exceeded. Every entry is tagged with the
+    tables it was read from, so it can be invalidated when they change.
+
+    Cached results are shared between callers and must not be modified.
+
+    Attributes:
+        ttl (float): Seconds an entry stays valid. None never expires entries.
+        max_entries (int): Maximum number of entries.
+        max_bytes (int): Maximum total size of the entries, measured as the
+            size of their pickled results. None disables the limit.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                    max_bytes=None):
+        """
+        Args:
+            ttl (float, optional): Seconds an entry stays valid. Defaults to
+                60.
+            max_entries (int, optional): Maximum number of entries. Defaults
+                to 1000.
+            max_bytes (int, optional): Maximum total size of the entries.
+                Defaults to None.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        ## {key: (expires, size, tags, value)}
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'expirations': 0, 'invalidations': 0}
+
+    def _remove(self, key):
+        """Remove an entry. Must be called with the lock held.
+        """
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """Return the cached value of key.
+
+        Args:
+            key (hashable): Cache key.
+
+        Returns:
+            value: Cached value, or MISSING if key is not cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and \
+                    entry[0] < time.time():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[3]
+
+    def set(self, key, value, tags=()):
+        """Store a value, evicting the least recently used entries if the
+        cache is full. Values larger than max_bytes are not stored.
+
+        Args:
+            key (hashable): Cache key.
+            value: Value to store, must be picklable if max_bytes is set.
+            tags (iterable, optional): Tables the value was read from.
+        """
+        size = (len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                if self.max_bytes is not None else 0)
+        if self.max_bytes is not None and size > self.max_bytes:
+            LOGGER.debug('Not caching result of %s bytes' % size)
+            return
+        expires = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, size, frozenset(tags), value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and
+                    self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, *tables):
+        """Remove the entries read from any of the supplied tables.
+
+        Args:
+            *tables (str): Table names, optionally schema-qualified.
+
+        Returns:
+            removed (int): Number of entries removed.
+        """
+        tags = set(_table_tag(table) for table in tables)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if entry[2] & tags]
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        """Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return the cache counters.
+
+        Returns:
+            stats (dict): Dict containing the number of 'hits', 'misses',
+            'evictions', 'expirations' and 'invalidations', and the current
+            number of 'entries' and 'bytes'.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        return stats
+
+
+def get_cache():
+    """Return the process-wide result cache, creating it on first use.
+
+    Returns:
+        cache (ResultCache): The process-wide cache.
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResultCache()
+    return _CACHE
+
+
+def invalidate(*tables):
+    """Remove the entries read from any of the supplied tables from the
+    process-wide cache.
+
+    Args:
+        *tables (str): Table names, optionally schema-qualified.
+
+    Returns:
+        removed (int): Number of entries removed.
+    """
+    return get_cache().invalidate(*tables)
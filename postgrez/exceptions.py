@@ -37,3 +37,8 @@ class PostgrezLoadError(Postgrez):
 class PostgrezExportError(Postgrez):
     """Raised when there is an error running the Export.export_to() functions.
     """
+
+
+class PostgrezPoolError(Postgrez):
+    """Raised when a connection cannot be checked out of a connection pool.
+    """
@@ -0,0 +1,223 @@
+"""
+Metrics module, contains the registry of instrumentation hooks called after
+every Cmd operation, and built-in collectors for the events they receive.
+
+Every event is a dict containing:
+    operation (str): Cmd method, i.e. 'execute' or 'load_from_file', or
+        'connect' when a connection is opened or borrowed.
+    target (str): Start of the query, or the table name.
+    database (str): Database name.
+    wall (float): Seconds spent in the operation.
+    server (float): Seconds spent waiting on psycopg2 calls to the database,
+        including network time.
+    connect (float): Seconds spent opening the operation's connection.
+    rows (int): Rows returned, affected or copied, None if unknown.
+    bytes (int): Bytes copied, None if unknown.
+    error (str): Error message if the operation failed, otherwise None.
+"""
+
+import threading
+import logging
+import socket
+import bisect
+import math
+
+LOGGER = logging.getLogger(__name__)
+
+## upper bounds in seconds of the histogram buckets, from 0.1ms to ~100s
+DEFAULT_BUCKETS = [0.0001 * 2 ** i for i in range(21)]
+
+## statsd defaults
+DEFAULT_STATSD_HOST = 'localhost'
+DEFAULT_STATSD_PORT = 8125
+DEFAULT_STATSD_PREFIX = 'postgrez'
+
+## hooks called for the operations of every connection
+_HOOKS = []
+_HOOKS_LOCK = threading.Lock()
+
+
+def add_hook(hook):
+    """Register a callable which is called with every event.
+
+    Args:
+        hook (callable): Called with the event dict.
+    """
+    with _HOOKS_LOCK:
+        _HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    """Unregister a hook registered with add_hook().
+
+    Args:
+        hook (callable): The hook to remove.
+    """
+    with _HOOKS_LOCK:
+        if hook in _HOOKS:
+            _HOOKS.remove(hook)
+
+
+def clear_hooks():
+    """Unregister all hooks registered with add_hook().
+    """
+    with _HOOKS_LOCK:
+        del _HOOKS[:]
+
+
+def has_hooks(hooks=None):
+    """Check whether any event would be delivered.
+
+    Args:
+        hooks (list, optional): Hooks of a single connection.
+
+    Returns:
+        has_hooks (bool): True if any hook is registered.
+    """
+    return bool(_HOOKS or hooks)
+
+
+def emit(event, hooks=None):
+    """Deliver an event to the global hooks and the supplied hooks. Errors
+    raised by hooks are logged and ignored.
+
+    Args:
+        event (dict): The event, see the module docstring.
+        hooks (list, optional): Hooks of a single connection.
+    """
+    for hook in list(_HOOKS) + list(hooks or []):
+        try:
+            hook(event)
+        except Exception as e:
+            LOGGER.warning('Instrumentation hook %r failed. Error: %s' %
+                           (hook, e))
+
+
+class Histogram(object):
+    """Hook which aggregates the events of each operation in memory: counts,
+    errors, rows and bytes, and a histogram of wall times with exponential
+    buckets for percentile estimates.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets (list, optional): Sorted upper bounds in seconds of the
+                histogram buckets. Defaults to 0.1ms doubling up to ~100s.
+        """
+        self.buckets = list(buckets)
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            op = self._ops.get(event['operation'])
+            if op is None:
+                op = self._ops[event['operation']] = {
+                    'count': 0, 'errors': 0, 'rows': 0, 'bytes': 0,
+                    'wall': 0.0, 'server': 0.0, 'max': 0.0,
+                    'counts': [0] * (len(self.buckets) + 1)}
+            op['count'] += 1
+            op['errors'] += event['error'] is not None
+            op['rows'] += event['rows'] or 0
+            op['bytes'] += event['bytes'] or 0
+            op['wall'] += event['wall']
+            op['server'] += event['server']
+            op['max'] = max(op['max'], event['wall'])
+            op['counts'][bisect.bisect_left(self.buckets, event['wall'])] += 1
+
+    def _percentile(self, op, fraction):
+        """Estimate a percentile of the wall times as the upper bound of the
+        bucket containing it.
+        """
+        rank = int(math.ceil(fraction * op['count']))
+        seen = 0
+        for i, count in enumerate(op['counts']):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[i], op['max']) \
+                    if i < len(self.buckets) else op['max']
+        return op['max']
+
+    def summary(self):
+        """Summarize the recorded events.
+
+        Returns:
+            summary (dict): Dict keyed by operation, with the 'count' of
+            events, 'errors', total 'rows', 'bytes', 'wall' and 'server'
+            seconds, and the 'mean', 'p50', 'p95', 'p99' and 'max' wall
+            seconds.
+        """
+        with self._lock:
+            summary = {}
+            for name, op in self._ops.items():
+                summary[name] = {
+                    'count': op['count'], 'errors': op['errors'],
+                    'rows': op['rows'], 'bytes': op['bytes'],
+                    'wall': op['wall'], 'server': op['server'],
+                    'mean': op['wall'] / op['count'], 'max': op['max'],
+                    'p50': self._percentile(op, 0.5),
+                    'p95': self._percentile(op, 0.95),
+                    'p99': self._percentile(op, 0.99)}
+        return summary
+
+    def reset(self):
+        """Discard the recorded events.
+        """
+        with self._lock:
+            self._ops.clear()
+
+
+class StatsdEmitter(object):
+    """Hook which sends every event to a statsd server over UDP, as timers of
+    the wall, server and connect times and counters of the calls, errors,
+    rows and bytes, i.e. `postgrez.execute.wall:12.5|ms`.
+    """
+    def __init__(self, host=DEFAULT_STATSD_HOST, port=DEFAULT_STATSD_PORT,
+                    prefix=DEFAULT_STATSD_PREFIX):
+        """
+        Args:
+            host (str, optional): statsd host. Defaults to 'localhost'.
+            port (int, optional): statsd port. Defaults to 8125.
+            prefix (str, optional): Prefix of the metric names. Defaults to
+                'postgrez'.
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, event):
+        """Format an event into statsd lines.
+
+        Args:
+            event (dict): The event, see the module docstring.
+
+        Returns:
+            lines (list): statsd lines.
+        """
+        name = '%s.%s' % (self.prefix, event['operation'])
+        lines = ['%s.calls:1|c' % name,
+                 '%s.wall:%.3f|ms' % (name, event['wall'] * 1000)]
+        if event['server']:
+            lines.append('%s.server:%.3f|ms' % (name, event['server'] * 1000))
+        if event['connect']:
+            lines.append('%s.connect:%.3f|ms' % (name,
+                                                 event['connect'] * 1000))
+        if event['rows']:
+            lines.append('%s.rows:%s|c' % (name, event['rows']))
+        if event['bytes']:
+            lines.append('%s.bytes:%s|c' % (name, event['bytes']))
+        if event['error'] is not None:
+            lines.append('%s.errors:1|c' % name)
+        return lines
+
+    def __call__(self, event):
+        try:
+            self._sock.sendto('\n'.join(self.format(event)).encode('utf-8'),
+                              self.address)
+        except OSError as e:
+            LOGGER.debug('Unable to send metrics to statsd. Error: %s' % e)
+
+    def close(self):
+        """Close the UDP socket.
+        """
+        self._sock.close()
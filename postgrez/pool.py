@@ -0,0 +1,270 @@
+"""
+Pool module, contains a thread-safe connection pool and a process-wide
+registry of pools keyed by resolved connection parameters.
+"""
+
+import warnings
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    import psycopg2
+    import psycopg2.extensions
+from .exceptions import PostgrezPoolError
+import collections
+import threading
+import logging
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+## pool defaults
+DEFAULT_MINCONN = 1
+DEFAULT_MAXCONN = 10
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_CHECKOUT_TIMEOUT = 30
+
+## process-wide pool registry
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of psycopg2 connections to a single database.
+
+    Idle connections are handed out most-recently-used first, connections idle
+    for longer than `idle_timeout` are closed (while keeping `minconn` open)
+    and every connection is health checked before it is handed out.
+
+    Attributes:
+        minconn (int): Number of connections kept open while idle.
+        maxconn (int): Maximum number of connections open at any time.
+        idle_timeout (float): Seconds after which an idle connection is
+            closed. None disables idle eviction.
+        check_on_checkout (bool): Run a `SELECT 1` on idle connections before
+            handing them out.
+        conn_params (dict): Keyword arguments passed to psycopg2.connect().
+    """
+    def __init__(self, minconn=DEFAULT_MINCONN, maxconn=DEFAULT_MAXCONN,
+                    idle_timeout=DEFAULT_IDLE_TIMEOUT, check_on_checkout=True,
+                    **conn_params):
+        """Initialize the pool and open `minconn` connections.
+
+        Args:
+            minconn (int, optional): Number of connections kept open while
+                idle. Defaults to 1.
+            maxconn (int, optional): Maximum number of connections open at
+                any time. Defaults to 10.
+            idle_timeout (float, optional): Seconds after which an idle
+                connection is closed. Defaults to 300.
+            check_on_checkout (bool, optional): Run a `SELECT 1` on idle
+                connections before handing them out. Defaults to True.
+            **conn_params: host, port, database, user and password passed to
+                psycopg2.connect().
+
+        Raises:
+            PostgrezPoolError: If minconn or maxconn are invalid.
+        """
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise PostgrezPoolError('Invalid pool size: minconn=%s, '
+                                    'maxconn=%s' % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.check_on_checkout = check_on_checkout
+        self.conn_params = conn_params
+        self.closed = False
+
+        self._idle = collections.deque()
+        self._used = set()
+        self._pending = 0
+        self._lock = threading.Condition(threading.Lock())
+
+        for _ in range(minconn):
+            self._idle.append((self._new_conn(), time.time()))
+
+    def _new_conn(self):
+        """Open a new psycopg2 connection.
+
+        Returns:
+            conn (psycopg2 connection): A new connection.
+        """
+        LOGGER.info('Opening pooled connection to %s database' %
+                    self.conn_params.get('database'))
+        return psycopg2.connect(**self.conn_params)
+
+    def _healthy(self, conn):
+        """Check whether an idle connection can be handed out.
+
+        Args:
+            conn (psycopg2 connection): Connection to check.
+
+        Returns:
+            healthy (bool): True if the connection is usable.
+        """
+        if conn.closed:
+            return False
+        if not self.check_on_checkout:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except psycopg2.Error as e:
+            LOGGER.warning('Discarding unhealthy pooled connection. '
+                           'Error: %s' % e)
+            return False
+        return True
+
+    def _evict_idle(self):
+        """Close idle connections older than idle_timeout, keeping minconn
+        connections open. Must be called with the lock held.
+        """
+        if self.idle_timeout is None:
+            return
+        cutoff = time.time() - self.idle_timeout
+        ## idle connections are appended on the right, so the oldest are on
+        ## the left
+        while (self._idle and self._idle[0][1] < cutoff and
+                len(self._idle) + len(self._used) + self._pending >
+                self.minconn):
+            conn, _ = self._idle.popleft()
+            LOGGER.debug('Closing connection idle for more than %ss' %
+                         self.idle_timeout)
+            conn.close()
+
+    def getconn(self, timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        """Check a connection out of the pool, opening a new one if none are
+        idle and the pool is not full.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a connection when
+                the pool is exhausted. Defaults to 30. None waits forever.
+
+        Returns:
+            conn (psycopg2 connection): A healthy connection.
+
+        Raises:
+            PostgrezPoolError: If the pool is closed or no connection became
+                available within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while True:
+                if self.closed:
+                    raise PostgrezPoolError('Connection pool is closed')
+                self._evict_idle()
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    break
+                if len(self._used) + self._pending < self.maxconn:
+                    conn = None
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise PostgrezPoolError('Timed out waiting for a '
+                        'connection, all %s connections are in use' %
+                        self.maxconn)
+                self._lock.wait(remaining)
+            ## reserve the slot, health checks and connects happen outside
+            ## of the lock
+            self._pending += 1
+
+        try:
+            if conn is None or not self._healthy(conn):
+                if conn is not None:
+                    conn.close()
+                conn = self._new_conn()
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._pending -= 1
+            self._used.add(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool. Any open transaction is rolled
+        back, connections in an unknown state are closed.
+
+        Args:
+            conn (psycopg2 connection): Connection checked out with getconn().
+            close (bool, optional): Close the connection instead of keeping it
+                idle. Defaults to False.
+        """
+        if not conn.closed and not close:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._lock:
+            self._used.discard(conn)
+            if close or conn.closed or self.closed:
+                if not conn.closed:
+                    conn.close()
+            else:
+                self._idle.append((conn, time.time()))
+            self._lock.notify()
+
+    def closeall(self):
+        """Close all idle connections and refuse further checkouts. Checked
+        out connections are closed when they are returned.
+        """
+        with self._lock:
+            self.closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+            self._lock.notify_all()
+
+    def stats(self):
+        """Return the number of idle and checked out connections.
+
+        Returns:
+            stats (dict): Dict in the format {'idle': int, 'used': int}.
+        """
+        with self._lock:
+            return {'idle': len(self._idle),
+                    'used': len(self._used) + self._pending}
+
+
+def get_pool(host=None, port=None, database=None, user=None, password=None,
+                **pool_kwargs):
+    """Return the process-wide pool for the supplied connection parameters,
+    creating it on first use.
+
+    Args:
+        host (str): Database host url.
+        port (int): Connection port number.
+        database (str): Database name.
+        user (str): Username.
+        password (str): Password.
+        **pool_kwargs: minconn, maxconn, idle_timeout and check_on_checkout
+            used when the pool is created. Ignored if the pool exists.
+
+    Returns:
+        pool (ConnectionPool): Pool for the supplied connection parameters.
+    """
+    key = (host, port, database, user, password)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(host=host, port=port, database=database,
+                                  user=user, password=password, **pool_kwargs)
+            _POOLS[key] = pool
+    return pool
+
+
+def close_pools():
+    """Close and forget every pool created by get_pool().
+    """
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.closeall()
+        _POOLS.clear()
@@ -6,25 +6,345 @@ import warnings
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
     import psycopg2
-from .utils import read_yaml, IteratorFile, build_copy_query
-from .exceptions import (PostgrezConfigError, PostgrezConnectionError,
-                            PostgrezExecuteError, PostgrezLoadError,
-                            PostgrezExportError)
+    import psycopg2.extras
+from .utils import (read_config, IteratorFile, ChunkFile, build_copy_query,
+                    CopyPipe,
+                    iter_lines, iter_batches, iter_sized, build_columns,
+                    is_query, split_file, split_range, RangeFile,
+                    infer_compression, open_compressed, BlockWriter,
+                    to_frame, iter_frame_chunks, FRAME_NULL,
+                    iter_row_blocks, file_fingerprint,
+                    DEFAULT_CHUNK_SIZE, DEFAULT_BATCH_SIZE,
+                    DEFAULT_FRAME_CHUNK_ROWS, QUERY_LENGTH)
+from .pool import ConnectionPool, get_pool
+from .prepared import get_statement_cache, DEFAULT_CACHE_SIZE, \
+    DEFAULT_THRESHOLD
+from .metrics import emit, has_hooks
+from .binary import (build_encoders, build_row_encoder, iter_copy_chunks,
+                        build_decoders, iter_binary_rows, DEFAULT_BUFFER_SIZE)
+from .arrow import DEFAULT_ARROW_BATCH_SIZE
+from . import arrow, types
+from .exceptions import (Postgrez, PostgrezConfigError,
+                            PostgrezConnectionError, PostgrezExecuteError,
+                            PostgrezLoadError, PostgrezExportError)
+from concurrent import futures
+import contextlib
+import functools
+import threading
+import itertools
+import inspect
+import shutil
+import time
+import decimal
+import csv
+import re
 import os
 import sys
-import io
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
-## number of characters in query to display
-QUERY_LENGTH = 50
-
 ## initialization defaults
 DEFAULT_PORT = 5432
 DEFAULT_SETUP = 'default'
 DEFAULT_SETUP_PATH = '~'
 
+## number of rows fetched per round trip by server-side cursors
+DEFAULT_ITERSIZE = 2000
+
+## number of parameter sets sent per round trip by execute_batch
+DEFAULT_PAGE_SIZE = 1000
+
+## suffixes of server-side cursor names
+_CURSOR_IDS = itertools.count()
+
+## marks the end of an iterator
+_END = object()
+
+## suffixes of staging table names
+_STAGING_IDS = itertools.count()
+
+## first server versions supporting MERGE, and MERGE ... RETURNING
+MERGE_VERSION = 150000
+MERGE_RETURNING_VERSION = 170000
+
+## table recording the progress of checkpointed loads, and their chunk size
+DEFAULT_CHECKPOINT_TABLE = 'postgrez_checkpoints'
+DEFAULT_CHECKPOINT_SIZE = 67108864
+
+
+def _config_path(setup_path=DEFAULT_SETUP_PATH):
+    """Return the full path of the .postgrez configuration file.
+
+    Args:
+        setup_path (str, optional): Directory containing the .postgrez
+            configuration file. Defaults to '~', i.e. your home directory.
+
+    Returns:
+        yaml_file (str): Full path of the .postgrez file.
+    """
+    if setup_path == '~':
+        return os.path.join(os.path.expanduser('~'), '.postgrez')
+    return os.path.join(setup_path, '.postgrez')
+
+
+def warm_config(setup_path=DEFAULT_SETUP_PATH):
+    """Parse the .postgrez configuration file into the config cache, so the
+    first Connection in the process doesn't pay for the yaml import and parse.
+
+    Args:
+        setup_path (str, optional): Directory containing the .postgrez
+            configuration file. Defaults to '~', i.e. your home directory.
+
+    Returns:
+        config (dict): Parsed contents of the .postgrez file.
+
+    Raises:
+        PostgrezConfigError: If the config file does not exist.
+    """
+    yaml_file = _config_path(setup_path)
+    try:
+        return read_config(yaml_file)
+    except (IOError, OSError):
+        raise PostgrezConfigError('Unable to find ~/.postgrez config file')
+
+
+class _TimingCursor(psycopg2.extensions.cursor):
+    """Cursor which accumulates the time spent in calls to the database.
+
+    Attributes:
+        server_time (float): Seconds spent in execute and copy calls.
+    """
+    server_time = 0.0
+
+    def _timed(self, method, *args, **kwargs):
+        start = time.time()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.server_time += time.time() - start
+
+    def execute(self, *args, **kwargs):
+        return self._timed(psycopg2.extensions.cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(psycopg2.extensions.cursor.executemany, *args,
+                           **kwargs)
+
+    def copy_expert(self, *args, **kwargs):
+        return self._timed(psycopg2.extensions.cursor.copy_expert, *args,
+                           **kwargs)
+
+    def copy_from(self, *args, **kwargs):
+        return self._timed(psycopg2.extensions.cursor.copy_from, *args,
+                           **kwargs)
+
+
+def _instrumented(operation):
+    """Decorate a Cmd method so an event is delivered to the instrumentation
+    hooks after every call, see the metrics module.
+
+    Args:
+        operation (str): Name of the operation reported in the events.
+
+    Returns:
+        decorator (function): The decorator.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not has_hooks(self.hooks):
+                return func(self, *args, **kwargs)
+            cursor = self.cursor
+            server_start = getattr(cursor, 'server_time', 0.0)
+            start = time.time()
+            result = None
+            error = None
+            try:
+                result = func(self, *args, **kwargs)
+                return result
+            except Exception as e:
+                error = str(e).strip()
+                raise
+            finally:
+                arguments = signature.bind(self, *args, **kwargs).arguments
+                target = list(arguments.values())[1]
+                filename = arguments.get('filename')
+                rows = nbytes = None
+                if isinstance(result, dict) and 'rows' in result:
+                    rows, nbytes = result.get('rows'), result.get('bytes')
+                elif isinstance(result, list):
+                    rows = len(result)
+                elif cursor is not None and not cursor.closed and \
+                        cursor.rowcount >= 0:
+                    rows = cursor.rowcount
+                if nbytes is None and filename and error is None and \
+                        os.path.exists(filename):
+                    nbytes = os.path.getsize(filename)
+                emit({'operation': operation,
+                      'target': str(target)[0:QUERY_LENGTH].strip(),
+                      'database': self.database,
+                      'wall': time.time() - start,
+                      'server': getattr(cursor, 'server_time', 0.0) -
+                                server_start,
+                      'connect': self._unreported_connect_time(),
+                      'rows': rows, 'bytes': nbytes,
+                      'error': error}, self.hooks)
+        return wrapper
+    return decorator
+
+
+def _load_range(params, copy_query, filename, start, end):
+    """Load a byte range of a file over a new connection. Defined at module
+    level so it can be run in a process pool.
+
+    Args:
+        params (dict): Connection parameters, see Connection._params().
+        copy_query (str): COPY ... FROM STDIN query to run.
+        filename (str): name of the file
+        start (int): Offset of the first byte of the range.
+        end (int): Offset one past the last byte of the range.
+
+    Returns:
+        rows (int): Number of rows loaded.
+
+    Raises:
+        PostgrezLoadError: If the range could not be loaded.
+    """
+    try:
+        with Connection(**params) as c:
+            with open(filename, 'rb') as f:
+                c.cursor.copy_expert(copy_query, RangeFile(f, start, end),
+                                     size=DEFAULT_CHUNK_SIZE)
+            rows = c.cursor.rowcount
+            c.conn.commit()
+    except (psycopg2.Error, OSError) as e:
+        ## psycopg2 errors can't always be pickled back from a process pool
+        raise PostgrezLoadError('Unable to load bytes %s-%s of %s. Error: %s'
+                                % (start, end, filename, e))
+    return rows
+
+
+def _export_slice(params, pool, snapshot, copy_query, filename):
+    """Export one slice of a query to a file over a pooled connection, reading
+    from a snapshot exported by another transaction.
+
+    Args:
+        params (dict): Connection parameters, see Connection._params().
+        pool (ConnectionPool): Pool to borrow the connection from.
+        snapshot (str): Snapshot id returned by pg_export_snapshot().
+        copy_query (str): COPY ... TO STDOUT query to run.
+        filename (str): File to write the slice to.
+
+    Returns:
+        rows (int): Number of rows exported.
+
+    Raises:
+        PostgrezExportError: If the slice could not be exported.
+    """
+    try:
+        with Connection(pool=pool, **params) as c:
+            c.cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            c.cursor.execute('SET TRANSACTION SNAPSHOT %s', (snapshot,))
+            with open(filename, 'wb') as f:
+                c.cursor.copy_expert(copy_query, f, size=DEFAULT_CHUNK_SIZE)
+            rows = c.cursor.rowcount
+            c.conn.rollback()
+    except (psycopg2.Error, OSError) as e:
+        raise PostgrezExportError('Unable to export slice to %s. Error: %s' %
+                                  (filename, e))
+    return rows
+
+
+def _pipe_copy(src_cursor, export_query, dst_cursor, load_query,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a COPY ... TO STDOUT query on one connection into a
+    COPY ... FROM STDIN query on another. The export runs in a producer
+    thread writing into a bounded CopyPipe, which the load reads from in the
+    calling thread, so no more than a few chunks are held in memory.
+
+    Args:
+        src_cursor (cursor): Cursor of the source connection.
+        export_query (str): COPY ... TO STDOUT query to run.
+        dst_cursor (cursor): Cursor of the destination connection.
+        load_query (str): COPY ... FROM STDIN query to run.
+        chunk_size (int, optional): Size in bytes of the chunks passed
+            between the connections.
+
+    Returns:
+        rows (int): Number of rows loaded.
+        nbytes (int): Number of bytes streamed.
+
+    Raises:
+        psycopg2.Error: If either COPY fails. A failed export fails the load.
+    """
+    pipe = CopyPipe(chunk_size=chunk_size)
+    counts = {'bytes': 0}
+
+    def produce():
+        try:
+            src_cursor.copy_expert(export_query, pipe, size=chunk_size)
+        except Exception as e:
+            pipe.close(e)
+        else:
+            pipe.close()
+
+    def chunks():
+        for chunk in pipe.chunks():
+            counts['bytes'] += len(chunk)
+            yield chunk
+
+    thread = threading.Thread(target=produce, name='postgrez-copy-between')
+    thread.daemon = True
+    thread.start()
+    try:
+        dst_cursor.copy_expert(load_query, ChunkFile(chunks()),
+                               size=chunk_size)
+    finally:
+        ## unblocks the producer if the load stopped reading early
+        pipe.abort()
+        thread.join()
+    return dst_cursor.rowcount, counts['bytes']
+
+
+def _copy_slice(params, pool, snapshot, export_query, destination,
+                    load_query, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream one slice of a query into a destination connection, reading
+    from a snapshot exported by another transaction. The destination's
+    transaction is left open.
+
+    Args:
+        params (dict): Connection parameters, see Connection._params().
+        pool (ConnectionPool): Pool to borrow the source connection from.
+        snapshot (str): Snapshot id returned by pg_export_snapshot().
+        export_query (str): COPY ... TO STDOUT query to run.
+        destination (Connection): Connection to load the slice with.
+        load_query (str): COPY ... FROM STDIN query to run.
+        chunk_size (int, optional): Size in bytes of the chunks passed
+            between the connections.
+
+    Returns:
+        rows (int): Number of rows copied.
+        nbytes (int): Number of bytes streamed.
+
+    Raises:
+        PostgrezLoadError: If the slice could not be copied.
+    """
+    try:
+        with Connection(pool=pool, **params) as c:
+            c.cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            c.cursor.execute('SET TRANSACTION SNAPSHOT %s', (snapshot,))
+            result = _pipe_copy(c.cursor, export_query, destination.cursor,
+                                load_query, chunk_size=chunk_size)
+            c.conn.rollback()
+    except (psycopg2.Error, OSError, Postgrez) as e:
+        raise PostgrezLoadError('Unable to copy slice %s. Error: %s' %
+                                (export_query[0:QUERY_LENGTH * 4], e))
+    return result
+
+
 class Connection(object):
     """Class which establishes connections to a PostgresSQL database. Users
     have the option to provide the host, database, username, password and port
@@ -42,10 +362,20 @@ class Connection(object):
         conn (psycopg2 connection): psycopg2 connection object
         cursor (psycopg2 cursor): psycopg2 cursor object, associated with
             the connection object
+        pool (ConnectionPool): Pool the connection is borrowed from, None if
+            the connection was opened directly.
+        statement_cache (StatementCache): Prepared statement cache of the
+            connection, None if prepare is disabled.
+        hooks (list): Instrumentation hooks called after every operation of
+            this connection, in addition to those registered with
+            metrics.add_hook().
+        connect_time (float): Seconds spent opening or borrowing the
+            connection.
     """
     def __init__(self, host=None, database=None, user=None, password=None,
                     port=DEFAULT_PORT, setup=DEFAULT_SETUP,
-                    setup_path=DEFAULT_SETUP_PATH):
+                    setup_path=DEFAULT_SETUP_PATH, pool=None, prepare=False,
+                    prepare_cache_size=DEFAULT_CACHE_SIZE, hooks=None):
         """Initialize connection to postgres database. First, we look if a host,
         database, username and password were provided. If they weren't, we try
         and read credentials from the .postgrez config file.
@@ -60,6 +390,20 @@ class Connection(object):
                 ~/.postgrez which specifies the default configuration to use.
             setup_path (str, optional): Path to the .postgrez configuration
                 file. Defaults to '~', i.e. your home directory on Mac/Linux.
+            pool (bool or ConnectionPool, optional): Borrow the connection
+                from a pool instead of connecting. If True, the process-wide
+                pool for the resolved connection parameters is used (see
+                pool.get_pool()). The connection is returned to the pool when
+                the with block exits. Defaults to None.
+            prepare (bool or int, optional): Prepare queries run through
+                Cmd.execute() on the server once they have been executed
+                this many times, see prepared.StatementCache. True uses a
+                threshold of 5. Defaults to False.
+            prepare_cache_size (int, optional): Maximum number of queries
+                tracked by the statement cache. Defaults to 100.
+            hooks (list, optional): Instrumentation hooks called with an
+                event dict after every execute, load and export of this
+                connection, see the metrics module. Defaults to None.
         """
         self.host = host
         self.database = database
@@ -70,6 +414,18 @@ class Connection(object):
         self.setup_path = setup_path
         self.conn = None
         self.cursor = None
+        self.pool = None
+        self.statement_cache = None
+        self.prepare = (DEFAULT_THRESHOLD if prepare is True
+                        else prepare or None)
+        self.prepare_cache_size = prepare_cache_size
+        self.hooks = list(hooks or [])
+        self.connect_time = None
+        self._connect_reported = False
+        ## savepoint names of the open transaction() scopes, None for the
+        ## outermost scope
+        self._scopes = []
+        self._aborted = False
 
         if host is None and database is None and user is None:
             ## Fetch attributes from file
@@ -78,11 +434,17 @@ class Connection(object):
         ## Validate the parsed attributes
         self._validate_attributes()
 
+        if pool is True:
+            self.pool = get_pool(**self._params())
+        elif isinstance(pool, ConnectionPool):
+            self.pool = pool
+
         ## If no errors are raised, connect to the database
         self._connect()
 
     def _get_attributes(self):
-        """Read database connection parameters from ~/.postgrez.
+        """Read database connection parameters from ~/.postgrez. The parsed
+        file is cached between instances and only re-read when it changes.
 
         Raises:
             PostgrezConfigError: If the config file ~/.postgrez does not exist.
@@ -90,16 +452,9 @@ class Connection(object):
                 ~/.postgrez file
 
         """
-        if self.setup_path == '~':
-            yaml_file = os.path.join(os.path.expanduser('~'), '.postgrez')
-        else:
-            yaml_file = os.path.join(self.setup_path, '.postgrez')
-        LOGGER.info('Fetching attributes from .postgrez file: %s' % yaml_file)
-
-        if os.path.isfile(yaml_file) == False:
-            raise PostgrezConfigError('Unable to find ~/.postgrez config file')
-
-        config = read_yaml(yaml_file)
+        LOGGER.debug('Fetching attributes from .postgrez file in %s' %
+                     self.setup_path)
+        config = warm_config(self.setup_path)
 
         if self.setup not in config.keys():
             raise PostgrezConfigError('Setup variable %s not found in config '
@@ -129,6 +484,16 @@ class Connection(object):
                 'database as a minimum. Please visit '
                 'https://github.com/ian-whitestone/postgrez for details')
 
+    def _params(self):
+        """Return the resolved connection parameters.
+
+        Returns:
+            params (dict): Keyword arguments for psycopg2.connect().
+        """
+        return {'host': self.host, 'port': self.port,
+                'database': self.database, 'user': self.user,
+                'password': self.password}
+
     def _connected(self):
         """Determine if a pscyopg2 connection or cursor has been created.
 
@@ -136,27 +501,57 @@ class Connection(object):
             connect_status (bool): True of a psycopg2 connection or cursor
                 object exists.
         """
-        return (True if self.conn.closed == 0 else False)
+        return (True if self.conn is not None and self.conn.closed == 0
+                else False)
 
     def _connect(self):
-        """Create a connection to a PostgreSQL database.
-        """
-        LOGGER.info('Establishing connection to %s database' % self.database)
-        self.conn = psycopg2.connect(
-            host=self.host,
-            port=self.port,
-            database=self.database,
-            user=self.user,
-            password=self.password
-            )
-        self.cursor = self.conn.cursor()
+        """Create a connection to a PostgreSQL database, or borrow one from
+        the pool.
+        """
+        start = time.time()
+        if self.pool is not None:
+            LOGGER.info('Borrowing pooled connection to %s database' %
+                        self.database)
+            self.conn = self.pool.getconn()
+        else:
+            LOGGER.info('Establishing connection to %s database' %
+                        self.database)
+            self.conn = psycopg2.connect(**self._params())
+        self.cursor = self.conn.cursor(cursor_factory=_TimingCursor)
+        self.connect_time = time.time() - start
+        self._connect_reported = False
+        if has_hooks(self.hooks):
+            emit({'operation': 'connect', 'target': '',
+                  'database': self.database, 'wall': self.connect_time,
+                  'server': self.connect_time,
+                  'connect': self.connect_time, 'rows': None, 'bytes': None,
+                  'error': None}, self.hooks)
+        if self.prepare:
+            self.statement_cache = get_statement_cache(self.conn,
+                maxsize=self.prepare_cache_size, threshold=self.prepare)
+
+    def _unreported_connect_time(self):
+        """Return the connect time the first time it is called after
+        connecting, so it is reported with the first operation only.
+
+        Returns:
+            connect_time (float): Seconds spent connecting, or 0.0.
+        """
+        if self._connect_reported or self.connect_time is None:
+            return 0.0
+        self._connect_reported = True
+        return self.connect_time
 
     def _disconnect(self):
-        """Close connection
+        """Close connection, or return it to the pool.
         """
         LOGGER.debug('Attempting to disconnect from database %s' % self.database)
         self.cursor.close()
-        self.conn.close()
+        if self.pool is not None:
+            self.pool.putconn(self.conn)
+            self.conn = None
+        else:
+            self.conn.close()
 
     def __enter__(self):
         return self
@@ -175,6 +570,107 @@ class Cmd(Connection):
     """Class which handles execution of queries.
     """
 
+    @contextlib.contextmanager
+    def transaction(self, synchronous_commit=None):
+        """Run the enclosed execute, load and upsert calls in one transaction,
+        which is committed when the block exits or rolled back if it raises.
+        The commits those calls would make are skipped.
+
+        Nested transaction() blocks use savepoints, so an exception leaving a
+        nested block only rolls back the work done inside it:
+
+            with c.transaction():
+                c.execute('insert into log values (1)')
+                try:
+                    with c.transaction():
+                        c.load_from_object('my_table', rows)
+                except PostgrezLoadError:
+                    pass  # the log row is still committed
+
+        If a query, load or upsert fails and rolls back the outermost
+        transaction, the block rolls back any later work and raises when it
+        exits, even if the error was caught. parallel_load_file() and
+        parallel_export() use their own connections and can't be called
+        inside a transaction.
+
+        Args:
+            synchronous_commit (str, optional): Value of synchronous_commit
+                for the transaction, i.e. 'off' to stop waiting for the WAL
+                to be flushed on commit. Bulk jobs which can be re-run after a
+                crash save a flush per transaction. Only applies to the
+                outermost block. Defaults to None, the server setting.
+
+        Yields:
+            cmd (Cmd): This object.
+
+        Raises:
+            PostgrezConnectionError: If the connection has been closed.
+            PostgrezExecuteError: If the transaction was rolled back by an
+                earlier error.
+        """
+        if self._connected() == False:
+            raise PostgrezConnectionError('Connection has been closed')
+
+        if self._scopes:
+            savepoint = 'postgrez_savepoint_%s' % len(self._scopes)
+            self.cursor.execute('SAVEPOINT %s' % savepoint)
+        else:
+            savepoint = None
+            self._aborted = False
+            if synchronous_commit is not None:
+                self.cursor.execute('SET LOCAL synchronous_commit = %s',
+                                    (synchronous_commit,))
+        self._scopes.append(savepoint)
+        LOGGER.debug('Entering transaction scope %s' % len(self._scopes))
+
+        try:
+            yield self
+        except BaseException:
+            self._scopes.pop()
+            if savepoint is None:
+                self.conn.rollback()
+            elif not self._aborted:
+                self.cursor.execute('ROLLBACK TO SAVEPOINT %s' % savepoint)
+                self.cursor.execute('RELEASE SAVEPOINT %s' % savepoint)
+            raise
+
+        self._scopes.pop()
+        if savepoint is None and self.conn.get_transaction_status() == \
+                psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            ## an error raised by the cursor directly was caught in the block
+            self._aborted = True
+        if savepoint is not None:
+            if not self._aborted:
+                self.cursor.execute('RELEASE SAVEPOINT %s' % savepoint)
+        elif self._aborted:
+            self.conn.rollback()
+            raise PostgrezExecuteError('Transaction was rolled back by an '
+                                       'earlier error')
+        else:
+            self.conn.commit()
+
+    def _commit(self):
+        """Commit the current transaction, unless a transaction() block is
+        open, in which case the block commits when it exits.
+        """
+        if not self._scopes:
+            self.conn.commit()
+
+    def _rollback(self):
+        """Roll back after an error. Inside a nested transaction() block only
+        the work done since its savepoint is rolled back. Inside the outermost
+        block the whole transaction is rolled back, and the block raises when
+        it exits.
+        """
+        if not self._scopes:
+            self.conn.rollback()
+        elif self._scopes[-1] is not None and not self._aborted:
+            self.cursor.execute('ROLLBACK TO SAVEPOINT %s' % self._scopes[-1])
+        else:
+            self.conn.rollback()
+            self._aborted = True
+
+    @_instrumented('execute')
     def execute(self, query, query_vars=None, commit=True):
         """Execute the supplied query.
 
@@ -188,21 +684,216 @@ class Cmd(Connection):
 
         Raises:
             PostgrezConnectionError: If the connection has been closed.
+            PostgrezExecuteError: If the query fails. The transaction, or
+                inside a transaction() block the work since its savepoint, is
+                rolled back.
         """
         if self._connected() == False:
             raise PostgrezConnectionError('Connection has been closed')
 
         LOGGER.info('Executing query %s...' % query[0:QUERY_LENGTH].strip())
-        self.cursor.execute(query, vars=query_vars)
+        try:
+            if self.statement_cache is not None:
+                self.statement_cache.execute(self.cursor, query, query_vars)
+            else:
+                self.cursor.execute(query, vars=query_vars)
+        except psycopg2.Error as e:
+            self._rollback()
+            raise PostgrezExecuteError('Unable to execute query %s. Error: %s'
+                                       % (query[0:QUERY_LENGTH].strip(), e))
         if commit:
-            self.conn.commit()
-            
-    def load_from_object(self, table_name, data, columns=None, null=None):
-        """Load data into a Postgres table from a python list.
+            self._commit()
+
+    @_instrumented('execute_batch')
+    def execute_batch(self, query, rows, page_size=DEFAULT_PAGE_SIZE,
+                        template=None, method='auto', returning=False,
+                        commit=True, page_commit=False):
+        """Execute a parameterized query for many parameter sets, sending a
+        page of parameter sets per round trip instead of one per row.
+
+        Args:
+            query (str): Query to be executed. For the 'values' method, the
+                query must contain a single `VALUES %s` placeholder, i.e.
+                'insert into t (a, b) values %s'. For the 'batch' method, it
+                contains the placeholders of a single parameter set.
+            rows (iterable): Parameter sets, such as a list of tuples. Any
+                iterable is accepted and consumed one page at a time.
+            page_size (int): Number of parameter sets per round trip.
+                Defaults to 1000.
+            template (str, optional): Template of a single row for the 'values'
+                method, i.e. '(%s, %s::jsonb)'. Defaults to None.
+            method (str): 'values' to expand every page into one multi-row
+                VALUES statement with psycopg2.extras.execute_values(),
+                'batch' to send every page as a string of statements with
+                psycopg2.extras.execute_batch(), or 'auto' to use 'values'
+                if the query contains `VALUES %s`. Defaults to 'auto'.
+            returning (bool): Fetch and return the rows produced by a
+                RETURNING clause. Only supported by the 'values' method,
+                and requires psycopg2 2.8 or later. Defaults to False.
+            commit (bool): Commit once all pages have been executed. Defaults
+                to True.
+            page_commit (bool): Commit after every page, so a failure only
+                rolls back the page in progress. Defaults to False.
+
+        Returns:
+            summary (dict): Dict containing the number of 'pages' and 'rows'
+            executed and the 'elapsed' seconds. If returning is True, the
+            fetched rows are included under 'results'.
+
+        Raises:
+            PostgrezConnectionError: If the connection has been closed.
+            PostgrezExecuteError: If the method is invalid, or an error
+                occurs executing a page. The transaction is rolled back.
+        """
+        if self._connected() == False:
+            raise PostgrezConnectionError('Connection has been closed')
+
+        if method == 'auto':
+            method = ('values' if re.search(r'values\s+%s', query,
+                                            re.IGNORECASE) else 'batch')
+        if method not in ('values', 'batch'):
+            raise PostgrezExecuteError("Method must be 'auto', 'values' or "
+                                       "'batch', got %s" % method)
+        if returning and method != 'values':
+            raise PostgrezExecuteError('returning is only supported by the '
+                                       "'values' method")
+
+        LOGGER.info('Executing query %s... in pages of %s rows' %
+                    (query[0:QUERY_LENGTH].strip(), page_size))
+        start = time.time()
+        summary = {'pages': 0, 'rows': 0, 'elapsed': 0.0}
+        if returning:
+            summary['results'] = []
+
+        try:
+            for page in iter_batches(rows, page_size):
+                if method == 'values' and returning:
+                    ## fetch is only available from psycopg2 2.8
+                    summary['results'].extend(psycopg2.extras.execute_values(
+                        self.cursor, query, page, template=template,
+                        page_size=len(page), fetch=True))
+                elif method == 'values':
+                    psycopg2.extras.execute_values(self.cursor, query, page,
+                        template=template, page_size=len(page))
+                else:
+                    psycopg2.extras.execute_batch(self.cursor, query, page,
+                                                  page_size=len(page))
+                if page_commit:
+                    self._commit()
+                summary['pages'] += 1
+                summary['rows'] += len(page)
+        except (psycopg2.Error, ValueError, TypeError, IndexError,
+                KeyError) as e:
+            self._rollback()
+            raise PostgrezExecuteError('Unable to execute page %s of query '
+                '%s. Error: %s' % (summary['pages'] + 1,
+                query[0:QUERY_LENGTH].strip(), e))
+
+        if commit:
+            self._commit()
+        summary['elapsed'] = time.time() - start
+        LOGGER.info('Executed %s rows in %s pages' %
+                    (summary['rows'], summary['pages']))
+        return summary
+
+    def iter_execute(self, query, query_vars=None, columns=False,
+                        itersize=DEFAULT_ITERSIZE, batch_size=None):
+        """Execute the supplied select query with a server-side (named)
+        cursor and yield its results lazily, so large result sets can be
+        processed with constant memory.
+
+        Args:
+            query (str): Select query to be executed. Query can contain
+                placeholders, as long as query_vars are supplied.
+            query_vars (tuple, list or dict): Variables to be executed with query.
+                See http://initd.org/psycopg/docs/usage.html#query-parameters.
+            columns (bool): Yield dicts keyed by column name instead of tuples.
+                Defaults to False.
+            itersize (int): Number of rows fetched from the server per round
+                trip. Defaults to 2000.
+            batch_size (int, optional): Yield lists of up to batch_size rows
+                instead of single rows. Defaults to None.
+
+        Yields:
+            row (tuple or dict): A row of the result set, or a list of rows if
+            batch_size is provided.
+
+        Raises:
+            PostgrezConnectionError: If the connection has been closed.
+        """
+        if self._connected() == False:
+            raise PostgrezConnectionError('Connection has been closed')
+
+        LOGGER.info('Streaming query %s...' % query[0:QUERY_LENGTH].strip())
+        cursor = self.conn.cursor(name='postgrez_%s' % next(_CURSOR_IDS))
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, vars=query_vars)
+            rows = iter(cursor)
+            if columns:
+                first = next(rows, None)
+                if first is None:
+                    return
+                cols = [desc[0] for desc in cursor.description]
+                rows = (dict(zip(cols, row))
+                        for row in itertools.chain([first], rows))
+            if batch_size is None:
+                for row in rows:
+                    yield row
+            else:
+                for batch in iter_batches(rows, batch_size):
+                    yield batch
+        finally:
+            cursor.close()
+
+    def _table_columns(self, table_name, columns=None):
+        """Look up the names and type OIDs of a table's columns. Domains
+        are resolved to their base type and enums are reported as text.
+
+        Args:
+            table_name (str): name of the table, optionally schema qualified.
+            columns (list, optional): Names of the columns to return, in the
+                order they should be returned. Defaults to None, which returns
+                every column in table order.
+
+        Returns:
+            table_columns (list): List of (column name, type OID) tuples.
+
+        Raises:
+            PostgrezLoadError: If a requested column does not exist.
+        """
+        self.cursor.execute("""
+            SELECT a.attname,
+                   CASE WHEN t.typtype = 'e' THEN 'text'::regtype::oid
+                        WHEN t.typtype = 'd' THEN t.typbasetype
+                        ELSE a.atttypid END
+            FROM pg_attribute a
+            JOIN pg_type t ON t.oid = a.atttypid
+            WHERE a.attrelid = %s::regclass AND a.attnum > 0
+              AND NOT a.attisdropped
+            ORDER BY a.attnum""", (table_name,))
+        table_columns = self.cursor.fetchall()
+        if columns is None:
+            return table_columns
+
+        oids = dict(table_columns)
+        missing = [col for col in columns if col not in oids]
+        if missing:
+            raise PostgrezLoadError('Columns %s not found in table %s' %
+                                    (missing, table_name))
+        return [(col, oids[col]) for col in columns]
+
+    @_instrumented('load_from_object')
+    def load_from_object(self, table_name, data, columns=None, null=None,
+                            format='text', batch_rows=None, batch_bytes=None,
+                            batch_commit=False, callback=None, commit=True):
+        """Load data into a Postgres table from a python list, or any other
+        iterable of rows such as a generator. Rows are consumed lazily, so
+        only the rows of the batch being sent are held in memory.
 
         Args:
             table_name (str): name of table to load data into.
-            data (list): list of tuples, where each row is a tuple
+            data (iterable): list of tuples, where each row is a tuple
             columns (list): iterable with name of the columns to import.
                 The length and types should match the content of the file to
                 read. If not specified, it is assumed that the entire table
@@ -211,30 +902,205 @@ class Cmd(Connection):
                 Defaults to 'None'. If a row is passed in as
                 [None, 1, '2017-05-01', 25.321], it will treat the first
                 element as missing and inject a Null value into the database for
-                the corresponding column.
+                the corresponding column. Ignored if format is 'binary'.
+            format (str): 'text' to send the rows as delimited text, or
+                'binary' to encode them into PostgreSQL's binary COPY format
+                based on the column types of the table, which avoids
+                formatting and re-parsing every value. Defaults to 'text'.
+            batch_rows (int, optional): Send at most batch_rows rows per COPY.
+                Defaults to None, i.e. no limit.
+            batch_bytes (int, optional): Start a new COPY once a batch reaches
+                batch_bytes of serialized data (characters for the text
+                format). Defaults to None, i.e. no limit.
+            batch_commit (bool): Commit after every batch, so each batch is
+                its own transaction and a failure only rolls back the batch in
+                progress. Defaults to False, which commits once at the end.
+            callback (callable, optional): Called after every batch with a
+                dict containing the 'batch' number, the batch's 'rows',
+                'bytes' and 'elapsed' seconds, and the running 'total_rows'
+                and 'total_bytes'. Defaults to None.
+            commit (bool): Commit once all batches have been sent. Specify
+                False to leave the transaction open, i.e. to load a staging
+                table. Defaults to True.
+
+        Returns:
+            summary (dict): Dict containing the number of 'batches', 'rows'
+            and 'bytes' loaded and the 'elapsed' seconds.
+
         Raises:
-            PostgrezLoadError: If an error occurs while building the iterator
-                file.
+            PostgrezLoadError: If an error occurs while building or sending
+                the data.
         """
+        if format not in ('text', 'binary'):
+            raise PostgrezLoadError("Format must be 'text' or 'binary', got "
+                                    "%s" % format)
+        start = time.time()
+        summary = {'batches': 0, 'rows': 0, 'bytes': 0, 'elapsed': 0.0}
+
+        rows = iter(data)
+        first = next(rows, None)
+        if first is None:
+            LOGGER.info('No records to load into table %s' % table_name)
+            return summary
+        rows = itertools.chain([first], rows)
+        LOGGER.info('Attempting to load %s records into table %s' %
+                    ((len(data) if hasattr(data, '__len__') else 'streamed'),
+                     table_name))
+
         try:
-            LOGGER.info('Attempting to load %s records into table %s' %
-                        (len(data), table_name))
-            if null is None:
-                null = 'None'
-
-            table_width = len(data[0])
-            template_string = "|".join(['{}'] * table_width)
-            f = IteratorFile((template_string.format(*x) for x in data))
+            if format == 'binary':
+                table_columns = self._table_columns(table_name, columns=columns)
+                encode_row = build_row_encoder(build_encoders(
+                    [oid for _, oid in table_columns],
+                    encoding=self._encoding()))
+                copy_query = build_copy_query('load', table_name, binary=True,
+                    columns=[col for col, _ in table_columns])
+                units = map(encode_row, rows)
+                overhead = 0
+
+                def copy(batch):
+                    f = ChunkFile(iter_copy_chunks(batch))
+                    self.cursor.copy_expert(copy_query, f,
+                                            size=DEFAULT_BUFFER_SIZE)
+            else:
+                if null is None:
+                    null = 'None'
+                table_width = len(first)
+                template_string = "|".join(['{}'] * table_width)
+                units = (template_string.format(*x) for x in rows)
+                overhead = 1
+
+                def copy(batch):
+                    f = IteratorFile(batch, encoding=self._encoding())
+                    self.cursor.copy_from(f, table_name, sep="|", null=null,
+                                          columns=columns,
+                                          size=DEFAULT_CHUNK_SIZE)
         except Exception as e:
             raise PostgrezLoadError("Unable to load data to Postgres. "
                                     "Error: %s" % e)
 
-        self.cursor.copy_from(f, table_name, sep="|", null=null,
-                                columns=columns)
-        self.conn.commit()
+        units = iter(units)
+        while True:
+            batch_start = time.time()
+            counts = {}
+            try:
+                first_unit = next(units, _END)
+                if first_unit is _END:
+                    break
+                copy(iter_sized(itertools.chain([first_unit], units), counts,
+                                max_items=batch_rows, max_size=batch_bytes,
+                                overhead=overhead))
+            except (ValueError, TypeError, IndexError, psycopg2.Error) as e:
+                self._rollback()
+                raise PostgrezLoadError("Unable to load data to Postgres. "
+                                        "Error: %s" % e)
+            if batch_commit:
+                self._commit()
+
+            summary['batches'] += 1
+            summary['rows'] += counts['items']
+            summary['bytes'] += counts['size']
+            if callback is not None:
+                callback({'batch': summary['batches'],
+                          'rows': counts['items'], 'bytes': counts['size'],
+                          'elapsed': time.time() - batch_start,
+                          'total_rows': summary['rows'],
+                          'total_bytes': summary['bytes']})
+
+        if commit:
+            self._commit()
+        summary['elapsed'] = time.time() - start
+        LOGGER.info('Loaded %s records into table %s in %s batches' %
+                    (summary['rows'], table_name, summary['batches']))
+        return summary
+
+    @_instrumented('load_from_frame')
+    def load_from_frame(self, table_name, frame, columns=None, index=False,
+                            chunk_rows=DEFAULT_FRAME_CHUNK_ROWS, commit=True):
+        """Load a pandas DataFrame or a NumPy array into a Postgres table.
+        Whole columns are formatted at once with DataFrame.to_csv(), and the
+        CSV is streamed to a single COPY chunk_rows rows at a time, so only
+        one chunk of text is held in memory. Missing values (NaN, NaT, None,
+        pandas.NA) are loaded as NULL. Requires pandas.
+
+        Integer columns containing NaN are floats in pandas, and their values
+        are formatted as i.e. '1.0'. Use the nullable 'Int64' dtype to load
+        them into integer columns.
+
+        Args:
+            table_name (str): name of table to load data into.
+            frame (DataFrame, Series, ndarray or dict): Data to load. 2-D
+                arrays are loaded positionally, structured arrays by field
+                name.
+            columns (list, optional): Names of the columns to load, in the
+                order of the frame's columns. Defaults to None, which uses the
+                frame's column names, or every column in table order for plain
+                2-D arrays.
+            index (bool, optional): Load the frame's index as the leading
+                column(s). Defaults to False.
+            chunk_rows (int, optional): Number of rows serialized at a time.
+                Defaults to 50000.
+            commit (bool): Commit once the data has been loaded. Defaults to
+                True.
+
+        Returns:
+            summary (dict): Dict containing the number of 'rows' and 'bytes'
+            loaded and the 'elapsed' seconds.
+
+        Raises:
+            PostgrezLoadError: If pandas is not installed or an error occurs
+                while loading.
+        """
+        start = time.time()
+        try:
+            positional = not hasattr(frame, 'columns') and \
+                getattr(frame, 'dtype', None) is not None and \
+                frame.dtype.names is None
+            frame = to_frame(frame)
+        except (ImportError, ValueError) as e:
+            raise PostgrezLoadError('Unable to load data to Postgres. '
+                                    'Error: %s' % e)
+        if index:
+            frame = frame.reset_index()
+        if columns is None and not positional:
+            columns = [str(col) for col in frame.columns]
+
+        summary = {'rows': len(frame), 'bytes': 0, 'elapsed': 0.0}
+        if not len(frame):
+            LOGGER.info('No records to load into table %s' % table_name)
+            return summary
+        LOGGER.info('Attempting to load %s records into table %s' %
+                    (len(frame), table_name))
+
+        copy_query = build_copy_query('load', table_name, columns=columns,
+                                      header=False, null=FRAME_NULL)
+
+        def chunks():
+            for chunk in iter_frame_chunks(frame, chunk_rows=chunk_rows,
+                                           encoding=self._encoding()):
+                summary['bytes'] += len(chunk)
+                yield chunk
+        try:
+            self.cursor.copy_expert(copy_query, ChunkFile(chunks()),
+                                    size=DEFAULT_CHUNK_SIZE)
+        except (ValueError, TypeError, psycopg2.Error) as e:
+            self._rollback()
+            raise PostgrezLoadError("Unable to load data to Postgres. "
+                                    "Error: %s" % e)
+        if commit:
+            self._commit()
+
+        summary['elapsed'] = time.time() - start
+        LOGGER.info('Loaded %s records into table %s in %.2fs' %
+                    (summary['rows'], table_name, summary['elapsed']))
+        return summary
 
+    @_instrumented('load_from_file')
     def load_from_file(self, table_name, filename, header=True, delimiter=',',
-                        columns=None, quote=None, null=None):
+                        columns=None, quote=None, null=None,
+                        compression='infer', block_size=DEFAULT_CHUNK_SIZE,
+                        commit=True, checkpoint=False,
+                        checkpoint_size=DEFAULT_CHECKPOINT_SIZE):
         """
         Args:
             table_name (str): name of table to load data into.
@@ -259,19 +1125,519 @@ class Cmd(Connection):
 
                 it will treat the first element as missing and inject a Null
                 value into the database for the corresponding column.
+            compression (str): 'gzip', 'bz2', 'xz' or 'zstd' to decompress
+                the file while it is streamed to Postgres, None for
+                uncompressed files, or 'infer' to detect the codec from the
+                file extension (.gz, .bz2, .xz, .zst). Compressed files are
+                sent as bytes, so they must be in the connection's client
+                encoding. zstd requires the zstandard package. Defaults to
+                'infer'.
+            block_size (int): Number of bytes read from the file at a time.
+                Defaults to 262144.
+            commit (bool): Commit once the file has been loaded. Defaults to
+                True.
+            checkpoint (bool or str): Load the file in chunks of
+                checkpoint_size bytes, each committed in its own transaction
+                together with the file offset it ends at, so a failed load
+                resumes from the last committed chunk when it is retried.
+                Progress is recorded in the 'postgrez_checkpoints' table, or
+                the table named by checkpoint, which is created if needed.
+                The file is read as bytes, so it must be in the connection's
+                client encoding. commit is ignored. Defaults to False.
+            checkpoint_size (int): Minimum size in bytes of the chunks of a
+                checkpointed load. Defaults to 67108864 (64MB).
+
+        Returns:
+            summary (dict): Only for checkpointed loads, see
+            _checkpointed_load().
+
+        Raises:
+            PostgrezLoadError: If the compression is unknown or unavailable,
+                or the load fails.
         """
+        if checkpoint:
+            return self._checkpointed_load(table_name, filename,
+                header=header, delimiter=delimiter, columns=columns,
+                quote=quote, null=null, compression=compression,
+                block_size=block_size, checkpoint_size=checkpoint_size,
+                checkpoint_table=(DEFAULT_CHECKPOINT_TABLE
+                                  if checkpoint is True else checkpoint))
+
         LOGGER.info('Attempting to load file %s  into table %s' %
                     (filename, table_name))
         copy_query = build_copy_query('load', table_name, header=header,
                                     columns=columns, delimiter=delimiter,
                                     quote=quote, null=null)
-        with open(filename, 'r') as f:
+        try:
+            compression = infer_compression(filename, compression)
+            f = (open(filename, 'r') if compression is None
+                 else open_compressed(filename, 'rb', compression))
+        except ValueError as e:
+            raise PostgrezLoadError('Unable to open file %s. Error: %s' %
+                                    (filename, e))
+        with f:
             LOGGER.info('Executing copy query\n%s' % copy_query)
-            self.cursor.copy_expert(copy_query, f)
-        self.conn.commit()
+            try:
+                self.cursor.copy_expert(copy_query, f, size=block_size)
+            except psycopg2.Error as e:
+                self._rollback()
+                raise PostgrezLoadError('Unable to load file %s into table %s.'
+                                        ' Error: %s' % (filename, table_name,
+                                                        e))
+        if commit:
+            self._commit()
+
+    def _checkpointed_load(self, table_name, filename, header=True,
+                            delimiter=',', columns=None, quote=None,
+                            null=None, compression='infer',
+                            block_size=DEFAULT_CHUNK_SIZE,
+                            checkpoint_size=DEFAULT_CHECKPOINT_SIZE,
+                            checkpoint_table=DEFAULT_CHECKPOINT_TABLE):
+        """Load a file in chunks which end on row boundaries, committing each
+        chunk with the offset it ends at in checkpoint_table. The offset is
+        committed in the chunk's transaction, so a chunk is never loaded
+        twice. A retry resumes after the last committed chunk, provided the
+        file's fingerprint (see utils.file_fingerprint()) has not changed.
+        Compressed files are decompressed again up to the offset.
+
+        Once the file is loaded its checkpoint is marked complete, and loading
+        the same unchanged file again is a no-op. Delete its row from
+        checkpoint_table to load it again.
+
+        Args:
+            table_name (str): name of table to load data into.
+            filename (str): name of the file
+            header, delimiter, columns, quote, null, compression, block_size:
+                See load_from_file().
+            checkpoint_size (int): Minimum size in bytes of a chunk.
+            checkpoint_table (str): Table recording the progress of the load.
+
+        Returns:
+            summary (dict): Dict containing the number of 'rows', 'bytes' and
+            'chunks' loaded by this call, the offset the load 'resumed_from',
+            and the 'elapsed' seconds.
+
+        Raises:
+            PostgrezLoadError: If called inside a transaction() block, the
+                file changed since an unfinished load of it started, or a
+                chunk fails to load.
+        """
+        if self._scopes:
+            raise PostgrezLoadError('Checkpointed loads can not be run inside '
+                                    'a transaction() block')
+        start = time.time()
+        path = os.path.abspath(filename)
+        fingerprint = file_fingerprint(filename)
+        summary = {'rows': 0, 'bytes': 0, 'chunks': 0, 'resumed_from': 0,
+                   'elapsed': 0.0}
+        try:
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS %s (
+                    table_name text, filename text, fingerprint text,
+                    position bigint, rows bigint, completed boolean,
+                    updated_at timestamptz DEFAULT now(),
+                    PRIMARY KEY (table_name, filename))""" % checkpoint_table)
+            self.cursor.execute('SELECT fingerprint, position, completed '
+                                'FROM %s WHERE table_name = %%s AND '
+                                'filename = %%s' % checkpoint_table,
+                                (table_name, path))
+            state = self.cursor.fetchone()
+            self._commit()
+        except psycopg2.Error as e:
+            self._rollback()
+            raise PostgrezLoadError('Unable to read checkpoint of %s. '
+                                    'Error: %s' % (filename, e))
+
+        position = 0
+        if state is not None and state[0] == fingerprint:
+            if state[2]:
+                LOGGER.info('File %s was already loaded into table %s' %
+                            (filename, table_name))
+                summary['resumed_from'] = state[1]
+                summary['elapsed'] = time.time() - start
+                return summary
+            position = state[1]
+        elif state is not None and not state[2]:
+            raise PostgrezLoadError('File %s changed since its load into %s '
+                'started. Delete its row from %s to load it again' %
+                (filename, table_name, checkpoint_table))
+        summary['resumed_from'] = position
+
+        try:
+            compression = infer_compression(filename, compression)
+            f = (open(filename, 'rb') if compression is None
+                 else open_compressed(filename, 'rb', compression))
+        except ValueError as e:
+            raise PostgrezLoadError('Unable to open file %s. Error: %s' %
+                                    (filename, e))
+        save_query = """
+            INSERT INTO %s (table_name, filename, fingerprint, position, rows,
+                            completed)
+            VALUES (%%s, %%s, %%s, %%s, %%s, %%s)
+            ON CONFLICT (table_name, filename) DO UPDATE SET
+                fingerprint = EXCLUDED.fingerprint,
+                position = EXCLUDED.position,
+                rows = CASE WHEN %s.fingerprint = EXCLUDED.fingerprint
+                            THEN %s.rows ELSE 0 END + EXCLUDED.rows,
+                completed = EXCLUDED.completed,
+                updated_at = now()""" % ((checkpoint_table,) * 3)
+
+        with f:
+            if position:
+                LOGGER.info('Resuming load of file %s into table %s at byte '
+                            '%s' % (filename, table_name, position))
+                if compression is None:
+                    f.seek(position)
+                else:
+                    ## compressed streams can't seek, skip what was loaded
+                    skipped = 0
+                    while skipped < position:
+                        data = f.read(min(block_size, position - skipped))
+                        if not data:
+                            break
+                        skipped += len(data)
+            blocks = iter_row_blocks(f, checkpoint_size, quote=quote,
+                                     block_size=block_size)
+
+            def chunk(first, counts):
+                counts['bytes'] = len(first[0])
+                yield first[0]
+                if first[1]:
+                    return
+                for block, last in blocks:
+                    counts['bytes'] += len(block)
+                    yield block
+                    if last:
+                        return
+
+            while True:
+                first = next(blocks, None)
+                if first is None:
+                    break
+                copy_query = build_copy_query('load', table_name,
+                                              header=(header and
+                                                      position == 0),
+                                              columns=columns,
+                                              delimiter=delimiter,
+                                              quote=quote, null=null)
+                counts = {}
+                try:
+                    self.cursor.copy_expert(copy_query,
+                                            ChunkFile(chunk(first, counts)),
+                                            size=block_size)
+                    rows = self.cursor.rowcount
+                    position += counts['bytes']
+                    self.cursor.execute(save_query, (table_name, path,
+                                        fingerprint, position, rows, False))
+                    self._commit()
+                except (psycopg2.Error, OSError, ValueError, EOFError) as e:
+                    self._rollback()
+                    raise PostgrezLoadError('Unable to load file %s into '
+                        'table %s after byte %s, retry to resume. Error: %s' %
+                        (filename, table_name, position, e))
+                summary['rows'] += rows
+                summary['bytes'] += counts['bytes']
+                summary['chunks'] += 1
+                LOGGER.info('Loaded chunk %s of file %s up to byte %s' %
+                            (summary['chunks'], filename, position))
+
+        try:
+            self.cursor.execute(save_query, (table_name, path, fingerprint,
+                                             position, 0, True))
+            self._commit()
+        except psycopg2.Error as e:
+            self._rollback()
+            raise PostgrezLoadError('Unable to complete checkpoint of %s. '
+                                    'Error: %s' % (filename, e))
+        summary['elapsed'] = time.time() - start
+        LOGGER.info('Loaded %s records from file %s into table %s in %s '
+                    'chunks' % (summary['rows'], filename, table_name,
+                                summary['chunks']))
+        return summary
+
+    @_instrumented('upsert')
+    def upsert(self, table_name, data, key_columns, update_columns=None,
+                columns=None, method='on_conflict', deduplicate=False,
+                commit=True, **load_kwargs):
+        """Insert or update rows in bulk. The rows are loaded with COPY into a
+        temporary staging table in the current transaction, and merged into
+        table_name with a single set-based statement.
+
+        Args:
+            table_name (str): name of table to upsert data into.
+            data (iterable or str): Rows to upsert, as accepted by
+                load_from_object(), or the name of a file to load with
+                load_from_file().
+            key_columns (list): Columns identifying a row. For the
+                'on_conflict' method they must match a unique index or
+                constraint of table_name.
+            update_columns (list, optional): Columns updated when a row
+                already exists. Defaults to None, which updates every loaded
+                column that is not a key column. An empty list leaves
+                existing rows untouched.
+            columns (list, optional): Columns of the data, see
+                load_from_object(). Defaults to None, i.e. every column of
+                table_name.
+            method (str): 'on_conflict' to use INSERT ... ON CONFLICT DO
+                UPDATE, or 'merge' to use MERGE, which doesn't require a
+                unique index on key_columns but needs PostgreSQL 15 or later.
+                Defaults to 'on_conflict'.
+            deduplicate (bool): Keep only the last row loaded for each key.
+                Without it, a key appearing twice in the data raises an error
+                with the 'on_conflict' method. Defaults to False.
+            commit (bool): Commit once the rows have been merged. Defaults to
+                True.
+            **load_kwargs: Keyword arguments passed to load_from_object() or
+                load_from_file(), i.e. format, null or delimiter.
+
+        Returns:
+            summary (dict): Dict containing the number of rows 'staged',
+            'inserted' and 'updated', the total 'rows' inserted or updated,
+            and the 'elapsed' seconds.
+
+        Raises:
+            PostgrezLoadError: If the method is invalid or unsupported by the
+                server, or an error occurs loading or merging the rows. The
+                transaction is rolled back.
+        """
+        if method not in ('on_conflict', 'merge'):
+            raise PostgrezLoadError("Method must be 'on_conflict' or 'merge', "
+                                    "got %s" % method)
+        if method == 'merge' and self.conn.server_version < MERGE_VERSION:
+            raise PostgrezLoadError('MERGE requires PostgreSQL 15 or later')
+        start = time.time()
+        stage = '_postgrez_upsert_%s' % next(_STAGING_IDS)
+
+        try:
+            if columns is None:
+                columns = [col for col, _ in self._table_columns(table_name)]
+            if update_columns is None:
+                update_columns = [col for col in columns
+                                  if col not in key_columns]
+            ## copies the column types only, no constraints or defaults
+            self.cursor.execute('CREATE TEMP TABLE %s AS SELECT %s FROM %s '
+                                'WITH NO DATA' % (stage, ', '.join(columns),
+                                table_name))
+            if isinstance(data, str):
+                self.load_from_file(stage, data, commit=False, **load_kwargs)
+            else:
+                self.load_from_object(stage, data, commit=False,
+                                      **load_kwargs)
+            self.cursor.execute('SELECT count(*) FROM %s' % stage)
+            staged = self.cursor.fetchone()[0]
+
+            source = stage
+            if deduplicate:
+                source = ('(SELECT DISTINCT ON (%s) * FROM %s ORDER BY %s, '
+                          'ctid DESC)' % (', '.join(key_columns), stage,
+                          ', '.join(key_columns)))
+            if method == 'merge':
+                inserted, updated = self._merge(table_name, source, columns,
+                                                key_columns, update_columns)
+            else:
+                inserted, updated = self._insert_on_conflict(table_name,
+                    source, columns, key_columns, update_columns)
+            self.cursor.execute('DROP TABLE %s' % stage)
+        except PostgrezLoadError:
+            self._rollback()
+            raise
+        except psycopg2.Error as e:
+            self._rollback()
+            raise PostgrezLoadError('Unable to upsert data into %s. Error: %s'
+                                    % (table_name, e))
+        if commit:
+            self._commit()
+
+        summary = {'staged': staged, 'inserted': inserted, 'updated': updated,
+                   'rows': inserted + updated, 'elapsed': time.time() - start}
+        LOGGER.info('Upserted %s records into table %s: %s inserted, %s '
+                    'updated' % (staged, table_name, inserted, updated))
+        return summary
+
+    def _insert_on_conflict(self, table_name, source, columns, key_columns,
+                                update_columns):
+        """Merge a staging table into table_name with INSERT ... ON CONFLICT.
+        Rows are counted as inserted when their xmax is 0, i.e. they weren't
+        locked by an update.
 
+        Returns:
+            tuple: The number of rows inserted and updated.
+        """
+        if update_columns:
+            action = 'DO UPDATE SET %s' % ', '.join(
+                '%s = EXCLUDED.%s' % (col, col) for col in update_columns)
+        else:
+            action = 'DO NOTHING'
+        self.cursor.execute(
+            'WITH upserted AS (INSERT INTO {0} ({1}) SELECT {1} FROM {2} s '
+            'ON CONFLICT ({3}) {4} RETURNING (xmax = 0) AS inserted) '
+            'SELECT count(*) FILTER (WHERE inserted), '
+            'count(*) FILTER (WHERE NOT inserted) FROM upserted'.format(
+            table_name, ', '.join(columns), source, ', '.join(key_columns),
+            action))
+        return self.cursor.fetchone()
+
+    def _merge(self, table_name, source, columns, key_columns,
+                    update_columns):
+        """Merge a staging table into table_name with MERGE. Before
+        PostgreSQL 17, which supports MERGE ... RETURNING, the updated rows
+        are counted with a join before merging.
+
+        Returns:
+            tuple: The number of rows inserted and updated.
+        """
+        condition = ' AND '.join('t.%s = s.%s' % (col, col)
+                                 for col in key_columns)
+        statement = 'MERGE INTO %s t USING %s s ON %s ' % (table_name, source,
+                                                          condition)
+        if update_columns:
+            statement += 'WHEN MATCHED THEN UPDATE SET %s ' % ', '.join(
+                '%s = s.%s' % (col, col) for col in update_columns)
+        statement += 'WHEN NOT MATCHED THEN INSERT (%s) VALUES (%s)' % (
+            ', '.join(columns), ', '.join('s.%s' % col for col in columns))
+
+        if self.conn.server_version >= MERGE_RETURNING_VERSION:
+            self.cursor.execute(
+                'WITH merged AS (%s RETURNING merge_action() AS action) '
+                "SELECT count(*) FILTER (WHERE action = 'INSERT'), "
+                "count(*) FILTER (WHERE action = 'UPDATE') FROM merged" %
+                statement)
+            return self.cursor.fetchone()
+
+        updated = 0
+        if update_columns:
+            self.cursor.execute('SELECT count(*) FROM %s t JOIN %s s ON %s' %
+                                (table_name, source, condition))
+            updated = self.cursor.fetchone()[0]
+        self.cursor.execute(statement)
+        return self.cursor.rowcount - updated, updated
+
+    @_instrumented('parallel_load_file')
+    def parallel_load_file(self, table_name, filename, workers=4, header=True,
+                            delimiter=',', columns=None, quote=None,
+                            null=None, executor='thread',
+                            single_transaction=False, quoted_newlines=True):
+        """Load a file into a Postgres table over multiple connections. The
+        file is split into byte ranges on row boundaries and each range is
+        loaded with its own COPY on its own connection, so the rows are
+        parsed by several server backends at once.
+
+        Args:
+            table_name (str): name of table to load data into.
+            filename (str): name of the file
+            workers (int): Number of ranges and concurrent connections.
+                Defaults to 4.
+            header (boolean): Specify True if the first row of the flat file
+                contains the column names. Defaults to True.
+            delimiter (str): delimiter with which the columns are separated.
+                Defaults to ','
+            columns (list): iterable with name of the columns to import.
+                Defaults to None, see load_from_file().
+            quote (str): Specifies the quoting character to be used when a data
+                value is quoted. Defaults to None, which uses the postgres
+                default of a single double-quote.
+            null (str): Format which nulls (or missing values) are represented.
+                Defaults to None, which corresponds to an empty string.
+            executor (str): 'thread' to run the workers in a thread pool or
+                'process' to run them in a process pool. Defaults to 'thread'.
+            single_transaction (bool): Load the ranges into an unlogged
+                staging table and move them into table_name in a single
+                transaction, so either all or none of the rows are loaded.
+                Defaults to False, in which case each range is committed
+                separately and a failure can leave part of the file loaded.
+            quoted_newlines (bool): Specify True if quoted values may contain
+                newlines, see utils.split_file(). Defaults to True.
+
+        Returns:
+            summary (dict): Dict containing the number of 'ranges', 'rows'
+            and 'bytes' loaded, the 'elapsed' seconds and the 'rows_per_sec'
+            and 'mb_per_sec' throughput.
+
+        Raises:
+            PostgrezLoadError: If executor is invalid or any range fails to
+                load.
+        """
+        if executor not in ('thread', 'process'):
+            raise PostgrezLoadError("Executor must be 'thread' or 'process', "
+                                    "got %s" % executor)
+        if self._scopes:
+            raise PostgrezLoadError('parallel_load_file() can not be called '
+                                    'inside a transaction() block')
+        start = time.time()
+        ranges = split_file(filename, workers, header=header, quote=quote,
+                            quoted_newlines=quoted_newlines)
+        LOGGER.info('Attempting to load file %s into table %s in %s ranges' %
+                    (filename, table_name, len(ranges)))
+
+        target = table_name
+        if single_transaction:
+            target = '_postgrez_stage_%s_%s' % (os.getpid(), next(_STAGING_IDS))
+            ## the staging table must be committed to be visible to workers
+            try:
+                self.cursor.execute('CREATE UNLOGGED TABLE %s (LIKE %s '
+                                    'INCLUDING DEFAULTS)' % (target,
+                                                             table_name))
+                self.conn.commit()
+            except psycopg2.Error as e:
+                self.conn.rollback()
+                raise PostgrezLoadError('Unable to create a staging table for '
+                                        '%s. Error: %s' % (table_name, e))
+
+        copy_query = build_copy_query('load', target, header=False,
+                                    columns=columns, delimiter=delimiter,
+                                    quote=quote, null=null)
+        LOGGER.info('Executing copy query\n%s' % copy_query)
+        pool_class = (futures.ThreadPoolExecutor if executor == 'thread'
+                      else futures.ProcessPoolExecutor)
+        rows = 0
+        errors = []
+        try:
+            with pool_class(max_workers=max(len(ranges), 1)) as pool:
+                jobs = [pool.submit(_load_range, self._params(), copy_query,
+                                    filename, range_start, range_end)
+                        for range_start, range_end in ranges]
+                for job in jobs:
+                    try:
+                        rows += job.result()
+                    except PostgrezLoadError as e:
+                        errors.append(str(e))
+
+            if single_transaction and not errors:
+                cols = '*' if columns is None else ', '.join(columns)
+                insert_columns = ('' if columns is None
+                                  else ' (%s)' % ', '.join(columns))
+                self.cursor.execute('INSERT INTO %s%s SELECT %s FROM %s' %
+                                    (table_name, insert_columns, cols, target))
+        except psycopg2.Error as e:
+            errors.append(str(e))
+        finally:
+            if single_transaction:
+                if errors:
+                    self.conn.rollback()
+                self.cursor.execute('DROP TABLE IF EXISTS %s' % target)
+                self.conn.commit()
+
+        if errors:
+            raise PostgrezLoadError('Unable to load %s of %s ranges of file '
+                                    '%s. Errors: %s' % (len(errors),
+                                    len(ranges), filename, '; '.join(errors)))
+
+        elapsed = time.time() - start
+        nbytes = sum(range_end - range_start for range_start, range_end
+                     in ranges)
+        summary = {'ranges': len(ranges), 'rows': rows, 'bytes': nbytes,
+                   'elapsed': elapsed,
+                   'rows_per_sec': rows / elapsed if elapsed else 0.0,
+                   'mb_per_sec': nbytes / 1048576.0 / elapsed if elapsed
+                                 else 0.0}
+        LOGGER.info('Loaded %s records into table %s in %.2fs (%.1f MB/s)' %
+                    (rows, table_name, elapsed, summary['mb_per_sec']))
+        return summary
+
+    @_instrumented('export_to_file')
     def export_to_file(self, query, filename, columns=None, delimiter=',',
-                header=True, null=None):
+                header=True, null=None, compression='infer',
+                compression_level=None, block_size=DEFAULT_CHUNK_SIZE):
         """Export records from a table or query to a local file.
 
         Args:
@@ -288,6 +1654,19 @@ class Cmd(Connection):
             null (str): Specifies the string that represents a null value.
                 Defaults to None, which uses the postgres default of an
                 unquoted empty string.
+            compression (str): 'gzip', 'bz2', 'xz' or 'zstd' to compress the
+                output while it is streamed from Postgres, None to write an
+                uncompressed file, or 'infer' to detect the codec from the
+                file extension (.gz, .bz2, .xz, .zst). Compressed files are
+                written in the connection's client encoding. zstd requires the
+                zstandard package. Defaults to 'infer'.
+            compression_level (int): Compression level. Defaults to None, the
+                codec's default level.
+            block_size (int): Number of bytes buffered before they are
+                written to the file. Defaults to 262144.
+
+        Raises:
+            PostgrezExportError: If the compression is unknown or unavailable.
         """
 
         copy_query = build_copy_query('export',query, columns=columns,
@@ -295,12 +1674,448 @@ class Cmd(Connection):
                                             header=header, null=null)
         LOGGER.info('Running copy_expert with\n%s\nOutputting results to %s' %
                     (copy_query, filename))
-        with open(filename, 'w') as f:
+        try:
+            compression = infer_compression(filename, compression)
+            f = (open(filename, 'w', buffering=block_size)
+                 if compression is None else
+                 BlockWriter(open_compressed(filename, 'wb', compression,
+                             level=compression_level), block_size))
+        except ValueError as e:
+            raise PostgrezExportError('Unable to open file %s. Error: %s' %
+                                      (filename, e))
+        with f:
             LOGGER.info('Executing copy query\n%s' % copy_query)
             self.cursor.copy_expert(copy_query, f)
 
+    def _slice_conditions(self, source, partition_by, slices):
+        """Build WHERE conditions which split the rows of source into slices.
+
+        Args:
+            source (str): Table name or parenthesized subquery with an alias.
+            partition_by (str): Column to partition on, or None to partition
+                a table by ctid block ranges.
+            slices (int): Number of slices.
+
+        Returns:
+            conditions (list): List of SQL conditions, one per slice, which
+            together cover every row exactly once.
+        """
+        if partition_by is None:
+            self.cursor.execute("SELECT pg_relation_size(%s::regclass) / "
+                                "current_setting('block_size')::int",
+                                (source,))
+            blocks = self.cursor.fetchone()[0]
+            bounds = split_range(0, max(blocks - 1, 0), slices)
+            conditions = ["ctid >= '(%s,0)'::tid AND ctid < '(%s,0)'::tid" %
+                          (start, stop) for start, stop in bounds]
+            ## rows in blocks beyond the size read above belong to the last
+            ## slice
+            conditions[-1] = "ctid >= '(%s,0)'::tid" % bounds[-1][0]
+            return conditions
+
+        self.cursor.execute('SELECT min({0}), max({0}) FROM {1}'.format(
+                            partition_by, source))
+        low, high = self.cursor.fetchone()
+        if low is None or low == high:
+            return ['TRUE']
+        if isinstance(low, int) and isinstance(high, int):
+            bounds = [(start, stop) for start, stop in
+                      split_range(low, high, slices)]
+        else:
+            ## non-integer keys are split on quantiles of the column
+            fractions = [float(i) / slices for i in range(1, slices)]
+            self.cursor.execute('SELECT percentile_disc(%s) WITHIN GROUP '
+                                '(ORDER BY {0}) FROM {1}'.format(
+                                partition_by, source), (fractions,))
+            edges = [low] + sorted(set(self.cursor.fetchone()[0] or [])) + \
+                    [high]
+            edges = [edge for i, edge in enumerate(edges)
+                     if i == 0 or edge != edges[i - 1]]
+            bounds = list(zip(edges, edges[1:])) or [(low, high)]
+
+        conditions = [self.cursor.mogrify('{0} >= %s AND {0} < %s'.format(
+                      partition_by), bound).decode(self._encoding())
+                      for bound in bounds]
+        conditions[0] = '(%s OR %s IS NULL)' % (
+            self.cursor.mogrify('{0} < %s'.format(partition_by),
+                                (bounds[0][1],)).decode(self._encoding()),
+            partition_by)
+        conditions[-1] = self.cursor.mogrify('{0} >= %s'.format(partition_by),
+                                             (bounds[-1][0],)).decode(
+                                             self._encoding())
+        if len(conditions) == 1:
+            conditions = ['TRUE']
+        return conditions
+
+    @_instrumented('parallel_export')
+    def parallel_export(self, query, filename, workers=4, partition_by=None,
+                            columns=None, delimiter=',', header=True, null=None,
+                            merge=True):
+        """Export a table or query over multiple connections. The rows are
+        split into slices on a key column range, or on ctid block ranges for
+        tables, and each slice is exported with its own COPY. All slices read
+        from one snapshot exported by this connection, so the output is
+        consistent as if it had been exported by a single COPY. The
+        connections are borrowed from this Cmd's pool, or from a temporary
+        pool closed once the export completes.
+
+        Args:
+            query (str): A select query or a table
+            filename (str): Filename to copy to. If merge is False, slice i is
+                written to <filename root>_<i><filename extension>.
+            workers (int): Number of slices and concurrent connections.
+                Defaults to 4.
+            partition_by (str, optional): Column to partition the rows on.
+                Integer columns are split into ranges of equal width, other
+                columns on their quantiles. Required if query is a select
+                query. Defaults to None, which partitions a table by ctid
+                block ranges.
+            columns (list): List of column names to export. Only used when
+                exporting a table. Defaults to None.
+            delimiter (str): Delimiter to separate columns with. Defaults to ','.
+            header (boolean): Specify True to write the column names at the top
+                of the merged file, or of every shard if merge is False.
+                Defaults to True.
+            null (str): Specifies the string that represents a null value.
+                Defaults to None, which uses the postgres default of an
+                unquoted empty string.
+            merge (bool): Concatenate the slices into filename. Defaults to
+                True. If False, the shards are left as separate files.
+
+        Returns:
+            summary (dict): Dict containing the number of 'slices', the
+            'files' written, the number of 'rows' and 'bytes' exported and the
+            'elapsed' seconds.
+
+        Raises:
+            PostgrezExportError: If query is a select query and no
+                partition_by column is given, work is pending in the open
+                transaction, the pool has no free connections, or any slice
+                fails to export.
+        """
+        if self._scopes:
+            raise PostgrezExportError('parallel_export() can not be called '
+                                      'inside a transaction() block')
+        start = time.time()
+        if is_query(query):
+            if partition_by is None:
+                raise PostgrezExportError('partition_by must be provided to '
+                                          'export a query in parallel')
+            source = '(%s) AS postgrez_slice' % query
+            select_list = '*'
+        else:
+            source = query
+            select_list = ', '.join(columns) if columns else '*'
+
+        pool = self.pool
+        if pool is not None:
+            ## this Cmd already holds one of the pool's connections
+            workers = min(workers, pool.maxconn - 1)
+            if workers < 1:
+                raise PostgrezExportError('Not enough free pooled '
+                                          'connections to export in parallel')
+        root, ext = os.path.splitext(filename)
+        ## the snapshot stays valid while this transaction is open
+        snapshot = self._export_snapshot()
+        if pool is None:
+            ## a temporary pool, closed once the slices are exported
+            pool = ConnectionPool(minconn=0, maxconn=workers,
+                                  **self._params())
+        try:
+            conditions = self._slice_conditions(source, partition_by, workers)
+            jobs = []
+            for i, condition in enumerate(conditions):
+                copy_query = build_copy_query('export',
+                    'SELECT %s FROM %s WHERE %s' % (select_list, source,
+                                                    condition),
+                    delimiter=delimiter, header=header and (i == 0 or
+                    not merge), null=null)
+                jobs.append((copy_query, '%s_%s%s' % (root, i, ext)))
+            LOGGER.info('Exporting %s in %s slices under snapshot %s' %
+                        (query[0:QUERY_LENGTH], len(jobs), snapshot))
+
+            rows = 0
+            errors = []
+            with futures.ThreadPoolExecutor(max_workers=min(len(jobs),
+                                            pool.maxconn)) as executor:
+                results = [executor.submit(_export_slice, self._params(),
+                                           pool, snapshot, copy_query,
+                                           shard)
+                           for copy_query, shard in jobs]
+                for result in results:
+                    try:
+                        rows += result.result()
+                    except PostgrezExportError as e:
+                        errors.append(str(e))
+        except psycopg2.Error as e:
+            raise PostgrezExportError('Unable to export %s in parallel. '
+                                      'Error: %s' % (query[0:QUERY_LENGTH], e))
+        finally:
+            self.conn.rollback()
+            if pool is not self.pool:
+                pool.closeall()
+
+        shards = [shard for _, shard in jobs]
+        if errors:
+            for shard in shards:
+                if os.path.exists(shard):
+                    os.remove(shard)
+            raise PostgrezExportError('Unable to export %s of %s slices. '
+                                      'Errors: %s' % (len(errors), len(jobs),
+                                      '; '.join(errors)))
+
+        files = shards
+        if merge:
+            with open(filename, 'wb') as out:
+                for shard in shards:
+                    with open(shard, 'rb') as f:
+                        shutil.copyfileobj(f, out, DEFAULT_CHUNK_SIZE * 4)
+                    os.remove(shard)
+            files = [filename]
+
+        summary = {'slices': len(jobs), 'files': files, 'rows': rows,
+                   'bytes': sum(os.path.getsize(f) for f in files),
+                   'elapsed': time.time() - start}
+        LOGGER.info('Exported %s records to %s file(s) in %.2fs' %
+                    (rows, len(files), summary['elapsed']))
+        return summary
+
+    def _export_snapshot(self, error=PostgrezExportError):
+        """Start a repeatable read transaction and export its snapshot, so
+        other connections can read the same data. The snapshot stays valid
+        until the transaction ends. An open read-only transaction is rolled
+        back first.
+
+        Args:
+            error (Exception): Postgrez exception class raised on failure.
+
+        Returns:
+            snapshot (str): Snapshot id, see SET TRANSACTION SNAPSHOT.
+
+        Raises:
+            error: If the open transaction has written data, i.e. work left
+                pending by a call with commit=False, or the snapshot can't
+                be exported.
+        """
+        try:
+            status = self.conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+                ## a transaction id is only assigned once data is written
+                self.cursor.execute('SELECT txid_current_if_assigned()')
+                if self.cursor.fetchone()[0] is not None:
+                    raise error('Commit or roll back the pending work before '
+                                'running in parallel')
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                self.conn.rollback()
+            self.cursor.execute('SET TRANSACTION ISOLATION LEVEL '
+                                'REPEATABLE READ')
+            self.cursor.execute('SELECT pg_export_snapshot()')
+            return self.cursor.fetchone()[0]
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            raise error('Unable to export a snapshot. Error: %s' % e)
+
+    @_instrumented('copy_to')
+    def copy_to(self, query, table_name, destination, columns=None,
+                    target_columns=None, format='csv', workers=1,
+                    partition_by=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                    commit=True):
+        """Copy the records of a table or query into a table of another
+        database, without an intermediate file. A COPY ... TO STDOUT on this
+        connection is piped into a COPY ... FROM STDIN on the destination
+        through a bounded in-memory pipe, with the export running in a
+        producer thread.
+
+        With several workers the rows are split into slices as in
+        parallel_export(), read from one snapshot of this connection, and
+        each slice is piped over its own pair of connections, borrowed from
+        the pools of this Cmd and destination or from temporary pools. The
+        slices are committed once all of them have loaded, or all rolled
+        back.
+
+        Args:
+            query (str): A select query or a table
+            table_name (str): name of the destination table.
+            destination (Cmd): Connection to the destination database.
+            columns (list): List of column names to export. Only used when
+                exporting a table. Defaults to None.
+            target_columns (list): Columns of the destination table to load,
+                in the order they are exported. Defaults to None, every column
+                in table order.
+            format (str): 'csv', or 'binary' to copy in PostgreSQL's binary
+                format, which skips formatting and parsing every value but
+                requires the source and destination column types to match
+                exactly. Defaults to 'csv'.
+            workers (int): Number of slices and concurrent connection pairs.
+                Defaults to 1.
+            partition_by (str, optional): Column to partition the rows on if
+                workers is greater than 1, see parallel_export(). Required if
+                query is a select query. Defaults to None.
+            chunk_size (int, optional): Size in bytes of the chunks passed
+                between the connections. Defaults to 262144.
+            commit (bool): Commit the destination once the records have been
+                copied. Ignored if workers is greater than 1, slices are
+                always committed. Defaults to True.
+
+        Returns:
+            summary (dict): Dict containing the number of 'slices', the number
+            of 'rows' and 'bytes' copied and the 'elapsed' seconds.
+
+        Raises:
+            PostgrezLoadError: If format is invalid, a parallel copy is run
+                inside a transaction() block or without partition_by for a
+                select query, or the copy fails.
+        """
+        if format not in ('csv', 'binary'):
+            raise PostgrezLoadError("Format must be 'csv' or 'binary', got "
+                                    "%s" % format)
+        if workers > 1 and (self._scopes or destination._scopes):
+            raise PostgrezLoadError('Parallel copies can not be run inside a '
+                                    'transaction() block')
+        if workers > 1 and is_query(query) and partition_by is None:
+            raise PostgrezLoadError('partition_by must be provided to copy a '
+                                    'query in parallel')
+        start = time.time()
+        binary = format == 'binary'
+        load_query = build_copy_query('load', table_name,
+                                      columns=target_columns, header=False,
+                                      binary=binary)
+        ## both sides must agree on the encoding of the text they exchange
+        encoding = destination.conn.encoding
+        if encoding != self.conn.encoding:
+            destination.conn.set_client_encoding(self.conn.encoding)
+        try:
+            if workers > 1:
+                rows, nbytes, slices = self._copy_slices(query, destination,
+                    load_query, columns=columns, binary=binary,
+                    workers=workers, partition_by=partition_by,
+                    chunk_size=chunk_size)
+            else:
+                export_query = build_copy_query('export', query,
+                                                columns=columns, header=False,
+                                                binary=binary)
+                LOGGER.info('Copying %s into table %s' %
+                            (query[0:QUERY_LENGTH].strip(), table_name))
+                try:
+                    rows, nbytes = _pipe_copy(self.cursor, export_query,
+                                              destination.cursor, load_query,
+                                              chunk_size=chunk_size)
+                except psycopg2.Error as e:
+                    self._rollback()
+                    destination._rollback()
+                    raise PostgrezLoadError('Unable to copy %s into table %s. '
+                                            'Error: %s' % (
+                                            query[0:QUERY_LENGTH].strip(),
+                                            table_name, e))
+                slices = 1
+                if commit:
+                    destination._commit()
+        finally:
+            if destination.conn.encoding != encoding:
+                destination.conn.set_client_encoding(encoding)
+
+        summary = {'slices': slices, 'rows': rows, 'bytes': nbytes,
+                   'elapsed': time.time() - start}
+        LOGGER.info('Copied %s records into table %s in %.2fs' %
+                    (rows, table_name, summary['elapsed']))
+        return summary
+
+    def _copy_slices(self, query, destination, load_query, columns=None,
+                        binary=False, workers=4, partition_by=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+        """Copy the slices of a table or query in parallel, see copy_to().
+
+        Returns:
+            rows (int): Number of rows copied.
+            nbytes (int): Number of bytes streamed.
+            slices (int): Number of slices.
+
+        Raises:
+            PostgrezLoadError: If the pools have no free connections, or any
+                slice fails to copy.
+        """
+        if is_query(query):
+            source = '(%s) AS postgrez_slice' % query
+            select_list = '*'
+        else:
+            source = query
+            select_list = ', '.join(columns) if columns else '*'
+        pool = self.pool
+        if pool is None:
+            ## temporary pools, closed once the slices are copied
+            pool = ConnectionPool(minconn=0, maxconn=workers,
+                                  **self._params())
+        dst_pool = destination.pool
+        if dst_pool is None:
+            dst_pool = ConnectionPool(minconn=0, maxconn=workers,
+                                      **destination._params())
+        ## every slice holds a source and a destination connection, on top
+        ## of the ones this Cmd and destination may already hold
+        held = [self.pool, destination.pool]
+        if pool is dst_pool:
+            workers = min(workers, (pool.maxconn - held.count(pool)) // 2)
+        else:
+            workers = min(workers, pool.maxconn - held.count(pool),
+                          dst_pool.maxconn - held.count(dst_pool))
+
+        rows = nbytes = 0
+        errors = []
+        with contextlib.ExitStack() as stack:
+            for temporary in {pool, dst_pool} - {self.pool, destination.pool}:
+                stack.callback(temporary.closeall)
+            if workers < 1:
+                raise PostgrezLoadError('Not enough free pooled connections '
+                                        'to copy in parallel')
+            snapshot = self._export_snapshot(PostgrezLoadError)
+            try:
+                export_queries = [build_copy_query('export',
+                    'SELECT %s FROM %s WHERE %s' % (select_list, source,
+                                                    condition),
+                    header=False, binary=binary) for condition in
+                    self._slice_conditions(source, partition_by, workers)]
+                LOGGER.info('Copying %s in %s slices under snapshot %s' %
+                            (query[0:QUERY_LENGTH], len(export_queries),
+                             snapshot))
+                targets = [stack.enter_context(Connection(pool=dst_pool,
+                           **destination._params()))
+                           for _ in export_queries]
+                for target in targets:
+                    target.conn.set_client_encoding(self.conn.encoding)
+                with futures.ThreadPoolExecutor(max_workers=min(
+                        len(export_queries), pool.maxconn)) as executor:
+                    results = [executor.submit(_copy_slice, self._params(),
+                                               pool, snapshot, export_query,
+                                               target, load_query, chunk_size)
+                               for export_query, target in
+                               zip(export_queries, targets)]
+                    for result in results:
+                        try:
+                            slice_rows, slice_bytes = result.result()
+                            rows += slice_rows
+                            nbytes += slice_bytes
+                        except PostgrezLoadError as e:
+                            errors.append(str(e))
+                if errors:
+                    for target in targets:
+                        target.conn.rollback()
+                    raise PostgrezLoadError('Unable to copy %s of %s slices. '
+                                            'Errors: %s' % (len(errors),
+                                            len(export_queries),
+                                            '; '.join(errors)))
+                for target in targets:
+                    target.conn.commit()
+            except psycopg2.Error as e:
+                raise PostgrezLoadError('Unable to copy %s in parallel. '
+                                        'Error: %s' % (query[0:QUERY_LENGTH],
+                                                       e))
+            finally:
+                self.conn.rollback()
+        return rows, nbytes, len(export_queries)
+
+    @_instrumented('export_to_object')
     def export_to_object(self, query, columns=None, delimiter=',', header=True,
-                            null=None):
+                            null=None, columnar=False, format='csv',
+                            typed=False):
         """Export records from a table or query and returns list of records.
 
         Args:
@@ -313,40 +2128,485 @@ class Cmd(Connection):
             delimiter (str): Delimiter to separate columns with. Defaults to ','
             header (boolean): Specify True to return the column names. Defaults
                 to True.
+            null (str): Specifies the string that represents a null value.
+                Defaults to None, which uses the postgres default of an
+                unquoted empty string.
+            columnar (bool): Return a dict of column name -> column values
+                instead of one record per row, see utils.build_columns().
+                Column names are always exported in this mode. Defaults to
+                False.
+            format (str): 'csv' to export text values, or 'binary' to export
+                in PostgreSQL's binary COPY format and decode every value into
+                its native python type (int, float, Decimal, datetime, ...).
+                delimiter and null are ignored in binary mode. Defaults to
+                'csv'.
+            typed (bool): Decode csv values into int, float, Decimal, bool,
+                date, datetime, ... based on the column types of the result,
+                and nulls into None. Nulls are exported as null, or '\\N' if
+                null is None. Types without a python equivalent are returned
+                as strings. Dates and timestamps require the ISO DateStyle,
+                the server default. Defaults to False.
 
         Returns:
             data (list): If header is True, returns list of dicts where each
             dict is in the format {col1: val1, col2:val2, ...}. Otherwise,
             returns a list of lists where each list is [val1, val2, ...].
+            If columnar is True, returns a dict in the format
+            {col1: [val1, ...], col2: [val2, ...], ...}.
 
         Raises:
             PostgrezExportError: If an error occurs while exporting to an object.
         """
+        if columnar:
+            cols, rows = self._export_rows(query, columns=columns,
+                                           delimiter=delimiter, header=True,
+                                           null=null, format=format,
+                                           typed=typed)
+            return build_columns(cols, iter_batches(rows, DEFAULT_BATCH_SIZE))
 
-        copy_query = build_copy_query('export',query, columns=columns,
-                                            delimiter=delimiter,
-                                            header=header, null=null)
-        data = None
+        cols, rows = self._export_rows(query, columns=columns,
+                                       delimiter=delimiter, header=header,
+                                       null=null, format=format, typed=typed)
         try:
-            LOGGER.info('Running copy_expert with with\n%s\nOutputting results to '
-                     'list.' % copy_query)
-            # stream output to local object
-            text_stream = io.StringIO()
-            self.cursor.copy_expert(copy_query, text_stream)
-            output = text_stream.getvalue()
-
-            # parse output
-            output = output.split('\n')
-            cols = output[0].split(delimiter)
-            end_index = (-1 if len(output[1:]) > 1 else 2)
             if header:
-                data = [{cols[i]:value for i, value in
-                            enumerate(row.split(delimiter))}
-                            for row in output[1:end_index]]
+                data = [dict(zip(cols, row)) for row in rows]
             else:
-                data = [row.split(delimiter) for row in output[1:-1]]
-        except Exception as e:
-            raise PostgrezExportError('Unable to export to object. Error: %s'
+                data = list(rows)
+        finally:
+            rows.close()
+        return data
+
+    def _arrow_batches(self, query, columns=None,
+                        batch_size=DEFAULT_ARROW_BATCH_SIZE,
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+        """Start streaming the records of a table or query as Arrow record
+        batches. Records are exported in binary COPY format and decoded
+        incrementally, so at most one batch of rows is held in memory.
+
+        Args:
+            query (str): A select query or a table_name
+            columns (list): List of column names to export, if query is a
+                table name. Defaults to None.
+            batch_size (int, optional): Number of rows per record batch.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output.
+
+        Returns:
+            schema (pyarrow.Schema): Schema of the record batches.
+            batches (generator): Generator of pyarrow.RecordBatch.
+
+        Raises:
+            PostgrezExportError: If pyarrow is not installed or the query
+                can't be described.
+        """
+        if arrow.pyarrow is None:
+            raise PostgrezExportError('Exporting to Arrow requires the '
+                                      'pyarrow package')
+        try:
+            description = self._describe(query, columns=columns, full=True)
+        except psycopg2.Error as e:
+            self._rollback()
+            raise PostgrezExportError('Unable to export records. '
+                                      'Error: %s' % (e))
+        schema, converters = arrow.build_schema(description)
+        copy_query = build_copy_query('export', query, columns=columns,
+                                      binary=True)
+        LOGGER.info('Running copy_expert with\n%s\nStreaming record batches.'
+                    % copy_query)
+        decoders = build_decoders([desc[1] for desc in description],
+                                  encoding=self._encoding())
+        rows = self._iter_binary_rows(copy_query, decoders,
+                                      chunk_size=chunk_size)
+
+        def batches():
+            try:
+                for batch in iter_batches(rows, batch_size):
+                    yield arrow.build_record_batch(batch, schema, converters)
+            except arrow.pyarrow.ArrowException as e:
+                raise PostgrezExportError('Unable to convert records to '
+                                          'Arrow. Error: %s' % (e))
+            finally:
+                rows.close()
+        return schema, batches()
+
+    @_instrumented('export_to_arrow')
+    def export_to_arrow(self, query, columns=None,
+                            batch_size=DEFAULT_ARROW_BATCH_SIZE, stream=False,
+                            chunk_size=DEFAULT_CHUNK_SIZE):
+        """Export records from a table or query into an Arrow table, with
+        one typed column per result column. See arrow.arrow_type() for the
+        type mapping. Requires the pyarrow package.
+
+        Args:
+            query (str): A select query or a table_name
+            columns (list): List of column names to export. columns should only
+                be provided if you are exporting a table
+                (i.e. query = 'table_name'). Defaults to None.
+            batch_size (int, optional): Number of rows per record batch.
+                Defaults to 65536.
+            stream (bool, optional): Return a pyarrow.RecordBatchReader
+                which streams the batches from the server as they are read,
+                instead of a table holding every record. The reader must be
+                consumed before the connection is used again. Defaults to
+                False.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output. Defaults to 262144.
+
+        Returns:
+            table (pyarrow.Table or pyarrow.RecordBatchReader): The records.
+
+        Raises:
+            PostgrezExportError: If pyarrow is not installed or an error
+                occurs while exporting.
+        """
+        schema, batches = self._arrow_batches(query, columns=columns,
+                                              batch_size=batch_size,
+                                              chunk_size=chunk_size)
+        if stream:
+            return arrow.pyarrow.RecordBatchReader.from_batches(schema,
+                                                                batches)
+        return arrow.pyarrow.Table.from_batches(list(batches), schema=schema)
+
+    @_instrumented('export_to_parquet')
+    def export_to_parquet(self, query, filename, columns=None,
+                            batch_size=DEFAULT_ARROW_BATCH_SIZE,
+                            compression='snappy',
+                            chunk_size=DEFAULT_CHUNK_SIZE):
+        """Export records from a table or query to a Parquet file. Records are
+        streamed from the server and written one row group at a time, so
+        memory use is bounded by batch_size regardless of the size of the
+        result. See arrow.arrow_type() for the type mapping. Requires the
+        pyarrow package.
+
+        Args:
+            query (str): A select query or a table_name
+            filename (str): Filename to write to.
+            columns (list): List of column names to export. columns should only
+                be provided if you are exporting a table
+                (i.e. query = 'table_name'). Defaults to None.
+            batch_size (int, optional): Number of rows per row group.
+                Defaults to 65536.
+            compression (str, optional): Parquet compression codec, i.e.
+                'snappy', 'gzip', 'zstd' or None. Defaults to 'snappy'.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output. Defaults to 262144.
+
+        Returns:
+            summary (dict): Dict containing the number of 'rows' and
+            'row_groups' written, the file size in 'bytes' and the 'elapsed'
+            seconds.
+
+        Raises:
+            PostgrezExportError: If pyarrow is not installed or an error
+                occurs while exporting.
+        """
+        start = time.time()
+        schema, batches = self._arrow_batches(query, columns=columns,
+                                              batch_size=batch_size,
+                                              chunk_size=chunk_size)
+        rows = row_groups = 0
+        try:
+            with arrow.parquet.ParquetWriter(filename, schema,
+                                             compression=compression) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+                    row_groups += 1
+        except (OSError, ValueError, arrow.pyarrow.ArrowException) as e:
+            raise PostgrezExportError('Unable to write to %s. Error: %s' %
+                                      (filename, e))
+        finally:
+            batches.close()
+
+        summary = {'rows': rows, 'row_groups': row_groups,
+                   'bytes': os.path.getsize(filename),
+                   'elapsed': time.time() - start}
+        LOGGER.info('Exported %s records to %s in %s row groups in %.2fs' %
+                    (rows, filename, row_groups, summary['elapsed']))
+        return summary
+
+    def _copy_out(self, copy_query, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Run a COPY ... TO STDOUT query in a background thread and yield its
+        output through a bounded CopyPipe, so memory use does not depend on
+        the size of the result. If the caller stops reading early the copy is
+        interrupted and rolled back, inside a transaction() block only to a
+        savepoint taken before the copy.
+
+        Args:
+            copy_query (str): COPY ... TO STDOUT query to run.
+            chunk_size (int, optional): Size in bytes of the yielded chunks.
+
+        Yields:
+            chunk (bytes): Chunk of COPY output.
+        """
+        pipe = CopyPipe(chunk_size=chunk_size)
+        savepoint = None
+        if self._scopes and not self._aborted:
+            savepoint = 'postgrez_copy_out'
+            self.cursor.execute('SAVEPOINT %s' % savepoint)
+
+        def produce():
+            try:
+                self.cursor.copy_expert(copy_query, pipe, size=chunk_size)
+            except Exception as e:
+                pipe.close(e)
+            else:
+                pipe.close()
+
+        thread = threading.Thread(target=produce, name='postgrez-copy-out')
+        thread.daemon = True
+        thread.start()
+        finished = False
+        try:
+            for chunk in pipe.chunks():
+                yield chunk
+            finished = True
+        finally:
+            pipe.abort()
+            thread.join()
+            if savepoint is None:
+                if not finished:
+                    ## the copy was interrupted, discard the failed transaction
+                    self._rollback()
+            else:
+                if not finished:
+                    self.cursor.execute('ROLLBACK TO SAVEPOINT %s' % savepoint)
+                self.cursor.execute('RELEASE SAVEPOINT %s' % savepoint)
+
+    def _encoding(self):
+        """Return the python codec matching the connection's client encoding.
+
+        Returns:
+            encoding (str): Python codec name.
+        """
+        return psycopg2.extensions.encodings.get(self.conn.encoding, 'utf-8')
+
+    def iter_export(self, query, columns=None, delimiter=',', header=True,
+                        null=None, batch_size=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, format='csv',
+                        typed=False):
+        """Export records from a table or query and yield them as they are
+        streamed from the server. Unlike export_to_object(), memory use stays
+        flat regardless of the size of the result.
+
+        Args:
+            query (str): A select query or a table_name
+            columns (list): List of column names to export. columns should only
+                be provided if you are exporting a table
+                (i.e. query = 'table_name'). If query is a query to export, desired
+                columns should be specified in the select portion of that query
+                (i.e. query = 'select col1, col2 from ...'). Defaults to None.
+            delimiter (str): Delimiter to separate columns with. Defaults to ','
+            header (boolean): Specify True to yield dicts keyed by column name.
+                Defaults to True.
+            null (str): Specifies the string that represents a null value.
+                Defaults to None, which uses the postgres default of an
+                unquoted empty string.
+            batch_size (int, optional): Yield lists of up to batch_size
+                records instead of single records. Defaults to None.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output. Defaults to 262144.
+            format (str): 'csv' to export text values, or 'binary' to decode
+                every value into its native python type. delimiter and null
+                are ignored in binary mode. Defaults to 'csv'.
+            typed (bool): Decode csv values into their native python types,
+                see export_to_object(). Defaults to False.
+
+        Yields:
+            record (dict or list): If header is True, dicts in the format
+            {col1: val1, col2:val2, ...}, otherwise lists in the format
+            [val1, val2, ...]. Lists of records if batch_size is provided.
+
+        Raises:
+            PostgrezConnectionError: If the connection has been closed.
+            PostgrezExportError: If an error occurs while exporting.
+        """
+        if self._connected() == False:
+            raise PostgrezConnectionError('Connection has been closed')
+
+        cols, rows = self._export_rows(query, columns=columns,
+                                       delimiter=delimiter, header=header,
+                                       null=null, format=format,
+                                       chunk_size=chunk_size, typed=typed)
+        try:
+            if header:
+                rows = (dict(zip(cols, row)) for row in rows)
+            if batch_size is None:
+                for row in rows:
+                    yield row
+            else:
+                for batch in iter_batches(rows, batch_size):
+                    yield batch
+        finally:
+            rows.close()
+
+    def _describe(self, query, columns=None, full=False):
+        """Look up the names and type OIDs of the columns a table or query
+        exports, without running the query.
+
+        Args:
+            query (str): A select query or a table_name
+            columns (list): List of column names to export, if query is a
+                table name. Defaults to None.
+            full (bool): Return the complete cursor.description entries,
+                including the precision and scale of numeric columns.
+                Defaults to False.
+
+        Returns:
+            description (list): List of (column name, type OID) tuples.
+        """
+        if is_query(query):
+            describe_query = 'SELECT * FROM (%s) postgrez_q LIMIT 0' % query
+        else:
+            describe_query = 'SELECT %s FROM %s LIMIT 0' % (
+                (','.join(columns) if columns else '*'), query)
+        self.cursor.execute(describe_query)
+        if full:
+            return list(self.cursor.description)
+        return [(desc[0], desc[1]) for desc in self.cursor.description]
+
+    def _export_rows(self, query, columns=None, delimiter=',', header=True,
+                        null=None, format='csv', chunk_size=DEFAULT_CHUNK_SIZE,
+                        typed=False):
+        """Start streaming the records of a table or query.
+
+        Args:
+            query (str): A select query or a table_name
+            columns (list): List of column names to export, if query is a
+                table name. Defaults to None.
+            delimiter (str): Delimiter to separate columns with.
+            header (boolean): Whether column names are needed.
+            null (str): Specifies the string that represents a null value.
+            format (str): 'csv' or 'binary'.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output.
+            typed (bool, optional): Decode csv values into their native
+                python types. Defaults to False.
+
+        Returns:
+            cols (list): Column names, None if header is False and format is
+                'csv'.
+            rows (generator): Generator of lists of values.
+
+        Raises:
+            PostgrezExportError: If format is invalid.
+        """
+        if format == 'binary' or typed:
+            try:
+                description = self._describe(query, columns=columns)
+            except psycopg2.Error as e:
+                self._rollback()
+                raise PostgrezExportError('Unable to export records. '
+                                          'Error: %s' % (e))
+        if format == 'binary':
+            copy_query = build_copy_query('export', query, columns=columns,
+                                          binary=True)
+            LOGGER.info('Running copy_expert with\n%s\nStreaming results.' %
+                        copy_query)
+            decoders = build_decoders([oid for _, oid in description],
+                                      encoding=self._encoding())
+            rows = self._iter_binary_rows(copy_query, decoders,
+                                          chunk_size=chunk_size)
+            return [name for name, _ in description], rows
+        elif format != 'csv':
+            raise PostgrezExportError("Format must be 'csv' or 'binary', got "
+                                      "%s" % format)
+
+        if typed and null is None:
+            null = types.TEXT_NULL
+        copy_query = build_copy_query('export', query, columns=columns,
+                                            delimiter=delimiter,
+                                            header=header, null=null)
+        LOGGER.info('Running copy_expert with\n%s\nStreaming results.' %
+                    copy_query)
+        rows = self._iter_copy_rows(copy_query, delimiter=delimiter,
+                                    chunk_size=chunk_size)
+        cols = next(rows, []) if header else None
+        if typed:
+            decoders = types.build_text_decoders(
+                [oid for _, oid in description])
+            rows = self._decode_copy_rows(rows, decoders, null)
+        return cols, rows
+
+    def _decode_copy_rows(self, rows, decoders, null):
+        """Decode parsed CSV rows into native python values, one batch of
+        rows at a time.
+
+        Args:
+            rows (generator): Rows returned by _iter_copy_rows().
+            decoders (list): Decoders returned by types.build_text_decoders().
+            null (str): Representation of nulls.
+
+        Yields:
+            row (list): Decoded row.
+
+        Raises:
+            PostgrezExportError: If a value can't be decoded.
+        """
+        try:
+            for batch in iter_batches(rows, DEFAULT_BATCH_SIZE):
+                try:
+                    batch = types.decode_rows(batch, decoders, null=null)
+                except (ValueError, decimal.InvalidOperation) as e:
+                    raise PostgrezExportError('Unable to decode records. '
+                                              'Error: %s' % (e))
+                for row in batch:
+                    yield row
+        finally:
+            rows.close()
+
+    def _iter_binary_rows(self, copy_query, decoders,
+                            chunk_size=DEFAULT_CHUNK_SIZE):
+        """Run a binary COPY ... TO STDOUT query and decode its output
+        incrementally.
+
+        Args:
+            copy_query (str): COPY ... TO STDOUT (FORMAT binary) query to run.
+            decoders (list): One binary decoder per column.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output.
+
+        Yields:
+            row (list): Decoded row.
+
+        Raises:
+            PostgrezExportError: If an error occurs while exporting.
+        """
+        chunks = self._copy_out(copy_query, chunk_size=chunk_size)
+        try:
+            for row in iter_binary_rows(chunks, decoders):
+                yield row
+        except (psycopg2.Error, ValueError) as e:
+            raise PostgrezExportError('Unable to export records. Error: %s'
                     % (e))
+        finally:
+            chunks.close()
 
-        return data
+    def _iter_copy_rows(self, copy_query, delimiter=',',
+                            chunk_size=DEFAULT_CHUNK_SIZE):
+        """Run a CSV COPY ... TO STDOUT query and parse its output
+        incrementally.
+
+        Args:
+            copy_query (str): COPY ... TO STDOUT query to run.
+            delimiter (str): Delimiter the columns are separated with.
+            chunk_size (int, optional): Size in bytes of the chunks read from
+                the COPY output.
+
+        Yields:
+            row (list): Parsed row, including the header row if the query
+            exports one.
+
+        Raises:
+            PostgrezExportError: If an error occurs while exporting.
+        """
+        lines = iter_lines(self._copy_out(copy_query, chunk_size=chunk_size),
+                           encoding=self._encoding())
+        try:
+            for row in csv.reader(lines, delimiter=delimiter):
+                yield row
+        except (psycopg2.Error, csv.Error) as e:
+            raise PostgrezExportError('Unable to export records. Error: %s'
+                    % (e))
+        finally:
+            lines.close()
@@ -0,0 +1,227 @@
+"""
+Prepared module, contains a per-connection cache which transparently
+prepares frequently executed queries on the server.
+"""
+
+import warnings
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    import psycopg2
+    import psycopg2.extensions
+from .utils import QUERY_LENGTH
+import collections
+import collections.abc
+import itertools
+import threading
+import weakref
+import logging
+import re
+
+LOGGER = logging.getLogger(__name__)
+
+## cache defaults
+DEFAULT_CACHE_SIZE = 100
+DEFAULT_THRESHOLD = 5
+
+## statements which can be prepared
+PREPARABLE = re.compile(r'\s*(select|insert|update|delete|values|with)\b',
+                        re.IGNORECASE)
+
+## psycopg2 placeholders, plus escaped percent signs
+PLACEHOLDER = re.compile(r'%%|%\((\w+)\)s|%s')
+
+## statement caches, keyed by psycopg2 connection
+_CACHES = weakref.WeakKeyDictionary()
+_CACHES_LOCK = threading.Lock()
+
+
+def convert_placeholders(query, named=False):
+    """Convert the psycopg2 placeholders of a query into the numbered
+    parameters used by PREPARE.
+
+    Args:
+        query (str): Query with %s or %(name)s placeholders.
+        named (bool, optional): The query uses %(name)s placeholders. Defaults
+            to False.
+
+    Returns:
+        tuple: The converted query and the EXECUTE parameter list, i.e.
+        ('select $1 + $2', '(%s, %s)'), or an empty string if the query has
+        no placeholders.
+
+    Raises:
+        ValueError: If the query mixes %s and %(name)s placeholders.
+    """
+    names = []
+    positional = [0]
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if (name is not None) != named:
+            raise ValueError('Query mixes positional and named placeholders')
+        if name is None:
+            positional[0] += 1
+            return '$%s' % positional[0]
+        if name not in names:
+            names.append(name)
+        return '$%s' % (names.index(name) + 1)
+
+    converted = PLACEHOLDER.sub(replace, query)
+    if named:
+        params = ', '.join('%%(%s)s' % name for name in names)
+    else:
+        params = ', '.join(['%s'] * positional[0])
+    return converted, ('(%s)' % params if params else '')
+
+
+class StatementCache(object):
+    """LRU cache of the queries executed on one connection. A query is
+    executed normally until it has been seen `threshold` times, after which it
+    is prepared with PREPARE and run with EXECUTE, so the server skips parsing
+    and planning it. Prepared statements evicted from the cache are removed
+    with DEALLOCATE.
+
+    Statements are only prepared or deallocated while the connection is idle,
+    so a query which can't be prepared never aborts an open transaction. Such
+    queries are executed normally from then on.
+
+    Parameters of prepared statements take the type inferred by the server,
+    so untyped parameters outside of a typed context (i.e. `select %s`) come
+    back as text. Cast them (`select %s::int`) to keep their type.
+
+    Attributes:
+        maxsize (int): Maximum number of queries tracked.
+        threshold (int): Number of executions after which a query is prepared.
+        stats (dict): Counters of 'hits' (executions of prepared statements),
+            'misses' (normal executions), 'prepared', 'evictions' and
+            'failures' (queries which could not be prepared).
+    """
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, threshold=DEFAULT_THRESHOLD):
+        """
+        Args:
+            maxsize (int, optional): Maximum number of queries tracked.
+                Defaults to 100.
+            threshold (int, optional): Number of executions after which a
+                query is prepared. Defaults to 5.
+        """
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.stats = {'hits': 0, 'misses': 0, 'prepared': 0, 'evictions': 0,
+                      'failures': 0}
+        ## {key: [uses, statement name, EXECUTE query]}
+        self._entries = collections.OrderedDict()
+        self._deallocate = []
+        self._names = itertools.count()
+
+    def _idle(self, conn):
+        return (conn.get_transaction_status() ==
+                psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def _evict(self):
+        """Drop least recently used queries until the cache fits maxsize.
+        """
+        while len(self._entries) > self.maxsize:
+            _, (_, name, _) = self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+            if name:
+                self._deallocate.append(name)
+
+    def _run_deallocate(self, cursor):
+        """DEALLOCATE evicted statements. Must be called while idle.
+        """
+        while self._deallocate:
+            name = self._deallocate.pop()
+            LOGGER.debug('Deallocating prepared statement %s' % name)
+            cursor.execute('DEALLOCATE %s' % name)
+        cursor.connection.commit()
+
+    def _prepare(self, cursor, query, named):
+        """PREPARE a query. Must be called while idle.
+
+        Returns:
+            tuple: The statement name and EXECUTE query, or (None, None) if
+            the query could not be prepared.
+        """
+        name = 'postgrez_%s' % next(self._names)
+        try:
+            converted, params = convert_placeholders(query, named=named)
+            cursor.execute('PREPARE %s AS %s' % (name, converted))
+            cursor.connection.commit()
+        except (psycopg2.Error, ValueError) as e:
+            cursor.connection.rollback()
+            LOGGER.info('Unable to prepare query %s... Error: %s' %
+                        (query[0:QUERY_LENGTH].strip(), e))
+            self.stats['failures'] += 1
+            return None, None
+        self.stats['prepared'] += 1
+        return name, 'EXECUTE %s %s' % (name, params)
+
+    def execute(self, cursor, query, query_vars=None):
+        """Execute a query on the cursor, preparing it once it is hot.
+
+        Args:
+            cursor (psycopg2 cursor): Cursor of the cached connection.
+            query (str): Query to be executed.
+            query_vars (tuple, list or dict): Variables to be executed with
+                query.
+        """
+        if not PREPARABLE.match(query) or ';' in query.strip().rstrip(';'):
+            self.stats['misses'] += 1
+            cursor.execute(query, vars=query_vars)
+            return
+
+        named = isinstance(query_vars, collections.abc.Mapping)
+        key = (query, query_vars is None, named)
+        entry = self._entries.get(key)
+        ## the statement name is False for queries that can't be prepared
+        if entry is None:
+            entry = self._entries[key] = [0, None, None]
+            self._evict()
+        else:
+            self._entries.move_to_end(key)
+        entry[0] += 1
+
+        if entry[1] is None and entry[0] >= self.threshold and \
+                self._idle(cursor.connection):
+            if self._deallocate:
+                self._run_deallocate(cursor)
+            ## without vars, psycopg2 leaves the query untouched
+            prepare_query = query.replace('%', '%%') if query_vars is None \
+                            else query
+            name, execute_query = self._prepare(cursor, prepare_query, named)
+            entry[1] = name if name is not None else False
+            entry[2] = execute_query
+
+        if entry[1]:
+            self.stats['hits'] += 1
+            cursor.execute(entry[2], vars=query_vars)
+        else:
+            self.stats['misses'] += 1
+            cursor.execute(query, vars=query_vars)
+
+
+def get_statement_cache(conn, maxsize=DEFAULT_CACHE_SIZE,
+                            threshold=DEFAULT_THRESHOLD):
+    """Return the statement cache of a connection, creating it on first use.
+    Pooled connections keep their cache, and their prepared statements,
+    between checkouts.
+
+    Args:
+        conn (psycopg2 connection): Connection the statements are prepared
+            on.
+        maxsize (int, optional): Maximum number of queries tracked. Ignored
+            if the cache exists. Defaults to 100.
+        threshold (int, optional): Number of executions after which a query
+            is prepared. Ignored if the cache exists. Defaults to 5.
+
+    Returns:
+        cache (StatementCache): The connection's statement cache.
+    """
+    with _CACHES_LOCK:
+        cache = _CACHES.get(conn)
+        if cache is None:
+            cache = _CACHES[conn] = StatementCache(maxsize=maxsize,
+                                                   threshold=threshold)
+    return cache
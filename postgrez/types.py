@@ -0,0 +1,162 @@
+"""
+Types module, contains the PostgreSQL type OIDs postgrez knows how to
+convert natively, and decoders of their text representation.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+import re
+
+## type OIDs, from pg_type
+BOOL = 16
+BYTEA = 17
+CHAR = 18
+NAME = 19
+INT8 = 20
+INT2 = 21
+INT4 = 23
+TEXT = 25
+OID = 26
+JSON = 114
+FLOAT4 = 700
+FLOAT8 = 701
+BPCHAR = 1042
+VARCHAR = 1043
+DATE = 1082
+TIME = 1083
+TIMESTAMP = 1114
+TIMESTAMPTZ = 1184
+INTERVAL = 1186
+NUMERIC = 1700
+UUID = 2950
+JSONB = 3802
+
+## types whose binary and text representations are both plain text
+TEXT_TYPES = (CHAR, NAME, TEXT, BPCHAR, VARCHAR)
+
+## text representation of nulls used when decoding typed CSV exports
+TEXT_NULL = '\\N'
+
+## ISO timestamps, as output with the default DateStyle
+_TIMESTAMP = re.compile(r'(\d{4,})-(\d\d)-(\d\d)[ T](\d\d):(\d\d):(\d\d)'
+                        r'(?:\.(\d{1,6}))?(?:([+-])(\d\d)(?::?(\d\d))?'
+                        r'(?::?(\d\d))?)?$')
+
+
+def _decode_bool(value):
+    return value == 't'
+
+
+def _decode_bytea(value):
+    ## hex format, the default bytea_output
+    return bytes.fromhex(value[2:])
+
+
+def _decode_date(value):
+    if value == 'infinity':
+        return datetime.date.max
+    if value == '-infinity':
+        return datetime.date.min
+    if value.endswith(' BC') or len(value) > 10:
+        ## outside the range of python dates, keep the text
+        return value
+    return datetime.date(int(value[:-6]), int(value[-5:-3]),
+                         int(value[-2:]))
+
+
+def _decode_timestamp(value):
+    if value.endswith(' BC'):
+        return value
+    match = _TIMESTAMP.match(value)
+    if match is None:
+        if value in ('infinity', '-infinity'):
+            return (datetime.datetime.max if value == 'infinity'
+                    else datetime.datetime.min)
+        raise ValueError('Invalid timestamp %r' % value)
+    (year, month, day, hour, minute, second, fraction, sign, tz_hour,
+     tz_minute, tz_second) = match.groups()
+    if len(year) > 4:
+        return value
+    tzinfo = None
+    if sign is not None:
+        offset = datetime.timedelta(hours=int(tz_hour),
+                                    minutes=int(tz_minute or 0),
+                                    seconds=int(tz_second or 0))
+        tzinfo = datetime.timezone(-offset if sign == '-' else offset)
+    return datetime.datetime(int(year), int(month), int(day), int(hour),
+                             int(minute), int(second),
+                             int((fraction or '0').ljust(6, '0')), tzinfo)
+
+
+def _decode_time(value):
+    hour, minute, second = value.split(':')
+    second, _, fraction = second.partition('.')
+    return datetime.time(int(hour), int(minute), int(second),
+                         int(fraction.ljust(6, '0') or 0))
+
+
+## text decoders of the types with a native python equivalent
+TEXT_DECODERS = {
+    BOOL: _decode_bool,
+    INT2: int,
+    INT4: int,
+    INT8: int,
+    OID: int,
+    FLOAT4: float,
+    FLOAT8: float,
+    NUMERIC: decimal.Decimal,
+    BYTEA: _decode_bytea,
+    UUID: uuid.UUID,
+    DATE: _decode_date,
+    TIME: _decode_time,
+    TIMESTAMP: _decode_timestamp,
+    TIMESTAMPTZ: _decode_timestamp,
+    JSON: json.loads,
+    JSONB: json.loads,
+}
+
+
+def build_text_decoders(type_oids):
+    """Build one decoder per column, converting the text representation of a
+    non-null value into its native python type. Columns whose type has no
+    decoder (text, intervals, ...) are left as strings, and their decoder is
+    None.
+
+    Dates and timestamps must be output with the default ISO DateStyle.
+    Those outside the range of python dates, i.e. BC or after year 9999,
+    are left as strings.
+
+    Args:
+        type_oids (list): Type OID of each column.
+
+    Returns:
+        decoders (list): One callable or None per column.
+    """
+    return [TEXT_DECODERS.get(oid) for oid in type_oids]
+
+
+def decode_rows(rows, decoders, null=TEXT_NULL):
+    """Decode a batch of text rows column by column.
+
+    Args:
+        rows (list): List of rows, each a list of strings.
+        decoders (list): Decoders returned by build_text_decoders().
+        null (str, optional): Representation of nulls, decoded as None.
+            Defaults to '\\N'.
+
+    Returns:
+        rows (list): List of lists of decoded values.
+    """
+    if not rows:
+        return []
+    columns = []
+    for values, decode in zip(zip(*rows), decoders):
+        if decode is None:
+            columns.append([None if value == null else value
+                            for value in values])
+        else:
+            columns.append([None if value == null else decode(value)
+                            for value in values])
+    return [list(row) for row in zip(*columns)]
@@ -3,15 +3,59 @@ Utils module, contains utility functions used throughout the postgrez codebase.
 """
 
 import logging
-import sys
-import yaml
-import os
+import itertools
+import threading
+import hashlib
+import codecs
+import queue
+import gzip
+import bz2
+import lzma
 import io
+import os
 import re
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 log = logging.getLogger(__name__)
 
+## number of characters in query to display
+QUERY_LENGTH = 50
+
+## parsed config files, keyed by path: {path: ((mtime, size), data)}
+_CONFIG_CACHE = {}
+_CONFIG_LOCK = threading.Lock()
+
+## copy pipe defaults
+DEFAULT_CHUNK_SIZE = 262144
+DEFAULT_PIPE_CHUNKS = 8
+
+## compression codecs, keyed by file extension
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2',
+                          '.xz': 'xz', '.lzma': 'xz', '.zst': 'zstd',
+                          '.zstd': 'zstd'}
+
+## number of rows transposed at a time when building columns
+DEFAULT_BATCH_SIZE = 10000
+
+## number of DataFrame rows serialized at a time, and their null marker
+DEFAULT_FRAME_CHUNK_ROWS = 50000
+FRAME_NULL = '\\N'
+
 def read_yaml(yaml_file):
     """Read a yaml file.
 
@@ -23,6 +67,9 @@ def read_yaml(yaml_file):
         error occurs while reading.
     """
 
+    # imported lazily so processes that never parse yaml don't pay for it
+    import yaml
+
     data = None
     with open(yaml_file) as f:
         # use safe_load instead load
@@ -30,8 +77,62 @@ def read_yaml(yaml_file):
     return data
 
 
+def read_config(yaml_file):
+    """Read a yaml config file, returning the cached contents if the file's
+    modification time and size have not changed since it was last parsed.
+
+    Args:
+        yaml_file (str): Full path of the yaml file.
+
+    Returns:
+        data (dict): Dictionary of yaml_file contents. The cached dictionary is
+        shared between callers and should not be modified.
+
+    Raises:
+        OSError: If the file does not exist or cannot be read.
+    """
+    stat = os.stat(yaml_file)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _CONFIG_LOCK:
+        cached = _CONFIG_CACHE.get(yaml_file)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    log.debug('Parsing config file %s' % yaml_file)
+    data = read_yaml(yaml_file)
+    with _CONFIG_LOCK:
+        _CONFIG_CACHE[yaml_file] = (signature, data)
+    return data
+
+
+def clear_config_cache(yaml_file=None):
+    """Drop cached config files so they are re-parsed on next use.
+
+    Args:
+        yaml_file (str, optional): Full path of the file to drop. Defaults to
+            None, which drops every cached file.
+    """
+    with _CONFIG_LOCK:
+        if yaml_file is None:
+            _CONFIG_CACHE.clear()
+        else:
+            _CONFIG_CACHE.pop(yaml_file, None)
+
+
+def is_query(query):
+    """Check whether the supplied string is a select query or a table name.
+
+    Args:
+        query (str): A select query or a table name
+
+    Returns:
+        is_query (bool): True if query is a select query.
+    """
+    return re.match(r'\s*select', query, re.IGNORECASE) is not None
+
+
 def build_copy_query(mode, query, columns=None, delimiter=',', header=True,
-                        quote=None, null=None):
+                        quote=None, null=None, binary=False):
     """Build query used in the cursor.copy_expert() method. Refer to
     https://www.postgresql.org/docs/9.2/static/sql-copy.html for more
     information.
@@ -58,6 +159,9 @@ def build_copy_query(mode, query, columns=None, delimiter=',', header=True,
         null (str): Specifies the string that represents a null value.
             Defaults to None, which uses the postgres default of an
             unquoted empty string.
+        binary (boolean): Specify True to use PostgreSQL's binary COPY format
+            instead of CSV. delimiter, header, quote and null are ignored.
+            Defaults to False.
 
     Returns:
         copy_query (str): Formatted query to run in copy_expert()
@@ -76,7 +180,7 @@ def build_copy_query(mode, query, columns=None, delimiter=',', header=True,
         return
 
     ## check if provided query is a query, or just a table name
-    if re.match('\s*select', query, re.IGNORECASE):
+    if is_query(query):
         if columns:
             log.warning('If a query is passed in the query arg '
                         'instead of a tablename, columns must be '
@@ -84,13 +188,17 @@ def build_copy_query(mode, query, columns=None, delimiter=',', header=True,
             columns = None
         query = '(' + query + ')'
 
+    if binary:
+        return "COPY {0} {1} {2} WITH (FORMAT binary)".format(
+            query, (columns if columns else ''), copy_mode)
+
     copy_query = "COPY {0} {1} {2} WITH DELIMITER '{3}' " \
                     " CSV {4} {5} {6}"
 
     copy_query = copy_query.format(
         query,
-        copy_mode,
         (columns if columns else ''),
+        copy_mode,
         delimiter,
         ('HEADER' if header else ''),
         ('QUOTE ' + "'{}'".format(quote) if quote else ''),
@@ -99,57 +207,785 @@ def build_copy_query(mode, query, columns=None, delimiter=',', header=True,
     return copy_query
 
 
-class IteratorFile(io.TextIOBase):
+def infer_compression(filename, compression='infer'):
+    """Resolve the compression codec of a file.
+
+    Args:
+        filename (str): name of the file
+        compression (str, optional): 'gzip', 'bz2', 'xz', 'zstd', None for
+            uncompressed files or 'infer' to detect the codec from the file
+            extension. Defaults to 'infer'.
+
+    Returns:
+        compression (str): Name of the codec, None if the file is not
+        compressed.
+
+    Raises:
+        ValueError: If the codec is unknown.
+    """
+    if compression == 'infer':
+        ext = os.path.splitext(filename)[1].lower()
+        return COMPRESSION_EXTENSIONS.get(ext)
+    if compression is not None and \
+            compression not in COMPRESSION_EXTENSIONS.values():
+        raise ValueError("Unknown compression %s, must be one of 'gzip', "
+                         "'bz2', 'xz', 'zstd' or None" % compression)
+    return compression
+
+
+class _ZstdFile(object):
+    """Binary file-like object around a zstandard stream reader or writer
+    which also closes the underlying file.
+    """
+
+    def __init__(self, stream, fileobj):
+        self._stream = stream
+        self._fileobj = fileobj
+        self.read = getattr(stream, 'read', None)
+        self.write = getattr(stream, 'write', None)
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        self.close()
+
+
+def open_compressed(filename, mode='rb', compression='infer', level=None):
+    """Open a file in binary mode, streaming it through a compression codec.
+
+    Args:
+        filename (str): name of the file
+        mode (str, optional): 'rb' to read or 'wb' to write. Defaults to 'rb'.
+        compression (str, optional): See infer_compression(). Defaults to
+            'infer'.
+        level (int, optional): Compression level used when writing. Defaults
+            to None, the codec's default level.
+
+    Returns:
+        f (file): Binary file-like object. Data read from it is decompressed
+        and data written to it is compressed.
+
+    Raises:
+        ValueError: If the codec is unknown or the zstandard package, required
+            for zstd, is not installed.
+    """
+    compression = infer_compression(filename, compression)
+    writing = 'w' in mode
+    if compression is None:
+        return open(filename, mode)
+    if compression == 'gzip':
+        return gzip.open(filename, mode, **({'compresslevel': level}
+                         if writing and level is not None else {}))
+    if compression == 'bz2':
+        return bz2.open(filename, mode, **({'compresslevel': level}
+                        if writing and level is not None else {}))
+    if compression == 'xz':
+        return lzma.open(filename, mode, **({'preset': level}
+                         if writing and level is not None else {}))
+
+    if zstandard is None:
+        raise ValueError('The zstandard package is required for zstd '
+                         'compression')
+    fileobj = open(filename, mode)
+    if writing:
+        compressor = zstandard.ZstdCompressor(**({'level': level}
+                                              if level is not None else {}))
+        stream = compressor.stream_writer(fileobj, closefd=False)
+    else:
+        stream = zstandard.ZstdDecompressor().stream_reader(fileobj,
+                                                            closefd=False)
+    return _ZstdFile(stream, fileobj)
+
+
+class BlockWriter(object):
+    """Write-only file-like object which coalesces small writes, such as the
+    one-row-at-a-time writes of cursor.copy_expert(), into blocks before
+    passing them to the underlying binary file.
+    """
+
+    def __init__(self, f, block_size=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            f (file): File opened in binary mode.
+            block_size (int, optional): Number of bytes buffered before they
+                are written to f.
+        """
+        self._f = f
+        self._block_size = block_size
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._block_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._f.write(self._buffer)
+            self._buffer = bytearray()
+
+    def close(self):
+        """Flush the buffered data and close the underlying file.
+        """
+        try:
+            self.flush()
+        finally:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        self.close()
+
+
+class ChunkFile(object):
+    """Read-only binary file-like object over an iterable of byte chunks,
+    which can be passed to cursor.copy_from() or cursor.copy_expert() as the
+    input file of a COPY ... FROM STDIN query.
+
+    Chunks are never joined or re-copied: a read() of at least a whole chunk
+    returns the chunk itself, smaller reads, readinto() and readline() slice
+    the current chunk through a memoryview.
+    """
+
+    def __init__(self, chunks):
+        """
+        Args:
+            chunks (iterable): Iterable yielding bytes.
+        """
+        self._chunks = iter(chunks)
+        self._chunk = b''
+        self._view = memoryview(self._chunk)
+        self._pos = 0
+
+    def _advance(self):
+        """Move on to the next non-empty chunk if the current one is consumed.
+
+        Returns:
+            available (bool): False once every chunk has been consumed.
+        """
+        if self._pos < len(self._chunk):
+            return True
+        for chunk in self._chunks:
+            if chunk:
+                self._chunk = chunk
+                self._view = memoryview(chunk)
+                self._pos = 0
+                return True
+        self._chunk = b''
+        self._view = memoryview(self._chunk)
+        self._pos = 0
+        return False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        """Read up to size bytes. Like a raw file, fewer than size bytes may be
+        returned.
+
+        Args:
+            size (int, optional): Maximum number of bytes to read. Defaults to
+                -1, which reads all remaining chunks.
+
+        Returns:
+            data (bytes): Data read, empty once the chunks are exhausted.
+        """
+        if size is None or size < 0:
+            parts = []
+            while self._advance():
+                parts.append(self.read(len(self._chunk)))
+            return b''.join(parts)
+        if not self._advance():
+            return b''
+        if self._pos == 0 and size >= len(self._chunk):
+            data = self._chunk
+        else:
+            data = self._view[self._pos:self._pos + size].tobytes()
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b):
+        """Read bytes into a pre-allocated, writable bytes-like object.
+
+        Args:
+            b (bytearray or memoryview): Buffer to read into.
+
+        Returns:
+            n (int): Number of bytes read, 0 once the chunks are exhausted.
+        """
+        if not self._advance():
+            return 0
+        target = memoryview(b).cast('B')
+        n = min(len(target), len(self._chunk) - self._pos)
+        target[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def readline(self, size=-1):
+        """Read up to and including the next newline.
+
+        Args:
+            size (int, optional): Maximum number of bytes to read. Defaults to
+                -1, i.e. no limit.
+
+        Returns:
+            line (bytes): Line read, empty once the chunks are exhausted.
+        """
+        parts = []
+        while self._advance():
+            end = self._chunk.find(b'\n', self._pos)
+            end = len(self._chunk) if end < 0 else end + 1
+            if size is not None and size >= 0:
+                end = min(end, self._pos + size)
+                size -= end - self._pos
+            parts.append(self._view[self._pos:end].tobytes())
+            self._pos = end
+            if parts[-1].endswith(b'\n') or size == 0:
+                break
+        return b''.join(parts)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class IteratorFile(ChunkFile):
     """Given an iterator which yields strings, return a file like object for
-        reading those strings. Taken from:
+        reading those strings. Rows are newline terminated, joined into
+        chunks of roughly `chunk_size` characters and encoded once per chunk,
+        so the iterator is consumed lazily as the file is read. Based on:
         https://gist.github.com/jsheedy/ed81cdf18190183b3b7d
-
-        Attributes:
-            _it: Iterator of a data object.
-            _f: File-like object
     """
 
-    def __init__(self, it):
+    def __init__(self, it, encoding='utf-8', chunk_size=DEFAULT_CHUNK_SIZE):
         """
         Args:
             it (generator): Iterator of a data object. When next(it) is
                 called, yields a string like 'val1|val2|val3'
+            encoding (str, optional): Python codec the rows are encoded with,
+                which should match the connection's client encoding. Defaults
+                to 'utf-8'.
+            chunk_size (int, optional): Approximate number of characters per
+                chunk. Defaults to 262144.
         """
-        self._it = it
-        self._f = io.StringIO()
+        super(IteratorFile, self).__init__(
+            self._iter_chunks(it, encoding, chunk_size))
+
+    @staticmethod
+    def _iter_chunks(it, encoding, chunk_size):
+        rows = []
+        size = 0
+        for row in it:
+            if not isinstance(row, str):
+                row = row.decode(encoding)
+            rows.append(row)
+            size += len(row) + 1
+            if size >= chunk_size:
+                rows.append('')
+                yield '\n'.join(rows).encode(encoding)
+                rows = []
+                size = 0
+        if rows:
+            rows.append('')
+            yield '\n'.join(rows).encode(encoding)
 
-    def read(self, length=sys.maxsize):
-        """Read file-like object.
 
+class RangeFile(object):
+    """Read-only file-like object limited to a byte range of an open binary
+    file, which can be passed to cursor.copy_expert() to load part of a file.
+    """
+
+    def __init__(self, f, start, end):
+        """
         Args:
-            length (integer): maximum file length to read to
+            f (file): File opened in binary mode.
+            start (int): Offset of the first byte of the range.
+            end (int): Offset one past the last byte of the range.
+        """
+        self._f = f
+        self._f.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        """Read up to size bytes without reading past the end of the range.
+
+        Args:
+            size (int, optional): Maximum number of bytes to read. Defaults to
+                -1, which reads the rest of the range.
+
         Returns:
-            data (str): string representation of file
+            data (bytes): Data read, empty at the end of the range.
+        """
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+def split_file(filename, parts, header=True, quote='"', quoted_newlines=True,
+                block_size=DEFAULT_CHUNK_SIZE * 4):
+    """Split a delimited file into byte ranges that start and end on row
+    boundaries, so each range can be loaded independently.
+
+    Args:
+        filename (str): name of the file
+        parts (int): Number of ranges to split the file into. Fewer ranges are
+            returned if the file has too few rows.
+        header (boolean): Specify True if the first row of the file contains
+            the column names, which is excluded from the ranges. Defaults to
+            True.
+        quote (str): Quoting character of the file. Defaults to '"'.
+        quoted_newlines (bool): Specify True if quoted values may contain
+            newlines. The file is then scanned from the start, tracking
+            whether each newline falls inside quotes. If False, boundaries are
+            found by seeking, which is much faster. Defaults to True.
+        block_size (int, optional): Size in bytes of the blocks scanned.
+
+    Returns:
+        ranges (list): List of (start, end) byte offsets.
+    """
+    size = os.path.getsize(filename)
+    quote = (quote or '"').encode('ascii')
+    with open(filename, 'rb') as f:
+        if header:
+            ## the header row is assumed not to contain quoted newlines
+            f.readline()
+        data_start = f.tell()
+        targets = [data_start + (size - data_start) * i // parts
+                   for i in range(1, parts)]
+        boundaries = [data_start]
+
+        if not quoted_newlines:
+            for target in targets:
+                if target <= boundaries[-1]:
+                    continue
+                f.seek(target - 1)
+                f.readline()
+                boundaries.append(min(f.tell(), size))
+        else:
+            in_quote = False
+            pos = data_start
+            targets.reverse()
+            while targets:
+                block = f.read(block_size)
+                if not block:
+                    break
+                block_end = pos + len(block)
+                cursor = 0
+                while targets and targets[-1] < block_end:
+                    ## count quotes up to the target, then look for the first
+                    ## newline outside quotes
+                    target = max(targets[-1], pos + cursor) - pos
+                    in_quote ^= block.count(quote, cursor, target) % 2 == 1
+                    cursor = target
+                    newline = block.find(b'\n', cursor)
+                    while newline >= 0:
+                        in_quote ^= block.count(quote, cursor, newline) % 2 == 1
+                        cursor = newline + 1
+                        if not in_quote:
+                            break
+                        newline = block.find(b'\n', cursor)
+                    if newline < 0:
+                        break
+                    boundary = pos + cursor
+                    while targets and targets[-1] < boundary:
+                        targets.pop()
+                    boundaries.append(boundary)
+                in_quote ^= block.count(quote, cursor) % 2 == 1
+                pos = block_end
+
+    boundaries = sorted(set(b for b in boundaries if b < size)) + [size]
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:])
+            if end > start]
+
+
+def iter_row_blocks(f, chunk_size, quote='"', quoted_newlines=True,
+                        block_size=DEFAULT_CHUNK_SIZE):
+    """Read a delimited file in blocks and split the stream into chunks of at
+    least chunk_size bytes which end on row boundaries. Every block is
+    yielded with a flag telling whether it ends a chunk, so a chunk can be
+    streamed without holding it in memory.
+
+    Args:
+        f (file): File opened in binary mode, positioned at a row boundary.
+        chunk_size (int): Minimum size in bytes of a chunk.
+        quote (str): Quoting character of the file. Defaults to '"'.
+        quoted_newlines (bool): Specify True if quoted values may contain
+            newlines, which are then not treated as row boundaries. Defaults
+            to True.
+        block_size (int, optional): Size in bytes of the blocks read.
+
+    Yields:
+        block (bytes): Next block of the file.
+        last (bool): True if the block ends a chunk.
+    """
+    quote = (quote or '"').encode('ascii')
+    in_quote = False
+    size = 0
+    while True:
+        block = f.read(block_size)
+        if not block:
+            if size:
+                yield b'', True
+            return
+        cursor = 0
+        while cursor < len(block):
+            ## look for the first newline outside quotes once the chunk is
+            ## large enough
+            target = cursor + max(chunk_size - size - 1, 0)
+            newline = -1
+            if target < len(block) and quoted_newlines:
+                in_quote ^= block.count(quote, cursor, target) % 2 == 1
+                scanned = target
+                newline = block.find(b'\n', scanned)
+                while newline >= 0:
+                    in_quote ^= block.count(quote, scanned, newline) % 2 == 1
+                    scanned = newline + 1
+                    if not in_quote:
+                        break
+                    newline = block.find(b'\n', scanned)
+                if newline < 0:
+                    in_quote ^= block.count(quote, scanned) % 2 == 1
+            elif target < len(block):
+                newline = block.find(b'\n', target)
+            elif quoted_newlines:
+                in_quote ^= block.count(quote, cursor) % 2 == 1
+            if newline < 0:
+                yield block[cursor:], False
+                size += len(block) - cursor
+                break
+            yield block[cursor:newline + 1], True
+            size = 0
+            cursor = newline + 1
+
+
+def file_fingerprint(filename, sample_size=1048576):
+    """Fingerprint a file from its size and a hash of its first and last
+    sample_size bytes, to detect that a file has changed without reading it
+    whole.
+
+    Args:
+        filename (str): name of the file
+        sample_size (int, optional): Number of bytes hashed at each end of
+            the file. Defaults to 1048576.
+
+    Returns:
+        fingerprint (str): '<size>:<sha1 hex digest>'.
+    """
+    size = os.path.getsize(filename)
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            digest.update(f.read())
+    return '%s:%s' % (size, digest.hexdigest())
+
+
+def split_range(low, high, parts):
+    """Split the integer range [low, high] into contiguous slices of roughly
+    equal width.
+
+    Args:
+        low (int): Lowest value of the range.
+        high (int): Highest value of the range.
+        parts (int): Number of slices. Fewer slices are returned if the range
+            has fewer than parts values.
+
+    Returns:
+        bounds (list): List of (start, stop) tuples, where start is inclusive
+        and stop is exclusive.
+    """
+    parts = max(min(parts, high - low + 1), 1)
+    edges = [low + (high - low + 1) * i // parts for i in range(parts + 1)]
+    return list(zip(edges, edges[1:]))
+
+
+class CopyPipe(ChunkFile):
+    """Bounded in-memory pipe between a thread running a COPY ... TO STDOUT
+    query and a consumer. psycopg2 writes one row at a time, so writes are
+    coalesced into chunks of roughly `chunk_size` bytes, and at most
+    `maxsize` chunks are buffered before the writer blocks.
+
+    The writer side is passed to cursor.copy_expert() as the output file, the
+    reader side is consumed with chunks() or, as a ChunkFile, with read().
+
+        Attributes:
+            chunk_size (int): Size in bytes of the chunks handed to the reader.
+    """
+
+    _EOF = object()
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE,
+                    maxsize=DEFAULT_PIPE_CHUNKS):
+        """
+        Args:
+            chunk_size (int, optional): Size in bytes of the chunks handed to
+                the reader. Defaults to 262144.
+            maxsize (int, optional): Maximum number of chunks buffered before
+                the writer blocks. Defaults to 8.
+        """
+        self.chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize)
+        self._parts = []
+        self._size = 0
+        self._error = None
+        self._aborted = threading.Event()
+        self._eof = False
+        super(CopyPipe, self).__init__(self.chunks())
+
+    def _put(self, item):
+        """Put an item on the queue, giving up if the reader aborts.
+        """
+        while True:
+            if self._aborted.is_set():
+                raise IOError('Copy pipe was closed by the reader')
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _flush(self):
+        if self._parts:
+            chunk = b''.join(self._parts)
+            self._parts = []
+            self._size = 0
+            self._put(chunk)
+
+    def write(self, data):
+        """Write data to the pipe. Called by cursor.copy_expert().
+
+        Args:
+            data (bytes): Data to write.
+
+        Raises:
+            IOError: If the reader has aborted.
+        """
+        if self._aborted.is_set():
+            raise IOError('Copy pipe was closed by the reader')
+        self._parts.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk_size:
+            self._flush()
+        return len(data)
+
+    def close(self, error=None):
+        """Signal the reader that no more data will be written.
+
+        Args:
+            error (Exception, optional): Error raised by the writer, re-raised
+                in the reader once the buffered data is consumed.
         """
+        self._error = error
         try:
-            while self._f.tell() < length:
-                row = next(self._it)
-                if isinstance(row, str):
-                    self._f.write(row + u"\n")
-                else:
-                    self._f.write(
-                        unicode(row, 'utf-8').encode('utf-8') + u"\n")
-
-        except StopIteration as e:
-            # soak up StopIteration. this block is not necessary because
-            # of finally, but just to be explicit
+            self._flush()
+            self._put(self._EOF)
+        except IOError:
             pass
 
-        except Exception as e:
-            log.error("Error reading file-like object: %s" % e)
+    def abort(self):
+        """Stop reading. Any blocked or subsequent write raises an IOError.
+        """
+        self._aborted.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
 
-        finally:
-            self._f.seek(0)
-            data = self._f.read(length)
-
-            # save the remainder for next read
-            remainder = self._f.read()
-            self._f.seek(0)
-            self._f.truncate(0)
-            self._f.write(remainder)
-            return data
+    def chunks(self):
+        """Yield chunks written to the pipe until the writer closes it.
+
+        Yields:
+            chunk (bytes): Chunk of roughly chunk_size bytes.
+
+        Raises:
+            Exception: The error the writer closed the pipe with, if any.
+        """
+        while not self._eof:
+            chunk = self._queue.get()
+            if chunk is self._EOF:
+                self._eof = True
+                if self._error is not None:
+                    raise self._error
+                return
+            yield chunk
+
+
+def iter_lines(chunks, encoding='utf-8'):
+    """Decode an iterable of byte chunks and split it into lines, keeping the
+    line endings. Lines spanning chunk boundaries are joined.
+
+    Args:
+        chunks (iterable): Iterable of bytes.
+        encoding (str, optional): Python codec used to decode the chunks.
+            Defaults to 'utf-8'.
+
+    Yields:
+        line (str): Line including its trailing newline, if any.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    partial = ''
+    for chunk in chunks:
+        lines = (partial + decoder.decode(chunk)).split('\n')
+        partial = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    partial += decoder.decode(b'', final=True)
+    if partial:
+        yield partial
+
+
+def iter_batches(iterable, batch_size):
+    """Split an iterable into lists of up to batch_size items.
+
+    Args:
+        iterable (iterable): Iterable to split.
+        batch_size (int): Maximum number of items per list.
+
+    Yields:
+        batch (list): List of up to batch_size items.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_sized(iterator, counts, max_items=None, max_size=None, overhead=0):
+    """Yield items from a shared iterator until max_items items or max_size
+    total size have been yielded, without pulling any item past the limit.
+    Used to split one stream into consecutive batches.
+
+    Args:
+        iterator (iterator): Iterator to consume. Items must support len().
+        counts (dict): Dict updated in place with the number of 'items' and
+            the total 'size' yielded.
+        max_items (int, optional): Maximum number of items. Defaults to None.
+        max_size (int, optional): Stop once the total size reaches max_size.
+            Defaults to None.
+        overhead (int, optional): Size added per item, e.g. 1 for a newline.
+            Defaults to 0.
+
+    Yields:
+        item: Next item of the iterator.
+    """
+    counts.setdefault('items', 0)
+    counts.setdefault('size', 0)
+    if max_items is not None and counts['items'] >= max_items:
+        return
+    for item in iterator:
+        counts['items'] += 1
+        counts['size'] += len(item) + overhead
+        yield item
+        if ((max_items is not None and counts['items'] >= max_items) or
+                (max_size is not None and counts['size'] >= max_size)):
+            return
+
+
+def build_columns(cols, batches, use_numpy=None):
+    """Transpose batches of rows into a dict of column name -> column values.
+    Only one batch of rows is held in memory at a time.
+
+    Args:
+        cols (list): Column names, in the order of the values in each row.
+        batches (iterable): Iterable of lists of rows.
+        use_numpy (bool, optional): Return NumPy arrays instead of lists.
+            Defaults to None, which uses NumPy if it is installed. Columns
+            of numbers become typed arrays, other columns (strings, arrays,
+            json, ...) object arrays holding the values as is.
+
+    Returns:
+        data (dict): Dict in the format {col1: [val1, ...], ...}.
+    """
+    values = [[] for _ in cols]
+    for batch in batches:
+        for column, batch_values in zip(values, zip(*batch)):
+            column.extend(batch_values)
+
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy:
+        values = [_to_array(column) for column in values]
+    return dict(zip(cols, values))
+
+
+def _to_array(column):
+    """Convert a list of column values into a NumPy array. Only numbers are
+    converted to a typed array: numpy.array() would turn lists of equal
+    length into a 2-D array, and fail on ragged ones.
+    """
+    first = next((value for value in column if value is not None), None)
+    if isinstance(first, (int, float)):
+        try:
+            return numpy.array(column)
+        except ValueError:
+            pass
+    array = numpy.empty(len(column), dtype=object)
+    for i, value in enumerate(column):
+        array[i] = value
+    return array
+
+
+def to_frame(data):
+    """Convert a NumPy array, a dict of columns or a pandas Series into a
+    pandas DataFrame. DataFrames are returned as is.
+
+    Args:
+        data (DataFrame, Series, ndarray or dict): Data to convert. Structured
+            arrays keep their field names as column names.
+
+    Returns:
+        frame (pandas.DataFrame): The data as a DataFrame.
+
+    Raises:
+        ImportError: If pandas is not installed.
+    """
+    if pandas is None:
+        raise ImportError('pandas is required to load DataFrames and arrays')
+    if isinstance(data, pandas.DataFrame):
+        return data
+    if isinstance(data, pandas.Series):
+        return data.to_frame()
+    return pandas.DataFrame(data)
+
+
+def iter_frame_chunks(frame, chunk_rows=DEFAULT_FRAME_CHUNK_ROWS,
+                        encoding='utf-8', null=FRAME_NULL):
+    """Serialize a DataFrame into CSV, chunk_rows rows at a time. Every chunk
+    is written by DataFrame.to_csv(), which formats whole columns at once,
+    and missing values (NaN, NaT, None, pandas.NA) are written as `null`.
+
+    Args:
+        frame (pandas.DataFrame): Data to serialize.
+        chunk_rows (int, optional): Number of rows per chunk. Defaults to
+            50000.
+        encoding (str, optional): Python codec the chunks are encoded with.
+            Defaults to 'utf-8'.
+        null (str, optional): Representation of missing values. Defaults to
+            '\\N'.
+
+    Yields:
+        chunk (bytes): CSV rows without a header, newline terminated.
+    """
+    for start in range(0, len(frame), chunk_rows):
+        buf = io.StringIO()
+        frame.iloc[start:start + chunk_rows].to_csv(
+            buf, header=False, index=False, na_rep=null, lineterminator='\n')
+        yield buf.getvalue().encode(encoding)
@@ -2,7 +2,10 @@
 Wrapper module which contains wrapper functions for common psycopg2 routines.
 """
 from .postgrez import Connection, Cmd, QUERY_LENGTH, \
-    DEFAULT_PORT, DEFAULT_SETUP, DEFAULT_SETUP_PATH
+    DEFAULT_PORT, DEFAULT_SETUP, DEFAULT_SETUP_PATH, DEFAULT_ITERSIZE, \
+    DEFAULT_PAGE_SIZE
+from .utils import build_columns, DEFAULT_BATCH_SIZE
+from .cache import get_cache, extract_tables, freeze, is_cacheable, MISSING
 from .exceptions import PostgrezExecuteError
 import psycopg2
 import logging
@@ -11,7 +14,9 @@ log = logging.getLogger(__name__)
 
 def execute(query, query_vars=None, columns=True, host=None, database=None,
                 user=None, password=None, port=DEFAULT_PORT,
-                setup=DEFAULT_SETUP, setup_path=DEFAULT_SETUP_PATH):
+                setup=DEFAULT_SETUP, setup_path=DEFAULT_SETUP_PATH,
+                pool=False, stream=False, itersize=DEFAULT_ITERSIZE,
+                columnar=False, cache=False, cache_tags=None):
     """A wrapper function around Cmd.execute() that returns formatted
     results.
 
@@ -30,20 +35,72 @@ def execute(query, query_vars=None, columns=True, host=None, database=None,
             ~/.postgrez which specifies the default configuration to use.
         setup_path (str, optional): Path to the .postgrez configuration
             file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (bool or ConnectionPool, optional): Borrow a connection from a
+            pool instead of connecting. If True, the process-wide pool for the
+            resolved connection parameters is used. Defaults to False.
+        stream (bool): Return a generator which fetches the results lazily
+            with a server-side cursor, see iter_execute(). Only select
+            queries can be streamed. Defaults to False.
+        itersize (int): Number of rows fetched per round trip when streaming.
+            Defaults to 2000.
+        columnar (bool): Return a dict of column name -> column values
+            instead of one record per row, see utils.build_columns().
+            Defaults to False.
+        cache (bool or ResultCache): Serve the results of select queries from
+            a result cache, running the query only on a miss. Queries locking
+            rows or calling nextval() or advisory lock functions always run,
+            other selects must be free of side effects. If True, the
+            process-wide cache is used (see cache.get_cache()). Results are
+            keyed by connection parameters, query, query_vars, columns and
+            columnar, and are shared between callers. Defaults to False.
+        cache_tags (list, optional): Tables the results are invalidated by,
+            see ResultCache.invalidate(). Defaults to None, which uses the
+            tables in the query's FROM and JOIN clauses.
 
     Returns:
         results (list): Results from query.
         Returns None if no resultset was generated (i.e. insert into
-        query, update query etc..).
+        query, update query etc..). If stream is True, a generator of results
+        is returned instead. If columnar is True, a dict in the format
+        {col1: [val1, ...], col2: [val2, ...], ...} is returned.
 
     Raises:
         PostgrezExecuteError: If any error occurs reading of resultset.
     """
+    if stream:
+        return iter_execute(query, query_vars=query_vars, columns=columns,
+                            itersize=itersize, host=host, database=database,
+                            user=user, password=password, port=port,
+                            setup=setup, setup_path=setup_path, pool=pool)
+
+    if cache and is_cacheable(query):
+        result_cache = get_cache() if cache is True else cache
+        key = ('execute', host, port, database, user, setup, setup_path,
+               query, freeze(query_vars), bool(columns), bool(columnar))
+        results = result_cache.get(key)
+        if results is MISSING:
+            results = execute(query, query_vars=query_vars, columns=columns,
+                              host=host, database=database, user=user,
+                              password=password, port=port, setup=setup,
+                              setup_path=setup_path, pool=pool,
+                              columnar=columnar)
+            result_cache.set(key, results, tags=(cache_tags or
+                                                 extract_tables(query)))
+        return results
+
     results = None
 
     with Cmd(host=host, database=database, user=user, password=password,
-                setup=setup, setup_path=setup_path) as c:
+                port=port, setup=setup, setup_path=setup_path,
+                pool=pool) as c:
         c.execute(query, query_vars)
+        if columnar:
+            if c.cursor.description is None:
+                return None
+            cols = [desc[0] for desc in c.cursor.description]
+            batches = iter(lambda: c.cursor.fetchmany(DEFAULT_BATCH_SIZE), [])
+            return build_columns(cols, batches)
+
         # no way to check if results were returned other than try-except
         try:
             results = c.cursor.fetchall()
@@ -62,10 +119,113 @@ def execute(query, query_vars=None, columns=True, host=None, database=None,
     return results
 
 
+def execute_batch(query, rows, page_size=DEFAULT_PAGE_SIZE, template=None,
+                    method='auto', returning=False, columns=True,
+                    page_commit=False, host=None, database=None, user=None,
+                    password=None, port=DEFAULT_PORT, setup=DEFAULT_SETUP,
+                    setup_path=DEFAULT_SETUP_PATH, pool=False):
+    """A wrapper function around Cmd.execute_batch(). The pages are committed
+    once all of them have been executed, or after every page if page_commit
+    is True.
+
+    Args:
+        query (str): Query to be executed, see Cmd.execute_batch().
+        rows (iterable): Parameter sets, such as a list of tuples.
+        page_size (int): Number of parameter sets per round trip. Defaults to
+            1000.
+        template (str, optional): Template of a single row for the 'values'
+            method. Defaults to None.
+        method (str): 'values', 'batch' or 'auto'. Defaults to 'auto'.
+        returning (bool): Return the rows produced by a RETURNING clause.
+            Defaults to False.
+        columns (bool): If returning is True, return dicts keyed by column
+            name. Defaults to True.
+        page_commit (bool): Commit after every page. Defaults to False.
+        host (str, optional): Database host url. Defaults to None.
+        database (str, optional): Database name. Defaults to None.
+        user (str, optional): Username. Defaults to None.
+        password (str, optional): Password. Defaults to None.
+        setup (str, optional): Name of the db setup to use in ~/.postgrez.
+            If no setup is provided, looks for the 'default' key in
+            ~/.postgrez which specifies the default configuration to use.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (bool or ConnectionPool, optional): Borrow a connection from a
+            pool instead of connecting. If True, the process-wide pool for the
+            resolved connection parameters is used. Defaults to False.
+
+    Returns:
+        results (list or dict): If returning is True, the rows returned by the
+        query. Otherwise, the summary returned by Cmd.execute_batch().
+
+    Raises:
+        PostgrezExecuteError: If an error occurs executing a page.
+    """
+    with Cmd(host=host, database=database, user=user, password=password,
+                port=port, setup=setup, setup_path=setup_path,
+                pool=pool) as c:
+        summary = c.execute_batch(query, rows, page_size=page_size,
+                                  template=template, method=method,
+                                  returning=returning, page_commit=page_commit)
+        if not returning:
+            return summary
+        results = summary['results']
+        if columns and results:
+            cols = [desc[0] for desc in c.cursor.description]
+            results = [{cols[i]:value for i, value in enumerate(row)}
+                    for row in results]
+    return results
+
+
+def iter_execute(query, query_vars=None, columns=True,
+                    itersize=DEFAULT_ITERSIZE, batch_size=None, host=None,
+                    database=None, user=None, password=None,
+                    port=DEFAULT_PORT, setup=DEFAULT_SETUP,
+                    setup_path=DEFAULT_SETUP_PATH, pool=False):
+    """A wrapper function around Cmd.iter_execute(). Results are fetched
+    lazily with a server-side cursor, the connection is closed once the
+    generator is exhausted or closed.
+
+    Args:
+        query (str): Select query to be executed. Query can contain
+            placeholders, as long as query_vars are supplied.
+        query_vars (tuple, list or dict): Variables to be executed with query.
+            See http://initd.org/psycopg/docs/usage.html#query-parameters.
+        columns (bool): Yield dicts keyed by column name. Defaults to True.
+        itersize (int): Number of rows fetched per round trip. Defaults to
+            2000.
+        batch_size (int, optional): Yield lists of up to batch_size rows
+            instead of single rows. Defaults to None.
+        host (str, optional): Database host url. Defaults to None.
+        database (str, optional): Database name. Defaults to None.
+        user (str, optional): Username. Defaults to None.
+        password (str, optional): Password. Defaults to None.
+        setup (str, optional): Name of the db setup to use in ~/.postgrez.
+            If no setup is provided, looks for the 'default' key in
+            ~/.postgrez which specifies the default configuration to use.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (bool or ConnectionPool, optional): Borrow a connection from a
+            pool instead of connecting. If True, the process-wide pool for the
+            resolved connection parameters is used. Defaults to False.
+
+    Yields:
+        row (tuple or dict): See Cmd.iter_execute().
+    """
+    with Cmd(host=host, database=database, user=user, password=password,
+                port=port, setup=setup, setup_path=setup_path,
+                pool=pool) as c:
+        for row in c.iter_execute(query, query_vars=query_vars,
+                                  columns=columns, itersize=itersize,
+                                  batch_size=batch_size):
+            yield row
+
+
 def load(table_name, filename=None, data=None, delimiter=',',
             columns=None, quote=None, null=None, header=True, host=None,
             database=None, user=None, password=None, port=DEFAULT_PORT,
-            setup=DEFAULT_SETUP, setup_path=DEFAULT_SETUP_PATH):
+            setup=DEFAULT_SETUP, setup_path=DEFAULT_SETUP_PATH,
+            pool=False, compression='infer'):
     """A wrapper function around Load.load_from methods. If a filename is
     provided, the records will loaded from that file. Otherwise, records
     will be loaded from the supplied data arg.
@@ -100,6 +260,11 @@ def load(table_name, filename=None, data=None, delimiter=',',
             ~/.postgrez which specifies the default configuration to use.
         setup_path (str, optional): Path to the .postgrez configuration
             file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (bool or ConnectionPool, optional): Borrow a connection from a
+            pool instead of connecting. If True, the process-wide pool for the
+            resolved connection parameters is used. Defaults to False.
+        compression (str): If a filename is provided, the codec it is
+            compressed with. See Cmd.load_from_file(). Defaults to 'infer'.
 
     """
     if data is None and filename is None:
@@ -107,18 +272,20 @@ def load(table_name, filename=None, data=None, delimiter=',',
         return
 
     with Cmd(host=host, database=database, user=user, password=password,
-                setup=setup, setup_path=setup_path) as l:
+                port=port, setup=setup, setup_path=setup_path,
+                pool=pool) as l:
         if filename:
             l.load_from_file(table_name, filename, delimiter=delimiter,
                                 columns=columns, null=null, quote=quote,
-                                header=header)
+                                header=header, compression=compression)
         else:
             l.load_from_object(table_name, data, columns=columns, null=null)
 
 def export(query, filename=None, columns=None, delimiter=',',
             header=True, null=None, host=None, database=None, user=None,
             password=None, port=DEFAULT_PORT, setup=DEFAULT_SETUP,
-            setup_path=DEFAULT_SETUP_PATH):
+            setup_path=DEFAULT_SETUP_PATH, pool=False, columnar=False,
+            format='csv', compression='infer', typed=False):
     """A wrapper function around Export.export_to methods. If a filename is
     provided, the records will be written to that file. Otherwise, records
     will be returned.
@@ -146,6 +313,23 @@ def export(query, filename=None, columns=None, delimiter=',',
             ~/.postgrez which specifies the default configuration to use.
         setup_path (str, optional): Path to the .postgrez configuration
             file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (bool or ConnectionPool, optional): Borrow a connection from a
+            pool instead of connecting. If True, the process-wide pool for the
+            resolved connection parameters is used. Defaults to False.
+        columnar (bool): If no filename is provided, return a dict of column
+            name -> column values instead of one record per row. Defaults to
+            False.
+        format (str): If no filename is provided, 'binary' exports in
+            PostgreSQL's binary COPY format and returns native python values
+            instead of strings, and 'arrow' returns a pyarrow.Table. If a
+            filename is provided, 'parquet' writes a Parquet file, see
+            Cmd.export_to_parquet(). Defaults to 'csv'.
+        compression (str): If a filename is provided, the codec used to
+            compress it. See Cmd.export_to_file(). Defaults to 'infer', which
+            uses snappy for Parquet files.
+        typed (bool): If no filename is provided, decode csv values into
+            their native python types. See Cmd.export_to_object(). Defaults
+            to False.
 
     Returns:
         data (list): If noe filename is provided, records will be returned.
@@ -155,11 +339,112 @@ def export(query, filename=None, columns=None, delimiter=',',
     """
     data = None
     with Cmd(host=host, database=database, user=user, password=password,
-                setup=setup, setup_path=setup_path) as e:
-        if filename:
+                port=port, setup=setup, setup_path=setup_path,
+                pool=pool) as e:
+        if filename and format == 'parquet':
+            e.export_to_parquet(query, filename=filename, columns=columns,
+                                compression=('snappy' if compression == 'infer'
+                                             else compression))
+        elif filename:
             e.export_to_file(query, filename=filename, columns=columns,
-                                delimiter=delimiter, header=header, null=null)
+                                delimiter=delimiter, header=header, null=null,
+                                compression=compression)
+        elif format == 'arrow':
+            data = e.export_to_arrow(query, columns=columns)
         else:
             data = e.export_to_object(query, columns=columns, null=null,
-                                        delimiter=delimiter, header=header)
+                                        delimiter=delimiter, header=header,
+                                        columnar=columnar, format=format,
+                                        typed=typed)
     return data
+
+
+def iter_export(query, columns=None, delimiter=',', header=True, null=None,
+                    batch_size=None, host=None, database=None, user=None,
+                    password=None, port=DEFAULT_PORT, setup=DEFAULT_SETUP,
+                    setup_path=DEFAULT_SETUP_PATH, pool=False, format='csv',
+                    typed=False):
+    """A wrapper function around Cmd.iter_export(). Records are yielded as
+    they are streamed from the server, the connection is closed once the
+    generator is exhausted or closed.
+
+    Args:
+        query (str): A select query or a table_name
+        columns (list): List of column names to export. columns should only
+            be provided if you are exporting a table
+            (i.e. query = 'table_name'). Defaults to None.
+        delimiter (str): Delimiter to separate columns with. Defaults to ','
+        header (boolean): Specify True to yield dicts keyed by column name.
+            Defaults to True.
+        null (str): Specifies the string that represents a null value.
+            Defaults to None, which uses the postgres default of an
+            unquoted empty string.
+        batch_size (int, optional): Yield lists of up to batch_size records
+            instead of single records. Defaults to None.
+        format (str): 'csv' to export text values, or 'binary' to decode
+            every value into its native python type. Defaults to 'csv'.
+        typed (bool): Decode csv values into their native python types. See
+            Cmd.export_to_object(). Defaults to False.
+        host (str, optional): Database host url. Defaults to None.
+        database (str, optional): Database name. Defaults to None.
+        user (str, optional): Username. Defaults to None.
+        password (str, optional): Password. Defaults to None.
+        setup (str, optional): Name of the db setup to use in ~/.postgrez.
+            If no setup is provided, looks for the 'default' key in
+            ~/.postgrez which specifies the default configuration to use.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        pool (bool or ConnectionPool, optional): Borrow a connection from a
+            pool instead of connecting. If True, the process-wide pool for the
+            resolved connection parameters is used. Defaults to False.
+
+    Yields:
+        record (dict or list): See Cmd.iter_export().
+    """
+    with Cmd(host=host, database=database, user=user, password=password,
+                port=port, setup=setup, setup_path=setup_path,
+                pool=pool) as e:
+        for record in e.iter_export(query, columns=columns, null=null,
+                                    delimiter=delimiter, header=header,
+                                    batch_size=batch_size, format=format,
+                                    typed=typed):
+            yield record
+
+
+def copy_between(src_setup, query, dst_setup, table_name, columns=None,
+                    target_columns=None, format='csv', workers=1,
+                    partition_by=None, setup_path=DEFAULT_SETUP_PATH,
+                    dst_setup_path=None, pool=False):
+    """A wrapper function around Cmd.copy_to(). Streams the records of a
+    table or query from the database of one .postgrez setup into a table of
+    another, without an intermediate file.
+
+    Args:
+        src_setup (str): Name of the source db setup in ~/.postgrez.
+        query (str): A select query or a table_name
+        dst_setup (str): Name of the destination db setup in ~/.postgrez.
+        table_name (str): name of the destination table.
+        columns (list): List of column names to export, if query is a table
+            name. Defaults to None.
+        target_columns (list): Columns of the destination table to load.
+            Defaults to None, every column in table order.
+        format (str): 'csv' or 'binary'. Defaults to 'csv'.
+        workers (int): Number of slices copied in parallel. Defaults to 1.
+        partition_by (str, optional): Column to partition the rows on, see
+            Cmd.copy_to(). Defaults to None.
+        setup_path (str, optional): Path to the .postgrez configuration
+            file. Defaults to '~', i.e. your home directory on Mac/Linux.
+        dst_setup_path (str, optional): Path to the .postgrez configuration
+            file of the destination setup. Defaults to None, i.e. setup_path.
+        pool (bool, optional): Borrow the connections from the process-wide
+            pools instead of connecting. Defaults to False.
+
+    Returns:
+        summary (dict): See Cmd.copy_to().
+    """
+    with Cmd(setup=src_setup, setup_path=setup_path, pool=pool) as src, \
+            Cmd(setup=dst_setup, setup_path=dst_setup_path or setup_path,
+                pool=pool) as dst:
+        return src.copy_to(query, table_name, dst, columns=columns,
+                           target_columns=target_columns, format=format,
+                           workers=workers, partition_by=partition_by)
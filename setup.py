@@ -15,5 +15,8 @@ setup(name='postgrez',
       author_email='ianwhitestone@hotmail.com',
       url='https://github.com/ian-whitestone/postgrez',
       install_requires = requirements,
-      packages = ['postgrez']
+      extras_require = {'zstd': ['zstandard'], 'arrow': ['pyarrow'],
+                        'pandas': ['pandas>=1.5']},
+      packages = ['postgrez'],
+      python_requires = '>=3.7'
 )
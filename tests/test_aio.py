@@ -0,0 +1,137 @@
+import asyncio
+import socket
+import threading
+from concurrent import futures
+import psycopg2
+import psycopg2.extensions
+import pytest
+from postgrez import aio
+from postgrez.exceptions import PostgrezExecuteError, PostgrezPoolError
+
+def test_async_pool_invalid_size():
+    with pytest.raises(PostgrezPoolError):
+        aio.AsyncConnectionPool(maxconn=0, host='localhost')
+
+def test_async_pool_closed():
+    async def acquire():
+        pool = aio.AsyncConnectionPool(host='localhost')
+        await pool.close()
+        await pool.acquire()
+    with pytest.raises(PostgrezPoolError):
+        asyncio.run(acquire())
+
+class FakeAsyncConnection(object):
+    """Asynchronous connection whose poll() returns the given states, backed
+    by a socket pair so the event loop can watch it."""
+    def __init__(self, states, ready=True, error=None):
+        self.states = list(states)
+        self.sock, self.peer = socket.socketpair()
+        if ready:
+            self.peer.send(b'x')
+        self.error = error
+        self.queries = []
+        self.cancelled_in = None
+        self.closed = 0
+
+    def poll(self):
+        return self.states.pop(0)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, vars=None):
+        self.queries.append(query)
+        if self.error:
+            raise self.error
+
+    def cancel(self):
+        self.cancelled_in = threading.current_thread().name
+
+    def close(self):
+        self.closed = 1
+        self.sock.close()
+        self.peer.close()
+
+def test_wait():
+    extensions = psycopg2.extensions
+    conn = FakeAsyncConnection([extensions.POLL_WRITE, extensions.POLL_READ,
+                                extensions.POLL_OK])
+    asyncio.run(aio.wait(conn))
+    assert conn.states == []
+
+    with pytest.raises(psycopg2.OperationalError):
+        asyncio.run(aio.wait(FakeAsyncConnection([-1])))
+
+def test_async_cmd(monkeypatch):
+    conn = FakeAsyncConnection([psycopg2.extensions.POLL_OK])
+    async def connect(**params):
+        return conn
+    monkeypatch.setattr(aio, 'connect', connect)
+
+    async def run():
+        async with aio.AsyncCmd(host='localhost', database='db',
+                                user='user') as c:
+            await c.execute('select 1')
+        return c
+    c = asyncio.run(run())
+    assert conn.queries == ['select 1']
+    assert conn.closed == 1
+    assert not c._connected()
+
+def test_async_cmd_copy(monkeypatch):
+    calls = []
+    class FakeCmd(object):
+        def __init__(self, pool=None, **params):
+            self.pool = pool
+            self.params = params
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            pass
+        def load_from_object(self, table_name, data, commit=True):
+            calls.append((self.params['database'], self.pool, table_name,
+                          list(data), threading.current_thread().name))
+            return {'rows': len(calls[-1][3])}
+    monkeypatch.setattr(aio, 'Cmd', FakeCmd)
+    monkeypatch.setattr(aio, 'connect', lambda **params: None)
+    executor = futures.ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        c = aio.AsyncCmd(host='localhost', database='db', user='user',
+                         copy_pool=False, executor=executor)
+        return await c.load_from_object('t', iter([(1,), (2,)]))
+    assert asyncio.run(run()) == {'rows': 2}
+    executor.shutdown()
+    assert calls[0][:4] == ('db', False, 't', [(1,), (2,)])
+    assert calls[0][4] != threading.current_thread().name
+
+def test_async_cmd_errors(monkeypatch):
+    conns = []
+    async def connect(**params):
+        return conns.pop(0)
+    monkeypatch.setattr(aio, 'connect', connect)
+
+    async def run(query):
+        async with aio.AsyncCmd(host='localhost', database='db',
+                                user='user') as c:
+            await c.execute(query)
+
+    ## errors are raised as Cmd.execute() raises them
+    conns.append(FakeAsyncConnection([], error=psycopg2.Error('bad')))
+    with pytest.raises(PostgrezExecuteError):
+        asyncio.run(run('select bad'))
+
+    ## a cancelled query is cancelled on the server outside the event loop
+    conn = FakeAsyncConnection([psycopg2.extensions.POLL_READ], ready=False)
+    conns.append(conn)
+    async def cancel():
+        task = asyncio.ensure_future(run('select pg_sleep(10)'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancel())
+    assert conn.cancelled_in not in (None, threading.current_thread().name)
@@ -0,0 +1,35 @@
+import datetime
+import decimal
+import uuid
+import pytest
+from postgrez import arrow, types
+
+pyarrow = pytest.importorskip('pyarrow')
+
+def test_arrow_type():
+    assert arrow.arrow_type(types.INT8)[0] == pyarrow.int64()
+    assert arrow.arrow_type(types.NUMERIC, 12, 2)[0] == \
+        pyarrow.decimal128(12, 2)
+    assert arrow.arrow_type(types.NUMERIC, 50, 4)[0] == \
+        pyarrow.decimal256(50, 4)
+    assert arrow.arrow_type(types.NUMERIC)[0] == pyarrow.float64()
+    assert arrow.arrow_type(types.TIMESTAMPTZ)[0] == \
+        pyarrow.timestamp('us', tz='UTC')
+    assert arrow.arrow_type(types.VARCHAR) == (pyarrow.string(), None)
+    ## unknown types keep their binary representation
+    assert arrow.arrow_type(869)[0] == pyarrow.binary()
+
+def test_build_record_batch():
+    schema, converters = arrow.build_schema([
+        ('id', types.INT4), ('amount', types.NUMERIC), ('key', types.UUID),
+        ('doc', types.JSONB), ('day', types.DATE)])
+    key = uuid.UUID(int=1)
+    rows = [(1, decimal.Decimal('1.5'), key, {'a': 1},
+             datetime.date(2000, 1, 2)),
+            (None, None, None, None, None)]
+    batch = arrow.build_record_batch(rows, schema, converters)
+    assert batch.schema == schema
+    assert batch.to_pydict() == {
+        'id': [1, None], 'amount': [1.5, None], 'key': [str(key), None],
+        'doc': ['{"a": 1}', None], 'day': [datetime.date(2000, 1, 2), None]}
+    assert arrow.build_record_batch([], schema, converters).num_rows == 0
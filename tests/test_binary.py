@@ -0,0 +1,105 @@
+import datetime
+import decimal
+import struct
+import pytest
+from postgrez import binary, types
+
+def test_encode_numeric():
+    ## (ndigits, weight, sign, dscale, digits...) after the length prefix
+    cases = {
+        '0': (0, 0, 0, 0),
+        '12345.6789': (3, 1, 0, 4, 1, 2345, 6789),
+        '0.00012': (2, -1, 0, 5, 1, 2000),
+        '-0.5': (1, -1, 0x4000, 1, 5000),
+        '10000': (1, 1, 0, 0, 1),
+    }
+    for value, expected in cases.items():
+        encoded = binary._encode_numeric(decimal.Decimal(value))
+        ndigits = (len(encoded) - 12) // 2
+        assert struct.unpack('!hhHh%dh' % ndigits, encoded[4:]) == expected
+
+def test_encode_fixed():
+    encode_int4, encode_float8 = binary.build_encoders([types.INT4,
+                                                        types.FLOAT8])
+    assert encode_int4(1) == encode_int4('1') == encode_int4(1.0) == \
+        encode_int4(decimal.Decimal('1')) == struct.pack('!ii', 4, 1)
+    assert encode_float8(decimal.Decimal('1.5')) == struct.pack('!id', 8, 1.5)
+    ## COPY would reject them in text format, don't truncate them
+    for value in (1.5, decimal.Decimal('1.7')):
+        with pytest.raises(ValueError):
+            encode_int4(value)
+
+def test_iter_copy_binary():
+    encoders = binary.build_encoders([types.INT4, types.TEXT, types.DATE])
+    rows = [(1, 'a', datetime.date(2000, 1, 2)), (None, None, None)]
+    data = b''.join(binary.iter_copy_binary(rows, encoders))
+    assert data.startswith(binary.HEADER)
+    assert data.endswith(binary.TRAILER)
+    assert data[19:] == (b'\x00\x03' + struct.pack('!ii', 4, 1) +
+                         struct.pack('!i', 1) + b'a' + struct.pack('!ii', 4, 1) +
+                         b'\x00\x03' + binary.NULL * 3 + binary.TRAILER)
+    with pytest.raises(ValueError):
+        list(binary.iter_copy_binary([(1,)], encoders))
+    with pytest.raises(ValueError):
+        binary.build_encoders([0])
+
+def test_binary_round_trip():
+    oids = [types.INT8, types.NUMERIC, types.TEXT, types.TIMESTAMPTZ,
+            types.BOOL]
+    rows = [[2 ** 40, decimal.Decimal('-12345.0060'), 'caf\xe9',
+             datetime.datetime(2017, 5, 1, 12, tzinfo=datetime.timezone.utc),
+             True],
+            [None, decimal.Decimal('0.00012'), '', None, False]]
+    data = b''.join(binary.iter_copy_binary(rows, binary.build_encoders(oids)))
+    ## feed the parser one byte at a time to exercise chunk boundaries
+    chunks = [data[i:i + 1] for i in range(len(data))]
+    decoded = list(binary.iter_binary_rows(chunks,
+                                           binary.build_decoders(oids)))
+    assert decoded == rows
+    assert str(decoded[0][1]) == '-12345.0060'
+    with pytest.raises(ValueError):
+        list(binary.iter_binary_rows([data[:-10]],
+                                     binary.build_decoders(oids)))
+
+def test_iter_binary_rows_large_field():
+    oids = [types.INT4, types.TEXT]
+    rows = [[1, 'x' * 1000000], [2, 'y']]
+    data = b''.join(binary.iter_copy_binary(rows, binary.build_encoders(oids)))
+    calls = []
+    decoders = [lambda value, decode=decode: calls.append(1) or decode(value)
+                for decode in binary.build_decoders(oids)]
+    chunks = [data[i:i + 1024] for i in range(0, len(data), 1024)]
+    assert list(binary.iter_binary_rows(chunks, decoders)) == rows
+    ## each field is decoded once, however many chunks it spans
+    assert len(calls) == 4
+
+def test_decode_out_of_range():
+    decoders = binary.build_decoders([types.DATE, types.TIMESTAMP,
+                                      types.TIMESTAMPTZ])
+    decode_date, decode_timestamp, decode_timestamptz = decoders
+    ## only the infinity sentinels map to the python limits
+    assert decode_date(struct.pack('!i', 2 ** 31 - 1)) == datetime.date.max
+    assert decode_date(struct.pack('!i', -2 ** 31)) == datetime.date.min
+    assert decode_timestamp(struct.pack('!q', -2 ** 63)) == \
+        datetime.datetime.min
+    ## other values outside the range of python dates keep the text form
+    assert decode_date(struct.pack('!i', -746117)) == '0044-03-15 BC'
+    assert decode_date(struct.pack('!i', 2921940)) == '10000-01-01'
+    assert decode_timestamp(struct.pack('!q', -64464472798750000)) == \
+        '0044-03-15 10:00:01.25 BC'
+    assert decode_timestamptz(struct.pack('!q', -64464508800000000)) == \
+        '0044-03-15 00:00:00+00 BC'
+
+def test_parse_datetime():
+    utc = datetime.timezone.utc
+    assert binary._to_date('2024-02-03') == datetime.date(2024, 2, 3)
+    assert binary._to_date('2024-02-03T10:00:00') == datetime.date(2024, 2, 3)
+    assert binary._to_datetime('2024-02-03 04:05:06.5') == \
+        datetime.datetime(2024, 2, 3, 4, 5, 6, 500000)
+    assert binary._to_datetime('2024-02-03T04:05:06Z') == \
+        datetime.datetime(2024, 2, 3, 4, 5, 6, tzinfo=utc)
+    assert binary._to_datetime('2024-02-03T04:05-0230') == \
+        datetime.datetime(2024, 2, 3, 6, 35, tzinfo=utc)
+    assert binary._to_time('04:05:06.123') == datetime.time(4, 5, 6, 123000)
+    with pytest.raises(ValueError):
+        binary._to_datetime('03/02/2024')
@@ -0,0 +1,42 @@
+import time
+from postgrez import cache
+
+def test_extract_tables():
+    query = ('select * from public.Users u join "Orders" o on o.id = u.id '
+             'left join (select 1 from items) i on true')
+    assert cache.extract_tables(query) == set(['users', 'Orders', 'items'])
+    assert cache.extract_tables('my_schema.events') == set(['events'])
+
+def test_is_cacheable():
+    assert cache.is_cacheable('select * from users where id = %s')
+    assert not cache.is_cacheable('users')
+    assert not cache.is_cacheable('select * from jobs for update skip locked')
+    assert not cache.is_cacheable('SELECT * FROM jobs FOR NO KEY UPDATE')
+    assert not cache.is_cacheable('select * from jobs for key share')
+    assert not cache.is_cacheable("select nextval('job_id_seq')")
+    assert not cache.is_cacheable('select pg_advisory_lock(1)')
+
+def test_freeze():
+    assert cache.freeze({'b': [1, 2], 'a': 1}) == (('a', 1), ('b', (1, 2)))
+
+def test_result_cache_lru():
+    c = cache.ResultCache(max_entries=2)
+    c.set('a', 1, tags=['t1'])
+    c.set('b', 2, tags=['t2'])
+    assert c.get('a') == 1
+    c.set('c', 3)
+    assert c.get('b') is cache.MISSING
+    assert c.invalidate('public.t1') == 1
+    assert c.get('a') is cache.MISSING
+    stats = c.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'],
+            stats['entries']) == (1, 2, 1, 1)
+
+def test_result_cache_ttl_and_bytes():
+    c = cache.ResultCache(ttl=0.01, max_bytes=100)
+    c.set('big', 'x' * 1000)
+    assert c.get('big') is cache.MISSING
+    c.set('a', [1])
+    time.sleep(0.02)
+    assert c.get('a') is cache.MISSING
+    assert c.stats()['expirations'] == 1
@@ -0,0 +1,37 @@
+from postgrez import metrics
+
+def _event(**kwargs):
+    event = {'operation': 'execute', 'target': 'select 1', 'database': 'db',
+             'wall': 0.01, 'server': 0.008, 'connect': 0.0, 'rows': 1,
+             'bytes': None, 'error': None}
+    event.update(kwargs)
+    return event
+
+def test_histogram():
+    h = metrics.Histogram(buckets=[0.001, 0.01, 0.1])
+    for wall in (0.0005, 0.005, 0.005, 0.05):
+        h(_event(wall=wall))
+    h(_event(wall=0.5, error='boom', rows=None))
+    summary = h.summary()['execute']
+    assert (summary['count'], summary['errors'], summary['rows']) == (5, 1, 4)
+    assert summary['p50'] == 0.01
+    assert summary['p99'] == summary['max'] == 0.5
+
+def test_statsd_format():
+    emitter = metrics.StatsdEmitter(prefix='app')
+    lines = emitter.format(_event(error='boom', bytes=10))
+    emitter.close()
+    assert lines == ['app.execute.calls:1|c', 'app.execute.wall:10.000|ms',
+                     'app.execute.server:8.000|ms', 'app.execute.rows:1|c',
+                     'app.execute.bytes:10|c', 'app.execute.errors:1|c']
+
+def test_emit_ignores_hook_errors():
+    events = []
+    def broken(event):
+        raise ValueError('broken hook')
+    metrics.add_hook(broken)
+    try:
+        metrics.emit(_event(), hooks=[events.append])
+    finally:
+        metrics.remove_hook(broken)
+    assert len(events) == 1 and not metrics.has_hooks()
@@ -0,0 +1,94 @@
+import time
+import psycopg2
+import psycopg2.extensions
+import pytest
+from postgrez.pool import ConnectionPool
+from postgrez.exceptions import PostgrezPoolError
+
+def test_pool_invalid_size():
+    with pytest.raises(PostgrezPoolError):
+        ConnectionPool(minconn=2, maxconn=1)
+    with pytest.raises(PostgrezPoolError):
+        ConnectionPool(minconn=0, maxconn=0)
+
+def test_pool_closed():
+    pool = ConnectionPool(minconn=0, maxconn=1, host='localhost')
+    pool.closeall()
+    with pytest.raises(PostgrezPoolError):
+        pool.getconn()
+    assert pool.stats() == {'idle': 0, 'used': 0}
+
+class FakeConnection(object):
+    """Connection whose health check fails once it is marked broken."""
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query):
+        if self.broken:
+            raise psycopg2.OperationalError('server closed the connection')
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Record the connections opened by psycopg2.connect()."""
+    opened = []
+    def connect(**params):
+        opened.append(FakeConnection())
+        return opened[-1]
+    monkeypatch.setattr(psycopg2, 'connect', connect)
+    return opened
+
+def test_pool_reuse(connections):
+    pool = ConnectionPool(minconn=0, maxconn=2, host='localhost')
+    conn = pool.getconn()
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    ## the open transaction was rolled back
+    assert conn.status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    assert pool.getconn() is conn
+    assert len(connections) == 1
+    assert pool.stats() == {'idle': 0, 'used': 1}
+
+def test_pool_idle_eviction(connections):
+    pool = ConnectionPool(minconn=0, maxconn=2, idle_timeout=0.01,
+                          host='localhost')
+    conn = pool.getconn()
+    pool.putconn(conn)
+    time.sleep(0.02)
+    assert pool.getconn() is not conn
+    assert conn.closed and len(connections) == 2
+
+def test_pool_health_check(connections):
+    pool = ConnectionPool(minconn=0, maxconn=1, host='localhost')
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+    assert pool.getconn() is not conn
+    assert conn.closed and len(connections) == 2
+
+def test_pool_checkout_timeout(connections):
+    pool = ConnectionPool(minconn=0, maxconn=1, host='localhost')
+    pool.getconn()
+    start = time.time()
+    with pytest.raises(PostgrezPoolError):
+        pool.getconn(timeout=0.05)
+    assert time.time() - start >= 0.05
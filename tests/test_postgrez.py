@@ -1,5 +1,427 @@
+import bz2
+import decimal
+import gzip
+import psycopg2
+import psycopg2.extras
 import pytest
+from postgrez import postgrez, wrapper, binary, types
+from postgrez.pool import ConnectionPool
+from postgrez.exceptions import (PostgrezExecuteError, PostgrezLoadError,
+                                  PostgrezExportError, PostgrezPoolError)
 
 def test_postgrez():
     """Placeholder for testing CircleCI"""
     pass
+
+class FakeCursor(object):
+    """Cursor which records its queries. COPY queries write or read
+    in-memory data, queries containing a key of `errors` raise it and
+    queries containing a key of `results` return it from fetchone() and
+    fetchall()."""
+    def __init__(self, data=None, fail=None, errors=None, results=None):
+        self.data = data
+        self.fail = fail
+        self.errors = errors or {}
+        self.results = results or {}
+        self.received = b''
+        self.rowcount = -1
+        self.queries = []
+        self.closed = False
+        self.description = None
+        self.itersize = 2000
+        self.fetches = 0
+        self._rows = []
+
+    def _check(self, query):
+        for key, error in self.errors.items():
+            if key in query:
+                raise error
+
+    def execute(self, query, vars=None):
+        self.queries.append(query)
+        self._check(query)
+        self._rows = []
+        for key, rows in self.results.items():
+            if key in query:
+                self._rows = list(rows)
+        self.rowcount = len(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def __iter__(self):
+        ## fetches itersize rows per round trip, like a named cursor
+        for start in range(0, len(self._rows), self.itersize):
+            self.fetches += 1
+            for row in self._rows[start:start + self.itersize]:
+                yield row
+
+    def copy_expert(self, query, f, size=8192):
+        self.queries.append(query)
+        if 'TO STDOUT' in query:
+            for row in self.data:
+                f.write(row)
+            if self.fail:
+                raise self.fail
+        else:
+            self._check(query)
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                self.received += chunk
+            self.rowcount = self.received.count(b'\n')
+
+    def copy_from(self, f, table, sep='\t', null='\\N', size=8192,
+                  columns=None):
+        self.copy_expert('COPY %s FROM STDIN' % table, f, size=size)
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection(object):
+    """Connection handing out a single FakeCursor and counting commits and
+    rollbacks."""
+    def __init__(self, cursor=None, server_version=160000):
+        self._cursor = cursor or FakeCursor()
+        self.server_version = server_version
+        self.encoding = 'UTF8'
+        self.closed = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.cursor_names = []
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def cursor(self, name=None, cursor_factory=None):
+        self.cursor_names.append(name)
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def fake_cmd(monkeypatch):
+    """Return a factory of Cmd objects connected to a FakeConnection."""
+    def connect(cursor=None, **kwargs):
+        conn = FakeConnection(cursor, **kwargs)
+        monkeypatch.setattr(psycopg2, 'connect', lambda **params: conn)
+        return postgrez.Cmd(host='localhost', database='db', user='user')
+    return connect
+
+def test_pipe_copy():
+    rows = [b'%d,x\n' % i for i in range(1000)]
+    src, dst = FakeCursor(rows), FakeCursor()
+    assert postgrez._pipe_copy(src, 'COPY t TO STDOUT', dst,
+                               'COPY t FROM STDIN', chunk_size=64) == \
+        (1000, len(b''.join(rows)))
+    assert dst.received == b''.join(rows)
+
+    with pytest.raises(ValueError):
+        postgrez._pipe_copy(FakeCursor(rows, fail=ValueError('boom')),
+                            'COPY t TO STDOUT', FakeCursor(),
+                            'COPY t FROM STDIN', chunk_size=64)
+
+def test_copy_slice_pool_error(monkeypatch):
+    pool = ConnectionPool(minconn=0, maxconn=1, host='localhost')
+    def getconn(timeout=None):
+        raise PostgrezPoolError('Timed out waiting for a connection')
+    monkeypatch.setattr(pool, 'getconn', getconn)
+    with pytest.raises(PostgrezLoadError):
+        postgrez._copy_slice({'host': 'localhost', 'database': 'db',
+                              'user': 'user'}, pool, 'snap',
+                             'COPY t TO STDOUT', None, 'COPY t FROM STDIN')
+
+def test_copy_slices_workers(fake_cmd):
+    cmd, destination = fake_cmd(), fake_cmd()
+    cmd.pool = destination.pool = ConnectionPool(minconn=0, maxconn=3,
+                                                 host='localhost')
+    with pytest.raises(PostgrezLoadError):
+        ## a slice needs two connections, only one of the shared pool is free
+        cmd._copy_slices('t', destination, 'COPY t FROM STDIN', workers=4)
+    assert cmd.conn._cursor.queries == []
+
+def test_parallel_export_workers(fake_cmd, tmp_path):
+    cmd = fake_cmd()
+    cmd.pool = ConnectionPool(minconn=0, maxconn=1, host='localhost')
+    with pytest.raises(PostgrezExportError):
+        ## the only connection of the pool is held by cmd
+        cmd.parallel_export('t', str(tmp_path / 'out.csv'))
+    assert cmd.conn._cursor.queries == []
+
+def test_export_snapshot(fake_cmd, tmp_path):
+    cursor = FakeCursor(results={'txid_current_if_assigned': [(None,)],
+                                 'pg_export_snapshot': [('snap',)]})
+    cmd = fake_cmd(cursor)
+    cmd.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    ## a read-only transaction is rolled back
+    assert cmd._export_snapshot() == 'snap'
+    assert cmd.conn.rollbacks == 1
+
+    cursor.results['txid_current_if_assigned'] = [(1234,)]
+    with pytest.raises(PostgrezExportError):
+        cmd.parallel_export('t', str(tmp_path / 'out.csv'))
+    ## the pending work of an earlier commit=False call is kept
+    assert cmd.conn.rollbacks == 1
+    with pytest.raises(PostgrezLoadError):
+        cmd.copy_to('t', 't', fake_cmd(), workers=2)
+    assert cmd.conn.rollbacks == 1
+
+def test_execute_batch(fake_cmd, monkeypatch):
+    calls = []
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+        lambda cur, query, page, **kwargs: calls.append(
+            ('values', len(page), kwargs)) or [(1,)] * len(page))
+    monkeypatch.setattr(psycopg2.extras, 'execute_batch',
+        lambda cur, query, page, **kwargs: calls.append(
+            ('batch', len(page), kwargs)))
+    cmd = fake_cmd()
+
+    summary = cmd.execute_batch('insert into t values %s',
+                                ((i,) for i in range(5)), page_size=2)
+    assert (summary['pages'], summary['rows']) == (3, 5)
+    assert [call[:2] for call in calls] == [('values', 2), ('values', 2),
+                                            ('values', 1)]
+    ## fetch is only passed when returning, for psycopg2 < 2.8
+    assert 'fetch' not in calls[0][2]
+    assert cmd.conn.commits == 1
+
+    del calls[:]
+    cmd.execute_batch('update t set a = %s where b = %s', [(1, 2)])
+    assert calls[0][:2] == ('batch', 1)
+
+    summary = cmd.execute_batch('insert into t values %s returning id',
+                                [(1,), (2,)], returning=True)
+    assert summary['results'] == [(1,), (1,)]
+    assert calls[-1][2]['fetch'] is True
+
+    with pytest.raises(PostgrezExecuteError):
+        cmd.execute_batch('update t set a = %s', [(1,)], returning=True)
+    with pytest.raises(PostgrezExecuteError):
+        cmd.execute_batch('insert into t values %s', [(1,)], method='copy')
+
+def test_transaction_savepoints(fake_cmd):
+    cursor = FakeCursor(errors={'bad': psycopg2.Error('bad')})
+    cmd = fake_cmd(cursor)
+    with cmd.transaction(synchronous_commit='off'):
+        cmd.execute('insert into log values (1)')
+        assert cmd.conn.commits == 0
+        with pytest.raises(PostgrezExecuteError):
+            with cmd.transaction():
+                cmd.execute('select bad')
+        with cmd.transaction():
+            cmd.execute('insert into log values (2)')
+    assert cursor.queries == [
+        'SET LOCAL synchronous_commit = %s', 'insert into log values (1)',
+        'SAVEPOINT postgrez_savepoint_1', 'select bad',
+        'ROLLBACK TO SAVEPOINT postgrez_savepoint_1',
+        'ROLLBACK TO SAVEPOINT postgrez_savepoint_1',
+        'RELEASE SAVEPOINT postgrez_savepoint_1',
+        'SAVEPOINT postgrez_savepoint_1', 'insert into log values (2)',
+        'RELEASE SAVEPOINT postgrez_savepoint_1']
+    assert (cmd.conn.commits, cmd.conn.rollbacks) == (1, 0)
+
+    ## outside a block execute() commits itself
+    cmd.execute('insert into log values (3)')
+    assert cmd.conn.commits == 2
+
+def test_transaction_aborted(fake_cmd, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('a,b\n1,2\n')
+    cursor = FakeCursor(errors={'FROM STDIN': psycopg2.Error('bad row')})
+    cmd = fake_cmd(cursor)
+    with pytest.raises(PostgrezExecuteError):
+        with cmd.transaction():
+            try:
+                cmd.load_from_file('t', str(path))
+            except PostgrezLoadError:
+                pass
+            cmd.execute('insert into log values (1)')
+    assert (cmd.conn.commits, cmd.conn.rollbacks) == (0, 2)
+
+    ## errors raised by the cursor directly leave the connection in error
+    cmd = fake_cmd()
+    with pytest.raises(PostgrezExecuteError):
+        with cmd.transaction():
+            cmd.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+    assert (cmd.conn.commits, cmd.conn.rollbacks) == (0, 1)
+
+def test_transaction_parallel(fake_cmd, tmp_path):
+    cmd = fake_cmd()
+    with cmd.transaction():
+        with pytest.raises(PostgrezLoadError):
+            cmd.parallel_load_file('t', str(tmp_path / 'data.csv'))
+        with pytest.raises(PostgrezExportError):
+            cmd.parallel_export('select * from t', str(tmp_path / 'out.csv'),
+                                partition_by='id')
+        with pytest.raises(PostgrezLoadError):
+            cmd.load_from_file('t', str(tmp_path / 'data.csv'),
+                               checkpoint=True)
+
+def test_upsert_on_conflict(fake_cmd):
+    cursor = FakeCursor(results={'count(*) FROM _postgrez': [(3,)],
+                                 'WITH upserted': [(2, 1)]})
+    cmd = fake_cmd(cursor)
+    summary = cmd.upsert('t', [(1, 'a'), (2, 'b'), (1, 'c')], ['id'],
+                         columns=['id', 'val'], deduplicate=True)
+    assert (summary['staged'], summary['inserted'], summary['updated'],
+            summary['rows']) == (3, 2, 1, 3)
+    upsert = [query for query in cursor.queries if 'ON CONFLICT' in query][0]
+    assert 'DO UPDATE SET val = EXCLUDED.val' in upsert
+    assert '(SELECT DISTINCT ON (id) * FROM _postgrez_upsert_' in upsert
+    assert cursor.queries[-1].startswith('DROP TABLE _postgrez_upsert_')
+    assert cmd.conn.commits == 1
+
+    cmd.upsert('t', [(1, 'a')], ['id'], columns=['id', 'val'],
+               update_columns=[])
+    upsert = [query for query in cursor.queries if 'ON CONFLICT' in query][-1]
+    assert 'ON CONFLICT (id) DO NOTHING' in upsert
+    assert 'DISTINCT ON' not in upsert
+
+def test_upsert_merge(fake_cmd):
+    results = {'count(*) FROM _postgrez': [(3,)], 'JOIN': [(1,)],
+               'MERGE INTO': [()] * 3, 'WITH merged': [(2, 1)]}
+    cursor = FakeCursor(results=results)
+    cmd = fake_cmd(cursor, server_version=150000)
+    summary = cmd.upsert('t', [(1, 'a')], ['id'], columns=['id', 'val'],
+                         method='merge')
+    assert (summary['inserted'], summary['updated']) == (2, 1)
+    assert any(query.startswith('SELECT count(*) FROM t t JOIN')
+               for query in cursor.queries)
+    assert not any('RETURNING' in query for query in cursor.queries)
+
+    ## MERGE ... RETURNING counts the actions from PostgreSQL 17
+    cursor = FakeCursor(results=results)
+    cmd = fake_cmd(cursor, server_version=170000)
+    summary = cmd.upsert('t', [(1, 'a')], ['id'], columns=['id', 'val'],
+                         method='merge')
+    assert (summary['inserted'], summary['updated']) == (2, 1)
+    assert not any('JOIN' in query for query in cursor.queries)
+
+    cmd = fake_cmd(server_version=140000)
+    with pytest.raises(PostgrezLoadError):
+        cmd.upsert('t', [(1, 'a')], ['id'], columns=['id', 'val'],
+                   method='merge')
+
+def test_upsert_rollback(fake_cmd):
+    cursor = FakeCursor(errors={'FROM STDIN': psycopg2.Error('bad row')})
+    cmd = fake_cmd(cursor)
+    with pytest.raises(PostgrezLoadError):
+        cmd.upsert('t', [(1, 'a')], ['id'], columns=['id', 'val'])
+    assert (cmd.conn.commits, cmd.conn.rollbacks) == (0, 2)
+    assert not any('ON CONFLICT' in query for query in cursor.queries)
+
+def test_parallel_load_staging_error(fake_cmd, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('a,b\n1,2\n')
+    cursor = FakeCursor(errors={'CREATE UNLOGGED': psycopg2.Error('denied')})
+    cmd = fake_cmd(cursor)
+    with pytest.raises(PostgrezLoadError):
+        cmd.parallel_load_file('t', str(path), single_transaction=True)
+    assert (cmd.conn.commits, cmd.conn.rollbacks) == (0, 1)
+
+def test_iter_export_closed_early(fake_cmd):
+    rows = [b'%d,x\n' % i for i in range(10000)]
+    cursor = FakeCursor(rows)
+    cmd = fake_cmd(cursor)
+    with cmd.transaction():
+        cmd.execute('insert into log values (1)')
+        records = cmd.iter_export('t', header=False, chunk_size=64)
+        assert next(records) == ['0', 'x']
+        records.close()
+    ## only the interrupted copy is rolled back
+    assert cursor.queries[1] == 'SAVEPOINT postgrez_copy_out'
+    assert cursor.queries[3:] == ['ROLLBACK TO SAVEPOINT postgrez_copy_out',
+                                  'RELEASE SAVEPOINT postgrez_copy_out']
+    assert (cmd.conn.commits, cmd.conn.rollbacks) == (1, 0)
+
+    ## outside a block the transaction is rolled back
+    records = cmd.iter_export('t', header=False, chunk_size=64)
+    next(records)
+    records.close()
+    assert cmd.conn.rollbacks == 1
+
+def test_iter_execute(fake_cmd):
+    cursor = FakeCursor(results={'from t': [(i, 'x') for i in range(10)]})
+    cursor.description = [('id',), ('val',)]
+    cmd = fake_cmd(cursor)
+    rows = cmd.iter_execute('select * from t', columns=True, itersize=4,
+                            batch_size=3)
+    assert next(rows) == [{'id': 0, 'val': 'x'}, {'id': 1, 'val': 'x'},
+                          {'id': 2, 'val': 'x'}]
+    assert cmd.conn.cursor_names[-1].startswith('postgrez_')
+    assert (cursor.itersize, cursor.fetches) == (4, 1)
+    assert sum(len(batch) for batch in rows) == 7
+    assert cursor.fetches == 3
+    assert cursor.closed
+
+def test_iter_execute_closed_early(fake_cmd):
+    cursor = FakeCursor(results={'from t': [(i,) for i in range(10)]})
+    cursor.description = [('id',)]
+    cmd = fake_cmd(cursor)
+    rows = wrapper.iter_execute('select * from t', itersize=2,
+                                host='localhost', database='db', user='user')
+    assert next(rows) == {'id': 0}
+    assert not cursor.closed
+    rows.close()
+    ## the named cursor and the connection are closed
+    assert cursor.closed and cmd.conn.closed
+    assert cmd.conn.cursor_names[-1].startswith('postgrez_')
+
+def test_export_to_parquet(fake_cmd, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    oids = [types.INT4, types.TEXT, types.NUMERIC]
+    rows = [(i, 'row %s' % i, decimal.Decimal(i) / 4) for i in range(10)]
+    rows.append((None, None, None))
+    data = b''.join(binary.iter_copy_binary(rows,
+                                            binary.build_encoders(oids)))
+    cursor = FakeCursor([data[i:i + 16] for i in range(0, len(data), 16)])
+    cursor.description = [('id', types.INT4, None, 4, None, None, None),
+                          ('val', types.TEXT, None, -1, None, None, None),
+                          ('amount', types.NUMERIC, None, -1, 10, 2, None)]
+    cmd = fake_cmd(cursor)
+    filename = str(tmp_path / 'out.parquet')
+
+    summary = cmd.export_to_parquet('t', filename, batch_size=4)
+    assert (summary['rows'], summary['row_groups']) == (11, 3)
+    assert cursor.queries[-1].endswith('TO STDOUT WITH (FORMAT binary)')
+    f = parquet.ParquetFile(filename)
+    assert f.metadata.num_row_groups == 3
+    assert [tuple(row.values()) for row in f.read().to_pylist()] == rows
+
+    ## the wrapper writes the same file
+    wrapper.export('t', filename=filename, format='parquet',
+                   host='localhost', database='db', user='user')
+    assert parquet.read_table(filename).num_rows == 11
+
+def test_compressed_files(fake_cmd, tmp_path):
+    data = b''.join(b'%d,caf\xc3\xa9\n' % i for i in range(1000))
+    path = tmp_path / 'data.csv.gz'
+    with gzip.open(str(path), 'wb') as f:
+        f.write(b'id,name\n' + data)
+    cursor = FakeCursor([data[i:i + 100] for i in range(0, len(data), 100)])
+    cmd = fake_cmd(cursor)
+
+    ## the file is decompressed while it is streamed to the server
+    cmd.load_from_file('t', str(path), block_size=64)
+    assert cursor.received == b'id,name\n' + data
+    assert 'HEADER' in cursor.queries[-1] and cmd.conn.commits == 1
+
+    path = tmp_path / 'out.csv.bz2'
+    cmd.export_to_file('t', str(path))
+    with bz2.open(str(path), 'rb') as f:
+        assert f.read() == data
+
+    with pytest.raises(PostgrezLoadError):
+        cmd.load_from_file('t', str(path), compression='rar')
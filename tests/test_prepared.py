@@ -0,0 +1,89 @@
+import psycopg2
+import psycopg2.extensions
+import pytest
+from postgrez import prepared
+
+def test_convert_placeholders():
+    assert prepared.convert_placeholders('select %s + %s, 100%%') == \
+        ('select $1 + $2, 100%', '(%s, %s)')
+    assert prepared.convert_placeholders(
+        'select %(a)s, %(b)s, %(a)s', named=True) == \
+        ('select $1, $2, $1', '(%(a)s, %(b)s)')
+    assert prepared.convert_placeholders('select 1') == ('select 1', '')
+    with pytest.raises(ValueError):
+        prepared.convert_placeholders('select %s, %(a)s')
+
+class FakeConnection(object):
+    def __init__(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.commits = 0
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+class FakeCursor(object):
+    """Cursor recording its queries, raising for queries containing a key of
+    `errors`."""
+    def __init__(self, errors=None):
+        self.connection = FakeConnection()
+        self.errors = errors or {}
+        self.queries = []
+
+    def execute(self, query, vars=None):
+        self.queries.append((query, vars))
+        for key, error in self.errors.items():
+            if key in query:
+                raise error
+
+def test_statement_cache_prepare():
+    cache = prepared.StatementCache(threshold=3)
+    cursor = FakeCursor()
+    for _ in range(4):
+        cache.execute(cursor, 'select %s::int', (1,))
+    assert cursor.queries == [
+        ('select %s::int', (1,)), ('select %s::int', (1,)),
+        ('PREPARE postgrez_0 AS select $1::int', None),
+        ('EXECUTE postgrez_0 (%s)', (1,)), ('EXECUTE postgrez_0 (%s)', (1,))]
+    assert (cache.stats['hits'], cache.stats['misses'],
+            cache.stats['prepared']) == (2, 2, 1)
+
+def test_statement_cache_not_idle():
+    cache = prepared.StatementCache(threshold=1)
+    cursor = FakeCursor()
+    cursor.connection.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    cache.execute(cursor, 'select 1')
+    cache.execute(cursor, 'select 1')
+    ## preparing could abort the open transaction
+    assert cursor.queries == [('select 1', None)] * 2
+    cursor.connection.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    cache.execute(cursor, 'select 1')
+    assert cursor.queries[-1] == ('EXECUTE postgrez_0 ', None)
+
+def test_statement_cache_evict():
+    cache = prepared.StatementCache(maxsize=1, threshold=1)
+    cursor = FakeCursor()
+    cache.execute(cursor, 'select 1')
+    cache.execute(cursor, 'select 2')
+    assert [query for query, _ in cursor.queries] == [
+        'PREPARE postgrez_0 AS select 1', 'EXECUTE postgrez_0 ',
+        'DEALLOCATE postgrez_0', 'PREPARE postgrez_1 AS select 2',
+        'EXECUTE postgrez_1 ']
+    assert cache.stats['evictions'] == 1
+
+def test_statement_cache_failed_prepare():
+    cache = prepared.StatementCache(threshold=1)
+    cursor = FakeCursor(errors={'PREPARE': psycopg2.Error('unsupported')})
+    cache.execute(cursor, 'select %s', (1,))
+    cache.execute(cursor, 'select %s', (1,))
+    ## the query is executed normally, and never prepared again
+    assert cursor.queries == [('PREPARE postgrez_0 AS select $1', None),
+                              ('select %s', (1,)), ('select %s', (1,))]
+    assert cursor.connection.rollbacks == 1
+    assert cache.stats['failures'] == 1
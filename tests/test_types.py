@@ -0,0 +1,32 @@
+import datetime
+import decimal
+from postgrez import types
+
+def test_decode_timestamp():
+    assert types._decode_timestamp('2017-05-01 10:20:30') == \
+        datetime.datetime(2017, 5, 1, 10, 20, 30)
+    assert types._decode_timestamp('2017-05-01 10:20:30.5-03:30') == \
+        datetime.datetime(2017, 5, 1, 10, 20, 30, 500000,
+            datetime.timezone(-datetime.timedelta(hours=3, minutes=30)))
+    assert types._decode_timestamp('infinity') == datetime.datetime.max
+    ## out of range of python datetimes
+    assert types._decode_timestamp('0044-03-15 12:00:00 BC') == \
+        '0044-03-15 12:00:00 BC'
+    assert types._decode_timestamp('10000-01-01 00:00:00+00') == \
+        '10000-01-01 00:00:00+00'
+
+def test_decode_date():
+    assert types._decode_date('2017-05-01') == datetime.date(2017, 5, 1)
+    assert types._decode_date('0044-03-15 BC') == '0044-03-15 BC'
+    assert types._decode_date('10000-01-01') == '10000-01-01'
+
+def test_decode_rows():
+    decoders = types.build_text_decoders([types.INT4, types.TEXT,
+                                          types.NUMERIC, types.BOOL,
+                                          types.DATE])
+    rows = [['1', 'a', '1.50', 't', '2017-05-01'],
+            ['\\N', '', '\\N', 'f', '\\N']]
+    assert types.decode_rows(rows, decoders) == [
+        [1, 'a', decimal.Decimal('1.50'), True, datetime.date(2017, 5, 1)],
+        [None, '', None, False, None]]
+    assert types.decode_rows([], decoders) == []
@@ -1,5 +1,182 @@
+import io
+import os
 import pytest
+from postgrez import utils
 
 def test_utils():
     """Placeholder for testing CircleCI"""
     pass
+
+def test_read_config_cache(tmp_path):
+    yaml_file = str(tmp_path / '.postgrez')
+    with open(yaml_file, 'w') as f:
+        f.write('default: local\nlocal:\n  host: localhost\n')
+    config = utils.read_config(yaml_file)
+    assert config['local']['host'] == 'localhost'
+    assert utils.read_config(yaml_file) is config
+
+    with open(yaml_file, 'w') as f:
+        f.write('default: remote\nremote:\n  host: example.com\n')
+    os.utime(yaml_file, ns=(0, 0))
+    assert utils.read_config(yaml_file)['default'] == 'remote'
+
+    utils.clear_config_cache()
+    assert utils.read_config(yaml_file) is not config
+
+def test_iter_lines():
+    chunks = [b'a,b\nc', b',d\n', b'\xc3', b'\xa9,"x\ny"\n', b'tail']
+    assert list(utils.iter_lines(chunks)) == \
+        ['a,b\n', 'c,d\n', '\xe9,"x\n', 'y"\n', 'tail']
+
+def test_copy_pipe():
+    pipe = utils.CopyPipe(chunk_size=4, maxsize=10)
+    for data in [b'ab', b'cd', b'ef']:
+        pipe.write(data)
+    pipe.close()
+    assert list(pipe.chunks()) == [b'abcd', b'ef']
+
+    pipe = utils.CopyPipe(chunk_size=4, maxsize=10)
+    pipe.write(b'abcdef')
+    pipe.close(ValueError('failed'))
+    assert pipe.read(2) == b'ab'
+    assert pipe.read(10) == b'cdef'
+    with pytest.raises(ValueError):
+        pipe.read(10)
+
+    pipe = utils.CopyPipe(chunk_size=1, maxsize=1)
+    pipe.abort()
+    with pytest.raises(IOError):
+        pipe.write(b'a')
+
+def test_iter_batches():
+    assert list(utils.iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(utils.iter_batches([], 2)) == []
+
+def test_build_columns():
+    batches = [[(1, 'a'), (2, 'b')], [(3, None)]]
+    assert utils.build_columns(['x', 'y'], batches, use_numpy=False) == \
+        {'x': [1, 2, 3], 'y': ['a', 'b', None]}
+
+    numpy = pytest.importorskip('numpy')
+    batches = [[(1, 'a', [1, 2], [1, 2]), (2, 'b', [3], [3, 4])],
+               [(None, None, None, {'c': 1})]]
+    data = utils.build_columns(['x', 'y', 'ragged', 'pairs'], batches,
+                               use_numpy=True)
+    assert data['x'].dtype == object and list(data['x']) == [1, 2, None]
+    rows = batches[0] + batches[1]
+    for i, name in enumerate(['y', 'ragged', 'pairs'], 1):
+        assert data[name].shape == (3,) and data[name].dtype == object
+        assert list(data[name]) == [row[i] for row in rows]
+    assert utils.build_columns(['x'], [[(1,), (2,)]],
+                               use_numpy=True)['x'].dtype.kind == 'i'
+
+def test_iterator_file():
+    f = utils.IteratorFile(('row%s|\xe9' % i for i in range(3)), chunk_size=8)
+    assert f.readline() == 'row0|\xe9\n'.encode('utf-8')
+    buf = bytearray(4)
+    assert f.readinto(buf) == 4 and bytes(buf) == b'row1'
+    assert f.read(2) == b'|\xc3'
+    assert f.read() == b'\xa9\nrow2|\xc3\xa9\n'
+    assert f.read() == b'' and f.readline() == b''
+
+def test_chunk_file_whole_chunks():
+    chunk = b'a' * 10
+    f = utils.ChunkFile([chunk, b'', b'b\nc'])
+    assert f.read(100) is chunk
+    assert list(f) == [b'b\n', b'c']
+
+def test_iter_sized():
+    items = iter(['ab', 'cd', 'ef', 'g'])
+    counts = {}
+    assert list(utils.iter_sized(items, counts, max_size=4)) == ['ab', 'cd']
+    assert counts == {'items': 2, 'size': 4}
+    counts = {}
+    assert list(utils.iter_sized(items, counts, max_items=5, overhead=1)) == \
+        ['ef', 'g']
+    assert counts == {'items': 2, 'size': 5}
+
+def test_split_file(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    data = b'a,b\n1,"x\ny"\n2,z\n3,"""q""\n\n"\n4,w\n'
+    with open(filename, 'wb') as f:
+        f.write(data)
+    for block_size in (2, 1024):
+        ranges = utils.split_file(filename, 3, block_size=block_size)
+        assert ranges[0][0] == 4 and ranges[-1][1] == len(data)
+        assert b''.join(data[s:e] for s, e in ranges) == data[4:]
+        for start, _ in ranges[1:]:
+            assert data[start:start + 1].isdigit()
+    assert utils.split_file(filename, 1, header=False) == [(0, len(data))]
+
+def test_range_file(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    with open(filename, 'wb') as f:
+        f.write(b'0123456789')
+    with open(filename, 'rb') as f:
+        r = utils.RangeFile(f, 2, 7)
+        assert r.read(3) == b'234'
+        assert r.read(10) == b'56'
+        assert r.read() == b''
+
+def test_split_range():
+    assert utils.split_range(1, 10, 3) == [(1, 4), (4, 7), (7, 11)]
+    assert utils.split_range(5, 6, 4) == [(5, 6), (6, 7)]
+    assert utils.split_range(0, 0, 4) == [(0, 1)]
+
+def test_infer_compression():
+    assert utils.infer_compression('data.csv.gz') == 'gzip'
+    assert utils.infer_compression('data.CSV.ZST') == 'zstd'
+    assert utils.infer_compression('data.csv') is None
+    assert utils.infer_compression('data.csv', 'bz2') == 'bz2'
+    with pytest.raises(ValueError):
+        utils.infer_compression('data.csv', 'lz4')
+
+@pytest.mark.parametrize('ext', ['.gz', '.bz2', '.xz'])
+def test_open_compressed(tmp_path, ext):
+    filename = str(tmp_path / ('data.csv' + ext))
+    with utils.BlockWriter(utils.open_compressed(filename, 'wb', level=1),
+                           block_size=4) as f:
+        for row in (b'a,b\n', b'1,2\n', b'3,4\n'):
+            f.write(row)
+    with utils.open_compressed(filename) as f:
+        assert f.read() == b'a,b\n1,2\n3,4\n'
+
+def test_iter_frame_chunks():
+    pandas = pytest.importorskip('pandas')
+    frame = pandas.DataFrame({'a': [1.5, float('nan'), 3.0],
+                              'b': ['x,"y"', None, ''],
+                              'c': pandas.to_datetime(['2017-05-01', None,
+                                                       '2017-05-03'])})
+    chunks = list(utils.iter_frame_chunks(frame, chunk_rows=2))
+    assert chunks == [b'1.5,"x,""y""",2017-05-01\n\\N,\\N,\\N\n',
+                      b'3.0,,2017-05-03\n']
+
+def test_to_frame():
+    numpy = pytest.importorskip('numpy')
+    pytest.importorskip('pandas')
+    frame = utils.to_frame(numpy.array([(1, 2.5)],
+                                       dtype=[('a', 'i4'), ('b', 'f8')]))
+    assert list(frame.columns) == ['a', 'b']
+    assert utils.to_frame(frame) is frame
+
+def test_iter_row_blocks():
+    data = b'1,a\n2,"b\nc"\n3,"d"\n4,e\n'
+    for block_size in (1, 5, 100):
+        chunks, current = [], []
+        for block, last in utils.iter_row_blocks(io.BytesIO(data), 5,
+                                                 block_size=block_size):
+            current.append(block)
+            if last:
+                chunks.append(b''.join(current))
+                current = []
+        assert chunks == [b'1,a\n2,"b\nc"\n', b'3,"d"\n', b'4,e\n']
+
+def test_file_fingerprint(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    with open(filename, 'wb') as f:
+        f.write(b'a,b\n1,2\n')
+    fingerprint = utils.file_fingerprint(filename)
+    assert fingerprint.startswith('8:')
+    with open(filename, 'wb') as f:
+        f.write(b'a,b\n1,3\n')
+    assert utils.file_fingerprint(filename) != fingerprint